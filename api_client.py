@@ -0,0 +1,47 @@
+import asyncio
+import aiohttp
+from config import API_CONNECTION_LIMIT, API_CONNECT_TIMEOUT, API_TIMEOUT, API_KEEPALIVE_TIMEOUT
+from utils.logger import info
+
+class APIClient:
+    """
+    Shared async HTTP client for the AI Power Grid API.
+
+    A single aiohttp session is created lazily on first use so that every
+    request reuses the same keep-alive connection pool instead of opening a
+    new TCP/TLS connection per call. API headers are passed per request so
+    the API key is never sent along with image downloads from other hosts.
+    """
+
+    def __init__(self, limit_per_host=API_CONNECTION_LIMIT, timeout=API_TIMEOUT,
+                 connect_timeout=API_CONNECT_TIMEOUT, keepalive_timeout=API_KEEPALIVE_TIMEOUT):
+        self.limit_per_host = limit_per_host
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout)
+        self.keepalive_timeout = keepalive_timeout
+        self._session = None
+        self._lock = asyncio.Lock()
+
+    async def get_session(self):
+        if self._session is None or self._session.closed:
+            async with self._lock:
+                if self._session is None or self._session.closed:
+                    connector = aiohttp.TCPConnector(
+                        limit_per_host=self.limit_per_host,
+                        keepalive_timeout=self.keepalive_timeout,
+                        ttl_dns_cache=300
+                    )
+                    self._session = aiohttp.ClientSession(
+                        connector=connector,
+                        timeout=self.timeout
+                    )
+                    info(f"API client session created (limit per host: {self.limit_per_host})")
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            info("API client session closed")
+        self._session = None
+
+# Create a global instance of APIClient
+api_client = APIClient()
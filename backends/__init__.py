@@ -0,0 +1,18 @@
+from backends.base import Backend
+from backends.aipg import AIPGBackend
+from backends.flux import FluxBackend
+from backends.fake import FakeBackend
+from constants import DEFAULT_BACKEND
+
+# Backends available to the bot, by name; tests can register a FakeBackend
+BACKENDS = {
+    "aipg": AIPGBackend(),
+    "flux": FluxBackend()
+}
+
+def register_backend(backend):
+    BACKENDS[backend.name] = backend
+
+def get_backend(name=None):
+    """Return the backend called ``name``, falling back to ``DEFAULT_BACKEND``."""
+    return BACKENDS.get(name or DEFAULT_BACKEND) or BACKENDS[DEFAULT_BACKEND]
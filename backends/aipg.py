@@ -0,0 +1,45 @@
+import asyncio
+import copy
+from constants import DEFAULT_IMAGE_PARAMS
+from image_generation_utils import generate_image, check_image_status, retrieve_generated_images, download_image, cancel_image_generation
+from model_catalog import model_catalog
+from utils.logger import error
+from metrics import time_stage
+from backends.base import Backend
+
+class AIPGBackend(Backend):
+    """AI Power Grid jobs: submitted to the grid, polled, then downloaded from R2."""
+
+    name = "aipg"
+
+    def default_params(self):
+        return copy.deepcopy(DEFAULT_IMAGE_PARAMS)
+
+    async def check_capacity(self, params):
+        return await model_catalog.check_capacity(params)
+
+    async def _submit(self, prompt, params):
+        return await generate_image(prompt, params)
+
+    async def _status(self, job_id):
+        return await check_image_status(job_id)
+
+    async def _fetch_result(self, job_id):
+        generations = await retrieve_generated_images(job_id)
+        # Image downloads go to the storage host, not the API, so they have their own budget
+        with time_stage("download", self.name, (self.active_jobs.get(job_id) or {}).get("model")):
+            responses = await asyncio.gather(*(
+                self.scheduler.run_coroutine(download_image(generation["img"]), self.endpoint("download"))
+                for generation in generations
+            ))
+
+        images = []
+        for generation, response in zip(generations, responses):
+            if response["success"]:
+                images.append({"content": response["buffer"].getvalue(), "seed": generation["seed"]})
+            else:
+                error(f"Failed to download an image of job {job_id}: {response['message']}")
+        return images
+
+    async def _cancel(self, job_id):
+        return await cancel_image_generation(job_id)
@@ -0,0 +1,125 @@
+import time
+from abc import ABC, abstractmethod
+from constants import PRIORITY_NORMAL
+from queue_manager import queue_manager
+from metrics import STAGE_SECONDS, time_stage
+
+class Backend(ABC):
+    """
+    Interface of an image generation backend.
+
+    Subclasses must implement ``default_params``, ``_submit``, ``_status``,
+    ``_fetch_result`` and ``_cancel``, or they cannot be instantiated. The
+    public methods run them through the shared scheduler on
+    ``<name>.<operation>`` endpoints, so every backend gets its own rate
+    limits and job slots (``BACKEND_CONCURRENCY``) while polling and delivery
+    stay backend-agnostic. The time each job spends queued, submitting,
+    waiting for a worker, generating and being fetched is recorded in
+    ``STAGE_SECONDS``.
+
+    Return values follow the rest of the code base:
+    - ``submit``: ``{"success", "id", "message", "queue_wait"}``
+    - ``status``: ``{"success", "done", "faulted", "is_possible", "processing", "wait_time", "queue_position"}``
+    - ``fetch_result``: a list of ``{"content", "seed"}``, one per image, empty on failure
+    - ``cancel``: ``{"success", ...}``
+    """
+
+    name = None
+    # ImageGenerationView actions that make sense for this backend's params
+    button_actions = ("refresh", "seed", "dimensions", "steps", "cfg", "sampler_menu", "model_menu", "prompt", "flux")
+
+    def __init__(self, scheduler=queue_manager):
+        self.scheduler = scheduler
+        # Jobs holding a slot: model, guild, submission time and, once seen processing, start time
+        self.active_jobs = {}
+
+    def endpoint(self, operation):
+        return f"{self.name}.{operation}"
+
+    @abstractmethod
+    def default_params(self):
+        """Return a fresh copy of the default request params."""
+
+    async def check_capacity(self, params):
+        """Validate ``params`` before submission; see ``ModelCatalog.assess`` for the result format."""
+        return {"ok": True, "params": params, "warnings": [], "cost": None, "estimated_time": None, "message": None}
+
+    async def _timed_submit(self, prompt, params, model):
+        with time_stage("submit", self.name, model):
+            return await self._submit(prompt, params)
+
+    async def submit(self, prompt, params, user_id=None, priority=PRIORITY_NORMAL, on_queued=None, group=None, group_limit=None, deadline=None):
+        """
+        Submit a job once a slot is free; ``group`` (a guild ID) holds at most ``group_limit`` of the slots.
+
+        Raises ``QueueFullError`` when the queue is full and ``QueueExpiredError``
+        when the job is still waiting at ``deadline``.
+        """
+        model = (params.get("models") or [None])[0]
+        response, wait_time = await self.scheduler.run_coroutine_timed(
+            self._timed_submit(prompt, params, model), self.endpoint("submit"),
+            user_id=user_id, priority=priority, on_queued=on_queued, slot=self.name,
+            group=group, group_limit=group_limit, deadline=deadline
+        )
+        response["queue_wait"] = wait_time
+        STAGE_SECONDS.observe(wait_time, stage="queue_wait", backend=self.name, model=model or "")
+        if response["success"]:
+            self.active_jobs[response["id"]] = {"model": model, "group": group, "submitted_at": time.monotonic(), "started_at": None}
+        else:
+            self.scheduler.release_slot(self.name, group)
+        return response
+
+    async def status(self, job_id):
+        response, wait_time = await self.scheduler.run_coroutine_timed(self._status(job_id), self.endpoint("status"))
+        response["queue_wait"] = wait_time
+        self._record_progress(job_id, response)
+        return response
+
+    def _record_progress(self, job_id, status):
+        """Split a job's time on the backend into worker queue time and generation time."""
+        job = self.active_jobs.get(job_id)
+        if job is None or not status.get("success") or job.get("finished"):
+            return
+        now = time.monotonic()
+        model = job["model"] or ""
+        if job["started_at"] is None and (status.get("processing") or status.get("done")):
+            job["started_at"] = now
+            STAGE_SECONDS.observe(now - job["submitted_at"], stage="backend_queue", backend=self.name, model=model)
+        if status.get("done"):
+            STAGE_SECONDS.observe(now - job["started_at"], stage="generation", backend=self.name, model=model)
+        job["finished"] = bool(status.get("done") or status.get("faulted"))
+
+    async def _timed_fetch(self, job_id):
+        job = self.active_jobs.get(job_id) or {}
+        with time_stage("fetch", self.name, job.get("model")):
+            return await self._fetch_result(job_id)
+
+    async def fetch_result(self, job_id):
+        return await self.scheduler.run_coroutine(self._timed_fetch(job_id), self.endpoint("fetch"))
+
+    async def cancel(self, job_id):
+        response = await self.scheduler.run_coroutine(self._cancel(job_id), self.endpoint("cancel"))
+        self.finish(job_id)
+        return response
+
+    def finish(self, job_id):
+        """Release the job slot of a job that is delivered, failed or abandoned."""
+        job = self.active_jobs.pop(job_id, None)
+        if job is not None:
+            self.scheduler.release_slot(self.name, job.get("group"))
+
+    @abstractmethod
+    async def _submit(self, prompt, params):
+        pass
+
+    @abstractmethod
+    async def _status(self, job_id):
+        pass
+
+    @abstractmethod
+    async def _fetch_result(self, job_id):
+        pass
+
+    @abstractmethod
+    async def _cancel(self, job_id):
+        pass
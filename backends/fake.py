@@ -0,0 +1,79 @@
+import copy
+import struct
+import time
+import uuid
+import zlib
+from constants import DEFAULT_IMAGE_PARAMS
+from backends.base import Backend
+
+def solid_png(width=64, height=64, color=(128, 128, 128)):
+    """Encode a solid-colour RGB PNG without any imaging dependency."""
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+
+    rows = b"".join(b"\x00" + bytes(color) * width for _ in range(height))
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(rows))
+            + chunk(b"IEND", b""))
+
+class FakeBackend(Backend):
+    """
+    In-process backend for tests and load runs; no network access.
+
+    Jobs take ``delay`` seconds, report a shrinking ``wait_time`` while they
+    run and return ``n`` small placeholder PNGs. With ``fail=True`` every
+    job faults instead. Pass ``name`` to stand in for another backend, e.g.
+    ``FakeBackend(name="aipg")`` for load tests of the default pipeline.
+    """
+
+    name = "fake"
+
+    def __init__(self, delay=2.0, fail=False, name=None, **kwargs):
+        super().__init__(**kwargs)
+        if name:
+            self.name = name
+        self.delay = delay
+        self.fail = fail
+        self.jobs = {}
+        self.cancelled = set()
+
+    def default_params(self):
+        return copy.deepcopy(DEFAULT_IMAGE_PARAMS)
+
+    async def _submit(self, prompt, params):
+        job_id = str(uuid.uuid4())
+        options = params.get("params", {})
+        self.jobs[job_id] = {
+            "ready_at": time.monotonic() + self.delay,
+            "n": int(options.get("n", 1)),
+            "seed": int(options.get("seed") or 0)
+        }
+        return {"success": True, "id": job_id, "kudos": 0}
+
+    async def _status(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None:
+            return {"success": False, "message": "Job not found", "statusCode": 404}
+        remaining = max(job["ready_at"] - time.monotonic(), 0)
+        return {
+            "success": True,
+            "done": remaining == 0 and not self.fail,
+            "faulted": remaining == 0 and self.fail,
+            "is_possible": True,
+            "processing": remaining > 0,
+            "queue_position": 0,
+            "wait_time": round(remaining)
+        }
+
+    async def _fetch_result(self, job_id):
+        job = self.jobs.pop(job_id, None)
+        if job is None or self.fail:
+            return []
+        return [{"content": solid_png(color=(40 * i % 256, 128, 200)), "seed": job["seed"] + i} for i in range(job["n"])]
+
+    async def _cancel(self, job_id):
+        found = self.jobs.pop(job_id, None) is not None
+        if found:
+            self.cancelled.add(job_id)
+        return {"success": found}
@@ -0,0 +1,89 @@
+import asyncio
+import uuid
+from constants import FLUX_DEFAULT_PARAMS
+from flux_engine import flux_engine
+from utils.logger import error
+from backends.base import Backend
+
+def _read_file(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+class FluxBackend(Backend):
+    """
+    Local Flux generations, run as in-process jobs on the warm ``flux_engine``.
+
+    ``submit`` starts the generation in a task and returns a job ID at once,
+    so Flux jobs are polled and delivered exactly like grid jobs. Jobs only
+    live in memory and cannot be resumed after a restart.
+    """
+
+    name = "flux"
+    button_actions = ("refresh", "seed", "dimensions", "steps", "prompt")
+
+    def __init__(self, engine=flux_engine, **kwargs):
+        super().__init__(**kwargs)
+        self.engine = engine
+        self.jobs = {}
+
+    def default_params(self):
+        return {
+            "params": {
+                "seed": None,
+                "width": FLUX_DEFAULT_PARAMS["width"],
+                "height": FLUX_DEFAULT_PARAMS["height"],
+                "steps": FLUX_DEFAULT_PARAMS["steps"],
+                "guidance_scale": FLUX_DEFAULT_PARAMS["guidance_scale"],
+                "n": 1
+            },
+            "models": [FLUX_DEFAULT_PARAMS["model"]]
+        }
+
+    async def _submit(self, prompt, params):
+        job_id = uuid.uuid4().hex
+        options = params["params"]
+        self.jobs[job_id] = asyncio.create_task(self.engine.generate(
+            prompt,
+            model=params["models"][0],
+            seed=int(options["seed"]) if options.get("seed") is not None else None,
+            randomize_seed=options.get("seed") is None,
+            width=options["width"],
+            height=options["height"],
+            steps=options["steps"],
+            guidance_scale=options.get("guidance_scale", FLUX_DEFAULT_PARAMS["guidance_scale"])
+        ), name=f"flux_{job_id}")
+        return {"success": True, "id": job_id}
+
+    async def _status(self, job_id):
+        task = self.jobs.get(job_id)
+        if task is None:
+            # Unknown jobs were lost in a restart and can never complete
+            return {"success": True, "done": False, "faulted": True, "is_possible": False}
+        if not task.done():
+            return {
+                "success": True, "done": False, "faulted": False, "is_possible": True,
+                "processing": self.engine.waiting == 0,
+                "queue_position": self.engine.waiting,
+                "wait_time": None
+            }
+        succeeded = not task.cancelled() and task.result()["success"]
+        return {"success": True, "done": succeeded, "faulted": not succeeded, "is_possible": True}
+
+    async def _fetch_result(self, job_id):
+        task = self.jobs.pop(job_id, None)
+        if task is None or not task.done() or task.cancelled() or not task.result()["success"]:
+            return []
+        result = task.result()
+        try:
+            content = await asyncio.to_thread(_read_file, result["image_path"])
+        except OSError as e:
+            error(f"Generated Flux image not found at {result['image_path']}: {str(e)}")
+            return []
+        return [{"content": content, "seed": result["seed"]}]
+
+    async def _cancel(self, job_id):
+        task = self.jobs.pop(job_id, None)
+        if task is not None:
+            # Best-effort: the engine keeps the generation's slot until the Flux app returns
+            task.cancel()
+        return {"success": task is not None}
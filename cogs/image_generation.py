@@ -1,56 +1,104 @@
 import nextcord
 from nextcord.ext import commands
-from nextcord import ButtonStyle, Interaction
+from nextcord import ButtonStyle, Interaction, SlashOption
 from nextcord.ui import Button, View, Modal, TextInput, Select
 import asyncio
 import time
 import random
-from config import CHANNEL_ID
-from utils.logger import info, error, debug
-from image_generation_utils import generate_image_queued, check_image_status_queued, retrieve_generated_image_queued, download_image
-from constants import MAX_WAIT_TIME, CHECK_INTERVAL, DEFAULT_IMAGE_PARAMS
+from config import STAFF_ROLE_IDS, ARCHIVE_GENERATED_IMAGES, METRICS_HOST, METRICS_PORT, BOT_ROLE, WORKER_ID, WORKER_MAX_JOBS
+from utils.logger import info, error, debug, lazy_json, set_correlation_id
+from constants import MAX_WAIT_TIME, JOB_RESUME_MAX_AGE, DEFAULT_BACKEND, PRIORITY_STAFF, PRIORITY_NORMAL, PRIORITY_REROLL
+from constants import BATCH_MAX_IMAGES, UPSCALER, DISPATCH_HISTORY_SIZE, INTERACTION_TTL, WORK_POLL_INTERVAL, WORK_LEASE_TIME
 from copy import deepcopy
+from collections import OrderedDict
 import copy
-import json
-from requests.exceptions import HTTPError
-import subprocess
-from gradio_client import Client
-import os
-import traceback
-from queue_manager import flux_queue_manager
+import io
+import re
+import uuid
+from flux_engine import flux_engine
+from api_client import api_client
+from image_generation_utils import GenerationRequestError
+from job_poller import job_poller
+from status_updater import status_updater
+from image_store import image_store
+from result_cache import result_cache, fingerprint
+from model_catalog import model_catalog
+from job_journal import job_journal, STATE_DONE, STATE_DELIVERED, STATE_TIMEOUT, STATE_FAILED, STATE_CANCELLED
+from view_state import view_state_store
+from guild_config import guild_config, SETTINGS
+from shared_state import work_queue, WorkItem
+from backends import get_backend
+from queue_manager import queue_manager, QueueFullError, QueueExpiredError
+from utils.image_grid import composite_grid
+from metrics import metrics, STAGE_SECONDS, JOBS, time_stage
+
+# Component custom_ids have the form "aipg:<action>:<key>". The key points
+# into the view state store (or is a job ID for "check"), so the views below
+# only describe layout and every click is routed by ImageGeneration.on_interaction.
+COMPONENT_PREFIX = "aipg"
+
+SAMPLERS = [
+    "k_euler_a", "k_dpm_fast", "k_euler", "k_dpm_2_a", "k_heun", "lcm",
+    "k_dpmpp_2m", "k_dpmpp_2s_a", "k_dpm_adaptive", "k_dpmpp_sde",
+    "dpmsolver", "k_dpm_2", "k_lms", "DDIM"
+]
+
+# Choices of the /dream "size" option, all within the 512-1280 range of the dimensions modal
+SIZES = {
+    "Square (1024x1024)": "1024x1024",
+    "Landscape (1216x832)": "1216x832",
+    "Portrait (832x1216)": "832x1216",
+    "Wide (1280x768)": "1280x768",
+    "Small (512x512)": "512x512"
+}
+
+def component_id(action, key):
+    return f"{COMPONENT_PREFIX}:{action}:{key}"
+
+def parse_batch_option(prompt):
+    """Strip a "--n N" option from a prompt and return the prompt with the custom params it asks for."""
+    match = re.search(r"(?:^|\s)--n\s+(\d+)(?=\s|$)", prompt)
+    if not match:
+        return prompt, None
+    count = min(max(int(match.group(1)), 1), BATCH_MAX_IMAGES)
+    prompt = (prompt[:match.start()] + prompt[match.end():]).strip()
+    return prompt, {"params": {"n": count}}
 
 class SeedInputModal(nextcord.ui.Modal):
-    def __init__(self, view, current_seed):
+    def __init__(self, cog, state):
         super().__init__(title="Change Seed")
-        self.view = view
+        self.cog = cog
+        self.state = state
         
         self.seed_input = nextcord.ui.TextInput(
             label="New Seed (-1 for random)",
             placeholder="Enter a new seed or -1 for random",
-            default_value=str(current_seed)
+            default_value=str(state.params['params']['seed'])
         )
         self.add_item(self.seed_input)
 
     async def callback(self, interaction: nextcord.Interaction):
         await interaction.response.defer(ephemeral=True)
         new_seed = self.seed_input.value
-        new_params = copy.deepcopy(self.view.original_params)
+        new_params = self.state.params
         if new_seed == "-1":
             new_seed = str(random.randint(0, 4294967295))
         new_params['params']['seed'] = new_seed
         debug(f"SeedInputModal: New seed set to {new_seed}")
-        await self.view.cog.generate_and_send_image(interaction, self.view.prompt, new_params)
+        await self.cog.dispatch(interaction, self.state.prompt, new_params, self.state.backend, origin=self.state.key)
         await interaction.followup.send(f"Generating image with new seed: {new_seed}", ephemeral=True)
 
 class DimensionsInputModal(nextcord.ui.Modal):
-    def __init__(self, view, current_width, current_height):
+    def __init__(self, cog, state):
         super().__init__(title="Change Dimensions")
-        self.view = view
+        self.cog = cog
+        self.state = state
+        params = state.params['params']
         
         self.width_input = nextcord.ui.TextInput(
             label="Width (512-1280)",
             placeholder="Enter width between 512 and 1280",
-            default_value=str(current_width),
+            default_value=str(params['width']),
             min_length=3,
             max_length=4
         )
@@ -59,7 +107,7 @@ class DimensionsInputModal(nextcord.ui.Modal):
         self.height_input = nextcord.ui.TextInput(
             label="Height (512-1280)",
             placeholder="Enter height between 512 and 1280",
-            default_value=str(current_height),
+            default_value=str(params['height']),
             min_length=3,
             max_length=4
         )
@@ -72,11 +120,11 @@ class DimensionsInputModal(nextcord.ui.Modal):
             new_height = int(self.height_input.value)
             
             if 512 <= new_width <= 1280 and 512 <= new_height <= 1280:
-                new_params = copy.deepcopy(self.view.original_params)
+                new_params = self.state.params
                 new_params['params']['width'] = new_width
                 new_params['params']['height'] = new_height
                 debug(f"New dimensions set: {new_width}x{new_height}")
-                await self.view.cog.generate_and_send_image(interaction, self.view.prompt, new_params)
+                await self.cog.dispatch(interaction, self.state.prompt, new_params, self.state.backend, origin=self.state.key)
                 await interaction.followup.send(f"Generating image with new dimensions: {new_width}x{new_height}", ephemeral=True)
             else:
                 await interaction.followup.send("Invalid dimensions. Please enter values between 512 and 1280.", ephemeral=True)
@@ -84,14 +132,15 @@ class DimensionsInputModal(nextcord.ui.Modal):
             await interaction.followup.send("Invalid input. Please enter numeric values only.", ephemeral=True)
 
 class StepsInputModal(nextcord.ui.Modal):
-    def __init__(self, view, current_steps):
+    def __init__(self, cog, state):
         super().__init__(title="Change Steps")
-        self.view = view
+        self.cog = cog
+        self.state = state
         
         self.steps_input = nextcord.ui.TextInput(
             label="Steps (10-150)",
             placeholder="Enter steps between 10 and 150",
-            default_value=str(current_steps),
+            default_value=str(state.params['params']['steps']),
             min_length=1,
             max_length=3
         )
@@ -103,10 +152,10 @@ class StepsInputModal(nextcord.ui.Modal):
             new_steps = int(self.steps_input.value)
             
             if 10 <= new_steps <= 150:
-                new_params = copy.deepcopy(self.view.original_params)
+                new_params = self.state.params
                 new_params['params']['steps'] = new_steps
                 debug(f"New steps set: {new_steps}")
-                await self.view.cog.generate_and_send_image(interaction, self.view.prompt, new_params)
+                await self.cog.dispatch(interaction, self.state.prompt, new_params, self.state.backend, origin=self.state.key)
                 await interaction.followup.send(f"Generating image with new steps: {new_steps}", ephemeral=True)
             else:
                 await interaction.followup.send("Invalid steps. Please enter a value between 10 and 150.", ephemeral=True)
@@ -114,14 +163,15 @@ class StepsInputModal(nextcord.ui.Modal):
             await interaction.followup.send("Invalid input. Please enter a numeric value only.", ephemeral=True)
 
 class CFGScaleInputModal(nextcord.ui.Modal):
-    def __init__(self, view, current_cfg_scale):
+    def __init__(self, cog, state):
         super().__init__(title="Change CFG Scale")
-        self.view = view
+        self.cog = cog
+        self.state = state
         
         self.cfg_scale_input = nextcord.ui.TextInput(
             label="CFG Scale (1-30)",
             placeholder="Enter CFG scale between 1 and 30",
-            default_value=str(current_cfg_scale),
+            default_value=str(state.params['params']['cfg_scale']),
             min_length=1,
             max_length=4
         )
@@ -133,250 +183,241 @@ class CFGScaleInputModal(nextcord.ui.Modal):
             new_cfg_scale = float(self.cfg_scale_input.value)
             
             if 1 <= new_cfg_scale <= 30:
-                new_params = copy.deepcopy(self.view.original_params)
+                new_params = self.state.params
                 new_params['params']['cfg_scale'] = new_cfg_scale
                 debug(f"New CFG scale set: {new_cfg_scale}")
-                await self.view.cog.generate_and_send_image(interaction, self.view.prompt, new_params)
+                await self.cog.dispatch(interaction, self.state.prompt, new_params, self.state.backend, origin=self.state.key)
                 await interaction.followup.send(f"Generating image with new CFG scale: {new_cfg_scale}", ephemeral=True)
             else:
                 await interaction.followup.send("Invalid CFG scale. Please enter a value between 1 and 30.", ephemeral=True)
         except ValueError:
             await interaction.followup.send("Invalid input. Please enter a numeric value only.", ephemeral=True)
 
-class SamplerSelectionView(nextcord.ui.View):
-    def __init__(self, original_view, current_sampler):
-        super().__init__(timeout=None)
-        self.original_view = original_view
+class PromptInputModal(nextcord.ui.Modal):
+    def __init__(self, cog, state):
+        super().__init__(title="Change Prompt")
+        self.cog = cog
+        self.state = state
         
-        self.sampler_select = nextcord.ui.Select(
-            placeholder="Select a sampler",
-            options=[
-                nextcord.SelectOption(label=sampler, value=sampler, default=(sampler == current_sampler))
-                for sampler in [
-                    "k_euler_a", "k_dpm_fast", "k_euler", "k_dpm_2_a", "k_heun", "lcm",
-                    "k_dpmpp_2m", "k_dpmpp_2s_a", "k_dpm_adaptive", "k_dpmpp_sde",
-                    "dpmsolver", "k_dpm_2", "k_lms", "DDIM"
-                ]
-            ]
+        self.prompt_input = nextcord.ui.TextInput(
+            label="New Prompt",
+            placeholder="Enter a new prompt",
+            default_value=state.prompt,
+            max_length=1000
         )
-        self.sampler_select.callback = self.sampler_callback
-        self.add_item(self.sampler_select)
-
-    async def sampler_callback(self, interaction: nextcord.Interaction):
-        new_sampler = self.sampler_select.values[0]
-        new_params = copy.deepcopy(self.original_view.original_params)
-        new_params['params']['sampler_name'] = new_sampler
-        debug(f"SamplerSelectionView: New sampler set to {new_sampler}")
-        await self.original_view.cog.generate_and_send_image(interaction, self.original_view.prompt, new_params)
-        await interaction.message.delete()
-
-class ModelSelectionView(nextcord.ui.View):
-    def __init__(self, cog, original_view, current_model):
-        super().__init__(timeout=None)
-        self.cog = cog
-        self.original_view = original_view
-        self.add_item(ModelDropdown(cog, original_view, current_model))
-
-class ModelDropdown(nextcord.ui.Select):
-    def __init__(self, cog, original_view, current_model):
-        self.cog = cog
-        self.original_view = original_view
-        options = [nextcord.SelectOption(label=model, value=model, default=(model == current_model)) 
-                   for model in cog.available_models]
-        super().__init__(placeholder="Select a model", min_values=1, max_values=1, options=options)
+        self.add_item(self.prompt_input)
 
     async def callback(self, interaction: nextcord.Interaction):
         await interaction.response.defer(ephemeral=True)
-        new_model = self.values[0]
-        new_params = copy.deepcopy(self.original_view.original_params)
-        new_params['models'] = [new_model]
-        debug(f"ModelDropdown: New model set to {new_model}")
-        await self.cog.generate_and_send_image(interaction, self.original_view.prompt, new_params)
-        await interaction.followup.send(f"Generating image with new model: {new_model}", ephemeral=True)
-        await interaction.message.delete()
+        new_prompt = self.prompt_input.value
+        debug(f"PromptInputModal: New prompt set to {new_prompt}")
+        await self.cog.dispatch(interaction, new_prompt, self.state.params, self.state.backend, origin=self.state.key)
+        await interaction.followup.send("Generating image with new prompt...", ephemeral=True)
 
-class ManualCheckView(nextcord.ui.View):
-    def __init__(self, cog, job_id):
-        super().__init__(timeout=None)
-        self.cog = cog
-        self.job_id = job_id
+class KeyedView(nextcord.ui.View):
+    """
+    Layout-only view whose components carry their state key in the custom_id.
 
-    @nextcord.ui.button(label="Check Status", style=ButtonStyle.primary, custom_id="check_status")
-    async def check_status_callback(self, button: nextcord.ui.Button, interaction: Interaction):
-        await self.cog.check_generation_status(interaction, self.job_id)
+    Clicks are handled by the cog's ``on_interaction`` listener, which also
+    works after a restart. The view is stopped straight away so edits,
+    followups and interaction responses never register it, but
+    ``Messageable.send`` keeps every view it sends until the message is
+    deleted, so use ``ImageGeneration.send_view`` for those.
+    """
 
-class ImageGenerationView(nextcord.ui.View):
-    def __init__(self, cog, prompt, params):
+    def __init__(self):
         super().__init__(timeout=None)
-        self.cog = cog
-        self.prompt = prompt
-        self.original_params = copy.deepcopy(params)
-        debug(f"ImageGenerationView initialized with prompt: {prompt}")
-        debug(f"Original params: {json.dumps(self.original_params, indent=2)}")
-
-    @nextcord.ui.button(label="Refresh", style=ButtonStyle.primary, custom_id="refresh")
-    async def refresh_callback(self, button: nextcord.ui.Button, interaction: Interaction):
-        debug("Refresh button clicked")
-        await interaction.response.defer()
-        new_params = copy.deepcopy(self.original_params)
-        new_params['params']['seed'] = str(random.randint(0, 4294967295))
-        debug(f"New seed for refresh: {new_params['params']['seed']}")
-        await self.cog.generate_and_send_image(interaction, self.prompt, new_params)
-
-    @nextcord.ui.button(label="Change Seed", style=ButtonStyle.secondary, custom_id="change_seed")
-    async def change_seed_callback(self, button: nextcord.ui.Button, interaction: Interaction):
-        debug("Change Seed button clicked")
-        current_seed = self.original_params['params']['seed']
-        modal = SeedInputModal(self, current_seed)
-        await interaction.response.send_modal(modal)
-
-    @nextcord.ui.button(label="Change Dimensions", style=ButtonStyle.secondary, custom_id="change_dimensions")
-    async def change_dimensions_callback(self, button: nextcord.ui.Button, interaction: Interaction):
-        debug("Change Dimensions button clicked")
-        current_width = self.original_params['params']['width']
-        current_height = self.original_params['params']['height']
-        modal = DimensionsInputModal(self, current_width, current_height)
-        await interaction.response.send_modal(modal)
-
-    @nextcord.ui.button(label="Change Steps", style=ButtonStyle.secondary, custom_id="change_steps")
-    async def change_steps_callback(self, button: nextcord.ui.Button, interaction: Interaction):
-        debug("Change Steps button clicked")
-        current_steps = self.original_params['params']['steps']
-        modal = StepsInputModal(self, current_steps)
-        await interaction.response.send_modal(modal)
-
-    @nextcord.ui.button(label="Change CFG Scale", style=ButtonStyle.secondary, custom_id="change_cfg_scale")
-    async def change_cfg_scale_callback(self, button: nextcord.ui.Button, interaction: Interaction):
-        debug("Change CFG Scale button clicked")
-        current_cfg_scale = self.original_params['params']['cfg_scale']
-        modal = CFGScaleInputModal(self, current_cfg_scale)
-        await interaction.response.send_modal(modal)
-
-    @nextcord.ui.button(label="Change Sampler", style=ButtonStyle.secondary, custom_id="change_sampler")
-    async def change_sampler_callback(self, button: nextcord.ui.Button, interaction: Interaction):
-        debug("Change Sampler button clicked")
-        current_sampler = self.original_params['params']['sampler_name']
-        view = SamplerSelectionView(self, current_sampler)
-        await interaction.response.send_message("Select a new sampler:", view=view, ephemeral=True)
+        self.stop()
 
-    @nextcord.ui.button(label="Change Model", style=ButtonStyle.secondary, custom_id="change_model")
-    async def change_model_callback(self, button: nextcord.ui.Button, interaction: Interaction):
-        debug("Change Model button clicked")
-        current_model = self.original_params['models'][0]
-        view = ModelSelectionView(self.cog, self, current_model)
-        await interaction.response.send_message("Select a new model:", view=view, ephemeral=True)
+class SamplerSelectionView(KeyedView):
+    def __init__(self, key, current_sampler):
+        super().__init__()
+        self.add_item(nextcord.ui.Select(
+            placeholder="Select a sampler",
+            custom_id=component_id("sampler", key),
+            options=[
+                nextcord.SelectOption(label=sampler, value=sampler, default=(sampler == current_sampler))
+                for sampler in SAMPLERS
+            ]
+        ))
 
-    @nextcord.ui.button(label="Change Prompt", style=ButtonStyle.secondary, custom_id="change_prompt")
-    async def change_prompt_callback(self, button: nextcord.ui.Button, interaction: Interaction):
-        debug("Change Prompt button clicked")
-        await interaction.response.send_modal(PromptInputModal(self))
+class ModelSelectionView(KeyedView):
+    def __init__(self, key, current_model, models):
+        super().__init__()
+        # Discord allows at most 25 options per select menu
+        options = [nextcord.SelectOption(label=model, value=model, default=(model == current_model))
+                   for model in models[:25]]
+        self.add_item(nextcord.ui.Select(placeholder="Select a model", min_values=1, max_values=1,
+                                         custom_id=component_id("model", key), options=options))
 
-    @nextcord.ui.button(label="Flux it", style=ButtonStyle.success, custom_id="flux_it")
-    async def flux_it_callback(self, button: nextcord.ui.Button, interaction: Interaction):
-        debug("Flux it button clicked")
-        await interaction.response.defer(ephemeral=True)
-        try:
-            # Run the Flux generation in a separate task
-            self.bot.loop.create_task(self.generate_flux_image(interaction, self.prompt))
-            await interaction.followup.send("Flux image generation started. Please wait...", ephemeral=True)
-        except Exception as e:
-            error(f"Error in flux_it_callback: {str(e)}")
-            await interaction.followup.send("An error occurred while starting Flux image generation. Please try again later.", ephemeral=True)
+class ManualCheckView(KeyedView):
+    def __init__(self, job_id):
+        super().__init__()
+        self.add_item(Button(label="Check Status", style=ButtonStyle.primary, custom_id=component_id("check", job_id)))
 
-    async def generate_flux_image(self, interaction: Interaction, prompt: str):
-        async def flux_task():
-            try:
-                debug(f"Starting Flux image generation for prompt: {prompt}")
-                client = Client("http://127.0.0.1:7860/")
-                debug("Flux API client initialized")
-                result = await asyncio.to_thread(client.predict,
-                    prompt,
-                    "black-forest-labs/FLUX.1-schnell",
-                    random.randint(0, 2**32 - 1),
-                    0,
-                    1,
-                    True,
-                    1024,
-                    576,
-                    4,
-                    api_name="/infer"
-                )
-                debug(f"Flux API response received: {result}")
-                
-                if not result or len(result) < 2 or not result[0]:
-                    raise ValueError("Unexpected result format from Flux API")
-
-                image_path = result[0][0]['image']
-                seed = result[1]
-                
-                if not os.path.exists(image_path):
-                    raise FileNotFoundError(f"Generated image not found at {image_path}")
-
-                file = nextcord.File(image_path, filename="flux_image.png")
-                embed = nextcord.Embed(title="Flux Image Generated", description=f"Prompt: {prompt}", color=0x00ff00)
-                embed.set_image(url="attachment://flux_image.png")
-                embed.add_field(name="Seed", value=str(seed), inline=False)
-                
-                await interaction.followup.send(embed=embed, file=file)
-            except Exception as e:
-                error(f"Error generating Flux image: {str(e)}")
-                error(f"Traceback: {traceback.format_exc()}")
-                await interaction.followup.send(f"An error occurred while generating the Flux image: {str(e)}", ephemeral=True)
+class CancelView(KeyedView):
+    """Cancel button on an in-progress status message; the key is the requesting user's ID."""
 
-        try:
-            await flux_queue_manager.run_coroutine(flux_task())
-        except Exception as e:
-            error(f"Error in Flux queue: {str(e)}")
-            error(f"Traceback: {traceback.format_exc()}")
-            await interaction.followup.send("An error occurred while queuing the Flux image generation. Please try again later.", ephemeral=True)
+    def __init__(self, user_id):
+        super().__init__()
+        self.add_item(Button(label="Cancel", style=ButtonStyle.danger, emoji="🛑", custom_id=component_id("cancel", user_id or 0)))
 
-class PromptInputModal(nextcord.ui.Modal):
-    def __init__(self, view):
-        super().__init__(title="Change Prompt")
-        self.view = view
-        
-        self.prompt_input = nextcord.ui.TextInput(
-            label="New Prompt",
-            placeholder="Enter a new prompt",
-            default_value=self.view.prompt,
-            max_length=1000
-        )
-        self.add_item(self.prompt_input)
+class ImageGenerationView(KeyedView):
+    BUTTONS = [
+        ("Refresh", ButtonStyle.primary, "refresh"),
+        ("Change Seed", ButtonStyle.secondary, "seed"),
+        ("Change Dimensions", ButtonStyle.secondary, "dimensions"),
+        ("Change Steps", ButtonStyle.secondary, "steps"),
+        ("Change CFG Scale", ButtonStyle.secondary, "cfg"),
+        ("Change Sampler", ButtonStyle.secondary, "sampler_menu"),
+        ("Change Model", ButtonStyle.secondary, "model_menu"),
+        ("Change Prompt", ButtonStyle.secondary, "prompt"),
+        ("Flux it", ButtonStyle.success, "flux")
+    ]
 
-    async def callback(self, interaction: nextcord.Interaction):
-        await interaction.response.defer(ephemeral=True)
-        new_prompt = self.prompt_input.value
-        debug(f"PromptInputModal: New prompt set to {new_prompt}")
-        await self.view.cog.generate_and_send_image(interaction, new_prompt, self.view.original_params)
-        await interaction.followup.send("Generating image with new prompt...", ephemeral=True)
+    def __init__(self, key, image_keys=(), actions=None):
+        super().__init__()
+        for label, style, action in self.BUTTONS:
+            if actions is None or action in actions:
+                self.add_item(Button(label=label, style=style, custom_id=component_id(action, key)))
+
+        # Batches get an edit and an upscale button per image, numbered like the grid tiles
+        for number, image_key in enumerate(image_keys, start=1):
+            self.add_item(Button(label=f"Edit {number}", style=ButtonStyle.secondary,
+                                 custom_id=component_id("edit", image_key), row=3))
+            self.add_item(Button(label=f"Upscale {number}", style=ButtonStyle.secondary,
+                                 custom_id=component_id("upscale", image_key), row=4))
 
 class ImageGeneration(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.available_models = []
+        # Jobs journaled from here on belong to this process, so they are never resumed
+        self.started_at = time.time()
+        self.work_tasks = set()
+        # Images being written to the image store after delivery
+        self.archive_tasks = set()
+        # Requests running in this process, by status message ID
+        self.requests = {}
+        # Status messages this process posted, and the latest re-roll per (image key, user), for cancellation
+        self.status_messages = OrderedDict()
+        self.latest_rerolls = OrderedDict()
         self.bot.loop.create_task(self.initialize_models())
-        self.channel_id = int(CHANNEL_ID)
-        info(f"ImageGeneration cog initialized with channel ID: {self.channel_id}")
+        # A gateway only queues requests; jobs, their images and Flux belong to the workers
+        if BOT_ROLE != "gateway":
+            self.bot.loop.create_task(self.run_work_items())
+            if work_queue.shared:
+                self.bot.loop.create_task(self.watch_requests())
+            self.bot.loop.create_task(self.resume_jobs())
+            if ARCHIVE_GENERATED_IMAGES:
+                self.bot.loop.create_task(image_store.run_compaction())
+            self.bot.loop.create_task(flux_engine.start())
+        if METRICS_PORT:
+            self.bot.loop.create_task(metrics.start_server(METRICS_HOST, METRICS_PORT))
+        # IDs of recently dispatched user actions, to drop duplicate deliveries
+        self.dispatched = OrderedDict()
+        info("ImageGeneration cog initialized")
+
+    def cog_unload(self):
+        # The loop may stop before another task runs, so save the image index right away
+        image_store.flush_now()
+        self.bot.loop.create_task(api_client.close())
+        self.bot.loop.create_task(metrics.stop_server())
+
+    @property
+    def available_models(self):
+        return model_catalog.models
 
     async def initialize_models(self):
-        self.available_models = await self.get_available_models()
+        await model_catalog.refresh()
+
+    async def channel_settings(self, channel):
+        """Return the settings of ``channel``'s guild, or None when the bot is not allowed there."""
+        guild = getattr(channel, "guild", None)
+        settings = await guild_config.get(guild.id if guild else None)
+        return settings if settings.allows(channel.id) else None
+
+    def allowed_channels_text(self, settings):
+        channels = " ".join(f"<#{channel_id}>" for channel_id in sorted(settings.allowed_channels))
+        return f"Please use this command in {channels}." if channels else "Image generation is not enabled in this server."
+
+    @nextcord.slash_command(name="dream", description="Generate an image from a text prompt")
+    async def dream_slash(
+        self,
+        interaction: Interaction,
+        prompt: str = SlashOption(description="What to draw"),
+        model: str = SlashOption(description="Model to use", required=False, autocomplete=True),
+        steps: int = SlashOption(description="Sampling steps", required=False, min_value=10, max_value=150),
+        size: str = SlashOption(description="Image size", required=False, choices=SIZES),
+        seed: int = SlashOption(description="Seed (random if omitted)", required=False, min_value=0, max_value=4294967295),
+        n: int = SlashOption(description="Number of images", required=False, min_value=1, max_value=BATCH_MAX_IMAGES)
+    ):
+        settings = await guild_config.get(interaction.guild_id)
+        if not settings.allows(interaction.channel_id):
+            await interaction.response.send_message(self.allowed_channels_text(settings), ephemeral=True)
+            return
+        custom_params, problem = self.parse_dream_options(model, steps, size, seed, n)
+        if problem:
+            await interaction.response.send_message(problem, ephemeral=True)
+            return
+        # Only the first response can be ephemeral, so a full queue is reported before deferring
+        busy = await self.check_admission(DEFAULT_BACKEND, interaction.user.id)
+        if busy:
+            await interaction.response.send_message(self.busy_message(busy), ephemeral=True)
+            return
+        # The deferred response becomes the status message of the job
+        await interaction.response.defer()
+        await self.dispatch(interaction, prompt, custom_params, admitted=True)
+
+    @dream_slash.on_autocomplete("model")
+    async def dream_model_autocomplete(self, interaction: Interaction, model: str):
+        matches = [name for name in self.available_models if (model or "").lower() in name.lower()]
+        await interaction.response.send_autocomplete(matches[:25])
+
+    def parse_dream_options(self, model=None, steps=None, size=None, seed=None, n=None):
+        """Validate the /dream options once and return ``(custom_params, problem)``."""
+        custom_params = {}
+        if model is not None:
+            if self.available_models and model not in self.available_models:
+                return None, f"Unknown model `{model}`. Use `!list_models` to see the available models."
+            custom_params["models"] = [model]
+
+        options = {}
+        if steps is not None:
+            options["steps"] = steps
+        if size is not None:
+            width, _, height = size.partition("x")
+            options["width"], options["height"] = int(width), int(height)
+        if seed is not None:
+            options["seed"] = str(seed)
+        if n is not None:
+            options["n"] = n
+        if options:
+            custom_params["params"] = options
+        return custom_params or None, None
 
     @commands.command(name="dream")
-    async def dream_command(self, ctx, *, prompt):
-        if ctx.channel.id != self.channel_id:
+    async def dream_command(self, ctx, *, prompt=""):
+        if not await self.channel_settings(ctx.channel):
+            return
+        if not prompt.strip():
+            await ctx.send("Please provide a prompt after the !dream command.")
             return
-        await self.generate_and_send_image(ctx.channel, prompt)
+        prompt, custom_params = parse_batch_option(prompt)
+        await self.dispatch(ctx, prompt, custom_params)
 
     @commands.command(name="list_models")
     async def list_models_command(self, ctx):
-        if ctx.channel.id != self.channel_id:
-            return
         """Command to list available models"""
+        if not await self.channel_settings(ctx.channel):
+            return
         await ctx.send("Fetching available models...")
         try:
-            models = await self.get_available_models()
-            if models:
-                model_list = "\n".join(models)
+            index = await model_catalog.get_index()
+            if index:
+                model_list = "\n".join(
+                    f"{model} ({index[model]['workers']} workers, {index[model]['performance']:.1f} megapixelsteps/s)"
+                    for model in model_catalog.models
+                )
                 await ctx.send(f"Available models:\n```\n{model_list}\n```")
             else:
                 await ctx.send("No models found or an error occurred while fetching models.")
@@ -385,43 +426,372 @@ class ImageGeneration(commands.Cog):
             error(error_message)
             await ctx.send(error_message)
 
+    @commands.command(name="cache_stats")
+    async def cache_stats_command(self, ctx):
+        """Command to show result cache hit/miss counters"""
+        if not await self.channel_settings(ctx.channel):
+            return
+        stats = result_cache.stats
+        await ctx.send(f"Result cache: {stats['hits']} hits, {stats['misses']} misses, {stats['joins']} joined in-flight requests")
+
+    @commands.command(name="stats")
+    async def stats_command(self, ctx):
+        """Command to show per-stage latencies, queue depth and job counters"""
+        if not await self.channel_settings(ctx.channel):
+            return
+        lines = [f"{'Stage':<14}{'Count':>7}{'Mean':>9}{'p95':>9}"]
+        for stage, summary in sorted(STAGE_SECONDS.summary("stage").items()):
+            p95 = f"≤{summary['p95']:g}s" if summary['p95'] != float("inf") else "slow"
+            lines.append(f"{stage:<14}{summary['count']:>7}{summary['mean']:>8.2f}s{p95:>9}")
+        if len(lines) == 1:
+            lines.append("No generations recorded yet")
+
+        queue_depth = sum(len(queue) for queue in queue_manager.queues.values())
+        in_flight = ", ".join(f"{backend} {count}" for backend, count in queue_manager.active.items() if count) or "none"
+        rate_limited = sum(queue_manager.rate_limited.values.values())
+        shed = ", ".join(f"{count} {reason[0]}" for reason, count in sorted(queue_manager.shed.values.items())) or "none"
+        outcomes = {}
+        for (_, outcome), count in JOBS.values.items():
+            outcomes[outcome] = outcomes.get(outcome, 0) + count
+        cache = result_cache.stats
+
+        lines += [
+            "",
+            f"Queued requests: {queue_depth}",
+            f"Jobs in flight: {in_flight}",
+            f"Rate-limit waits: {rate_limited}",
+            f"Shed requests: {shed}",
+            "Jobs: " + (", ".join(f"{count} {outcome}" for outcome, count in sorted(outcomes.items())) or "none"),
+            f"Result cache: {cache['hits']} hits, {cache['misses']} misses, {cache['joins']} joins"
+        ]
+        await ctx.send("```\n" + "\n".join(lines) + "\n```")
+
+    @commands.command(name="allow_channel")
+    @commands.guild_only()
+    @commands.has_guild_permissions(manage_guild=True)
+    async def allow_channel_command(self, ctx, channel: nextcord.TextChannel = None):
+        """Admin command to let the bot generate images in a channel (default: this one)"""
+        channel = channel or ctx.channel
+        settings = await guild_config.allow_channel(ctx.guild.id, channel.id)
+        await ctx.send(f"Image generation enabled in {channel.mention}. Allowed channels: "
+                       + " ".join(f"<#{channel_id}>" for channel_id in sorted(settings.channels)))
+
+    @commands.command(name="disallow_channel")
+    @commands.guild_only()
+    @commands.has_guild_permissions(manage_guild=True)
+    async def disallow_channel_command(self, ctx, channel: nextcord.TextChannel = None):
+        """Admin command to stop the bot generating images in a channel (default: this one)"""
+        channel = channel or ctx.channel
+        settings = await guild_config.disallow_channel(ctx.guild.id, channel.id)
+        remaining = " ".join(f"<#{channel_id}>" for channel_id in sorted(settings.allowed_channels)) or "none"
+        await ctx.send(f"Image generation disabled in {channel.mention}. Allowed channels: {remaining}")
+
+    @commands.command(name="guild_config")
+    @commands.guild_only()
+    @commands.has_guild_permissions(manage_guild=True)
+    async def guild_config_command(self, ctx, setting=None, value=None):
+        """Admin command to show the server's settings or change one (`none` restores the default)"""
+        if setting is not None:
+            if value is None:
+                await ctx.send(f"Usage: `!guild_config <setting> <value|none>`. Settings: {', '.join(SETTINGS)}")
+                return
+            if setting == "default_model" and value.lower() != "none" and self.available_models and value not in self.available_models:
+                await ctx.send(f"Unknown model `{value}`. Use `!list_models` to see the available models.")
+                return
+            try:
+                await guild_config.set(ctx.guild.id, setting, None if value.lower() == "none" else value)
+            except ValueError as e:
+                await ctx.send(str(e))
+                return
+
+        settings = await guild_config.get(ctx.guild.id)
+        channels = " ".join(f"<#{channel_id}>" for channel_id in sorted(settings.allowed_channels)) or "none"
+        lines = [f"Allowed channels: {channels}"]
+        lines += [f"{name}: {getattr(settings, name) if getattr(settings, name) is not None else 'default'}" for name in SETTINGS]
+        await ctx.send("\n".join(lines))
+
     @commands.Cog.listener()
-    async def on_message(self, message):
-        if message.author == self.bot.user:
+    async def on_interaction(self, interaction: Interaction):
+        """Route clicks on image buttons and menus, rebuilding their state from the view state store."""
+        if interaction.type != nextcord.InteractionType.component:
             return
-        
-        if message.channel.id != self.channel_id:
+        custom_id = (interaction.data or {}).get("custom_id", "")
+        prefix, _, rest = custom_id.partition(":")
+        if prefix != COMPONENT_PREFIX:
             return
-        
-        if message.content.startswith('!dream'):
-            await self.handle_dream_command(message)
+        action, _, key = rest.partition(":")
+        debug("Component interaction: %s (%s)", action, key)
 
-    async def handle_dream_command(self, message):
-        info(f"Handling dream command: {message.content}")
-        prompt = message.content[7:].strip()  # Remove '!dream ' from the start
+        if action == "check":
+            await self.check_generation_status(interaction, key)
+            return
+        if action == "cancel":
+            await self.cancel_from_button(interaction, int(key))
+            return
 
-        if not prompt:
-            await message.channel.send("Please provide a prompt after the !dream command.")
+        handler = getattr(self, f"on_{action}_component", None)
+        if handler is None:
+            error(f"Unknown component action: {action}")
             return
 
-        await self.generate_and_send_image(message.channel, prompt)
+        state = await view_state_store.get(key)
+        if state is None:
+            await interaction.response.send_message(
+                "The settings for this image have expired. Please start a new request with `!dream`.", ephemeral=True)
+            return
+        await handler(interaction, key, state)
 
-    async def generate_and_send_image(self, channel_or_interaction, prompt, custom_params=None):
-        # Determine if it's a channel or interaction
-        if isinstance(channel_or_interaction, nextcord.Interaction):
-            channel = channel_or_interaction.channel
-            user = channel_or_interaction.user
+    async def on_refresh_component(self, interaction, key, state):
+        await interaction.response.defer()
+        new_params = state.params
+        new_params['params']['seed'] = str(random.randint(0, 4294967295))
+        debug(f"New seed for refresh: {new_params['params']['seed']}")
+        await self.dispatch(interaction, state.prompt, new_params, state.backend, origin=key)
+
+    async def on_edit_component(self, interaction, key, state):
+        # The usual buttons, bound to this one image's settings, so every change keeps its seed
+        view = ImageGenerationView(key, actions=get_backend(state.backend).button_actions)
+        await interaction.response.send_message(
+            f"Changes made here start from this image (seed `{state.params['params']['seed']}`).", view=view, ephemeral=True)
+
+    async def on_upscale_component(self, interaction, key, state):
+        await interaction.response.defer()
+        new_params = state.params
+        new_params['params']['post_processing'] = [UPSCALER]
+        debug(f"Upscaling seed {new_params['params']['seed']} with {UPSCALER}")
+        await self.dispatch(interaction, state.prompt, new_params, state.backend)
+
+    async def on_seed_component(self, interaction, key, state):
+        await interaction.response.send_modal(SeedInputModal(self, state))
+
+    async def on_dimensions_component(self, interaction, key, state):
+        await interaction.response.send_modal(DimensionsInputModal(self, state))
+
+    async def on_steps_component(self, interaction, key, state):
+        await interaction.response.send_modal(StepsInputModal(self, state))
+
+    async def on_cfg_component(self, interaction, key, state):
+        await interaction.response.send_modal(CFGScaleInputModal(self, state))
+
+    async def on_prompt_component(self, interaction, key, state):
+        await interaction.response.send_modal(PromptInputModal(self, state))
+
+    async def on_sampler_menu_component(self, interaction, key, state):
+        view = SamplerSelectionView(key, state.params['params']['sampler_name'])
+        await interaction.response.send_message("Select a new sampler:", view=view, ephemeral=True)
+
+    async def on_model_menu_component(self, interaction, key, state):
+        view = ModelSelectionView(key, state.model, self.available_models)
+        await interaction.response.send_message("Select a new model:", view=view, ephemeral=True)
+
+    async def on_sampler_component(self, interaction, key, state):
+        await interaction.response.defer(ephemeral=True)
+        new_sampler = interaction.data["values"][0]
+        new_params = state.params
+        new_params['params']['sampler_name'] = new_sampler
+        debug(f"New sampler set to {new_sampler}")
+        await self.dispatch(interaction, state.prompt, new_params, state.backend, origin=key)
+        await interaction.followup.send(f"Generating image with new sampler: {new_sampler}", ephemeral=True)
+
+    async def on_model_component(self, interaction, key, state):
+        await interaction.response.defer(ephemeral=True)
+        new_model = interaction.data["values"][0]
+        new_params = state.params
+        new_params['models'] = [new_model]
+        debug(f"New model set to {new_model}")
+        await self.dispatch(interaction, state.prompt, new_params, state.backend, origin=key)
+        await interaction.followup.send(f"Generating image with new model: {new_model}", ephemeral=True)
+
+    async def on_flux_component(self, interaction, key, state):
+        await interaction.response.defer(ephemeral=True)
+        depth = flux_engine.queue_depth
+        note = f" {depth} other Flux request(s) are running or queued." if depth else ""
+        await interaction.followup.send(f"Flux image generation started. Please wait...{note}", ephemeral=True)
+        # Flux jobs run through the same pipeline as grid jobs, on the local Flux backend
+        await self.dispatch(interaction, state.prompt, backend="flux")
+
+    async def dispatch(self, source, prompt, custom_params=None, backend=DEFAULT_BACKEND, origin=None, admitted=False):
+        """
+        Single entry point for every user action that starts a generation.
+
+        ``source`` is the interaction (slash command, button, menu or modal)
+        or the prefix command context of the action. Each action starts at
+        most one job, even if it is delivered to the cog more than once.
+        ``origin`` is the view state key of the image a re-roll was started
+        from; a newer re-roll of the same image by the same user cancels it.
+        ``admitted`` is set by callers that already passed ``check_admission``.
+        """
+        # Interactions are told apart from command contexts by their response, so test fakes work too
+        is_interaction = hasattr(source, "response")
+        action_id = source.id if is_interaction else source.message.id
+        if action_id in self.dispatched:
+            info(f"Ignoring duplicate delivery of action {action_id}")
+            return
+        self.remember(self.dispatched, action_id, True)
+
+        if is_interaction:
+            await self.generate_and_send_image(source, prompt, custom_params, backend, user=source.user, origin=origin,
+                                               admitted=admitted)
         else:
-            channel = channel_or_interaction
-            user = None
-            if hasattr(channel, 'guild') and channel.guild:
-                user = channel.guild.get_member(channel.last_message.author.id)
+            await self.generate_and_send_image(source.channel, prompt, custom_params, backend, user=source.author, origin=origin,
+                                               admitted=admitted)
+
+    def remember(self, history, key, value):
+        """Record ``key`` in a bounded history, dropping the oldest entries past ``DISPATCH_HISTORY_SIZE``."""
+        history[key] = value
+        history.move_to_end(key)
+        while len(history) > DISPATCH_HISTORY_SIZE:
+            history.popitem(last=False)
+
+    async def generate_and_send_image(self, channel_or_interaction, prompt, custom_params=None, backend=DEFAULT_BACKEND, user=None, origin=None,
+                                      admitted=False):
+        """
+        Post the status message for a request and queue it for a worker.
+
+        With the in-memory state backend this process runs the request itself
+        and this returns once it is handled; with a shared queue it returns as
+        soon as the request is queued.
+        """
+        # Tag this request's log records until the job has an ID of its own
+        request_id = uuid.uuid4().hex[:8]
+        set_correlation_id(request_id)
+
+        interaction = channel_or_interaction if hasattr(channel_or_interaction, "response") else None
+        channel = interaction.channel if interaction else channel_or_interaction
+
+        # Slash commands are first-time prompts; other interactions come from a posted image and are re-rolls
+        is_reroll = interaction is not None and interaction.type != nextcord.InteractionType.application_command
+        priority = self.get_request_priority(user, is_reroll=is_reroll)
 
-        # Start with a fresh copy of the default parameters
-        params = copy.deepcopy(DEFAULT_IMAGE_PARAMS)
+        # Refuse new work up front when the queues are full instead of letting it wait for a timeout
+        user_id = user.id if user else None
+        busy = None if admitted else await self.check_admission(backend, user_id)
+        if busy:
+            if interaction is not None:
+                await interaction.followup.send(self.busy_message(busy), ephemeral=True)
+            else:
+                await channel.send(self.busy_message(busy))
+            return
+
+        # Requests still waiting after MAX_WAIT_TIME, or once their interaction token has expired, are dropped
+        deadline = time.time() + MAX_WAIT_TIME
+        created_at = getattr(interaction, "created_at", None)
+        if created_at is not None:
+            deadline = min(deadline, created_at.timestamp() + INTERACTION_TTL)
+
+        embed = self.new_status_embed(prompt)
+        view = CancelView(user_id)
+
+        # Send the initial status message; a deferred slash command response is turned into it
+        if interaction is not None and not is_reroll:
+            status_message = await interaction.followup.send(embed=embed, view=view, wait=True)
+        else:
+            status_message = await self.send_view(channel, embed=embed, view=view)
+        self.remember(self.status_messages, status_message.id, True)
+
+        # The newest re-roll of an image replaces the user's previous one
+        if origin is not None:
+            superseded = self.latest_rerolls.get((origin, user_id))
+            self.remember(self.latest_rerolls, (origin, user_id), status_message.id)
+            if superseded is not None and await self.cancel_request(superseded):
+                info(f"Cancelled request {superseded}, superseded by {status_message.id}")
+
+        guild = getattr(channel, "guild", None)
+        item = WorkItem(prompt, custom_params, backend, channel.id, guild.id if guild else None, status_message.id,
+                        user_id, priority, request_id, deadline=deadline)
+        item.channel, item.status_message, item.user = channel, status_message, user
+        completion = await work_queue.put(item)
+        if completion is not None:
+            await completion
+
+    async def check_admission(self, backend, user_id):
+        """Return a ``QueueFullError`` if a new request from ``user_id`` must be shed, otherwise None."""
+        scheduler = get_backend(backend).scheduler
+        try:
+            if work_queue.shared:
+                scheduler.check_depth(*await work_queue.depth(user_id))
+            scheduler.admit(get_backend(backend).endpoint("submit"), user_id)
+        except QueueFullError as e:
+            JOBS.inc(backend=backend, outcome="shed")
+            info(f"Shedding request from user {user_id}: {str(e)}")
+            return e
+        return None
+
+    def busy_message(self, exc):
+        if exc.per_user:
+            return "⏳ You already have the maximum number of requests waiting. Please wait for them to finish before starting more."
+        return f"⏳ The bot is busy right now (busy, position {exc.position}). Please try again in a few minutes."
+
+    def new_status_embed(self, prompt):
+        embed = nextcord.Embed(title="Generating Image", description=f"Prompt: {prompt}", color=0x00ff00)
+        embed.add_field(name="Status", value="Initializing...", inline=False)
+        return embed
+
+    async def run_work_items(self):
+        """Take queued requests and run them; with a shared queue at most ``WORKER_MAX_JOBS`` at once."""
+        # An in-memory queue only hands requests over; QueueManager does the scheduling
+        slots = asyncio.Semaphore(WORKER_MAX_JOBS) if work_queue.shared else None
+        info(f"Worker {WORKER_ID} taking requests from the {'shared' if work_queue.shared else 'in-memory'} queue")
+        while True:
+            if slots:
+                await slots.acquire()
+            item = await work_queue.claim()
+            task = asyncio.create_task(self.run_work_item(item))
+            self.work_tasks.add(task)
+            task.add_done_callback(self.work_tasks.discard)
+            if slots:
+                task.add_done_callback(lambda _: slots.release())
+
+    async def run_work_item(self, item):
+        set_correlation_id(item.correlation_id)
+        # Requests from another process only carry IDs; partial objects are enough to post and edit
+        channel = item.channel or self.bot.get_channel(item.channel_id) or self.bot.get_partial_messageable(item.channel_id)
+        status_message = item.status_message or channel.get_partial_message(item.message_id)
+        request = {"task": asyncio.current_task(), "backend": item.backend, "job_id": None, "embed": None,
+                   "deleted": False, "cancelling": False}
+        self.requests[item.message_id] = request
+        try:
+            user = item.user or self.find_user(channel, item.user_id)
+            if item.deadline is not None and time.time() > item.deadline:
+                get_backend(item.backend).scheduler.shed.inc(reason="expired")
+                JOBS.inc(backend=item.backend, outcome="shed")
+                await self.show_generation_error(status_message, self.new_status_embed(item.prompt),
+                                                 QueueExpiredError(f"Request {item.correlation_id} expired in the work queue"))
+                return
+            await self.process_request(channel, status_message, user, item.prompt, item.custom_params,
+                                       item.backend, item.priority, item.guild_id, item.deadline)
+        except asyncio.CancelledError:
+            # Shielded, so the job is deleted and journaled even if this task is cancelled again meanwhile
+            await asyncio.shield(self.finish_cancelled(request, status_message, item.prompt))
+        except Exception as e:
+            error(f"Failed to process request {item.correlation_id}: {str(e)}")
+        finally:
+            await self.finish_request(item.message_id)
+            if item.completion is not None and not item.completion.done():
+                item.completion.set_result(None)
+
+    def find_user(self, channel, user_id):
+        """Return the member or user with ``user_id``, or a bare ``nextcord.Object`` when it is not cached."""
+        if not user_id:
+            return None
+        guild = getattr(channel, "guild", None)
+        return (guild and guild.get_member(user_id)) or self.bot.get_user(user_id) or nextcord.Object(id=user_id)
+
+    async def process_request(self, channel, status_message, user, prompt, custom_params, backend, priority, guild_id, deadline=None):
+        backend = get_backend(backend)
+        settings = await guild_config.get(guild_id)
+        embed = self.new_status_embed(prompt)
+        request = self.requests.get(status_message.id)
+        if request is not None:
+            request["embed"] = embed
+
+        # Start with a fresh copy of the backend's default parameters
+        params = backend.default_params()
+        if backend.name == DEFAULT_BACKEND and settings.default_model:
+            params['models'] = [settings.default_model]
         
-        debug(f"Initial params: {json.dumps(params, indent=2)}")
-        debug(f"Custom params: {json.dumps(custom_params, indent=2)}")
+        debug("Initial params: %s", lazy_json(params))
+        debug("Custom params: %s", lazy_json(custom_params))
         
         # Generate a new random seed for each invocation
         params['params']['seed'] = str(random.randint(0, 4294967295))
@@ -431,153 +801,483 @@ class ImageGeneration(commands.Cog):
         # Update params with custom_params if provided
         if custom_params:
             params = self.deep_update(params, custom_params)
+
+        # Hold the request to the guild's size and step caps
+        limit_warnings = settings.apply_limits(params)
+        if limit_warnings:
+            embed.add_field(name="⚠️ Limits", value="\n".join(limit_warnings), inline=False)
+
+        # Batches step the seed per image instead of returning n copies of the same picture
+        if int(params['params'].get('n', 1)) > 1:
+            params['params']['seed_variation'] = 1
         
-        debug(f"Params after update: {json.dumps(params, indent=2)}")
+        debug("Params after update: %s", lazy_json(params))
         
         # Add the prompt to the main body
         params['prompt'] = prompt
         
-        debug(f"Final params for generation: {json.dumps(params, indent=2)}")
+        debug("Final params for generation: %s", lazy_json(params))
         
         start_time = time.time()
-        
-        # Create the initial embed
-        embed = nextcord.Embed(title="Generating Image", description=f"Prompt: {prompt}", color=0x00ff00)
-        embed.add_field(name="Status", value="Initializing...", inline=False)
-        
-        # Send the initial status message
-        status_message = await channel.send(embed=embed)
 
+        # Reject or downscale requests that no active worker can serve before spending kudos on them
+        capacity = await backend.check_capacity(params)
+        if not capacity["ok"]:
+            JOBS.inc(backend=backend.name, outcome="rejected")
+            embed.color = 0xff0000
+            embed.set_field_at(0, name="Status", value=f"❌ Error: {capacity['message']}", inline=False)
+            await status_updater.update(status_message, terminal=True, embed=embed, view=None)
+            return
+        params = capacity["params"]
+        if capacity["warnings"]:
+            embed.add_field(name="⚠️ Capacity", value="\n".join(capacity["warnings"]), inline=False)
+        if capacity["estimated_time"] is not None:
+            embed.add_field(name="💰 Cost", value=f"{capacity['cost']:.1f} megapixelsteps (~{capacity['estimated_time']:.0f}s)", inline=False)
+
+        # Identical requests are served from the cache or attach to the job already in flight
+        key = fingerprint(params)
+        cached = await result_cache.lookup(key)
+        if cached:
+            job_id, content = cached
+            info(f"Serving identical request from cached job {job_id}")
+            JOBS.inc(backend=backend.name, outcome="cached")
+            self.add_param_fields(embed, job_id, params)
+            seeds = (image_store.metadata(job_id) or {}).get("seeds")
+            await self.deliver_image(channel, status_message, embed, user, prompt, params, backend, job_id, io.BytesIO(content), "♻️ Served from cache", seeds)
+            return
+
+        pending = result_cache.join(key)
+        if pending is not None:
+            embed.set_field_at(0, name="Status", value="🔗 An identical request is already in progress. Waiting for its result...", inline=False)
+            status_updater.update(status_message, embed=embed)
+            shared = await asyncio.shield(pending)
+            if shared:
+                JOBS.inc(backend=backend.name, outcome="joined")
+                self.add_param_fields(embed, shared["job_id"], params)
+                await self.deliver_image(channel, status_message, embed, user, prompt, params, backend, shared["job_id"], io.BytesIO(shared["content"]), f"✨ Image generated in {time.time() - start_time:.1f}s", shared["seeds"])
+                return
+            # The original request failed, so submit our own job
+
+        flight = result_cache.begin(key)
         try:
-            generate_response = await generate_image_queued(prompt, params)
+            await self.run_generation(channel, status_message, embed, user, prompt, params, backend, priority, start_time, key, settings, deadline)
+        finally:
+            # No-op when the generation completed and already resolved its followers
+            result_cache.fail(key, flight)
+
+    async def run_generation(self, channel, status_message, embed, user, prompt, params, backend, priority, start_time, cache_key, settings=None, deadline=None):
+        async def show_queue_position(position, estimated_wait):
+            embed.set_field_at(0, name="Status", value=f"🕒 Waiting in queue...\n📍 Position: {position}\n⏳ Estimated wait: {estimated_wait:.0f}s", inline=False)
+            status_updater.update(status_message, embed=embed)
+
+        try:
+            generate_response = await backend.submit(
+                prompt, params,
+                user_id=user.id if user else None,
+                priority=priority,
+                on_queued=show_queue_position,
+                # Each guild gets a fair share of the queue and at most its share of the backend's job slots
+                group=settings.guild_id if settings else None,
+                group_limit=settings.max_jobs if settings else None,
+                deadline=deadline
+            )
             
-            debug(f"Generate response: {json.dumps(generate_response, indent=2)}")
+            debug("Generate response: %s", lazy_json(generate_response))
             
             if not generate_response["success"]:
-                raise Exception(f"Failed to initiate image generation: {generate_response['message']}")
+                raise GenerationRequestError(f"Failed to initiate image generation: {generate_response['message']}",
+                                             generate_response.get("statusCode", 0))
 
             job_id = generate_response["id"]
+            set_correlation_id(job_id)
+            request = self.requests.get(status_message.id)
+            if request is not None:
+                request["job_id"] = job_id
+
+            # Journal the job so it can be resumed if the bot restarts before it is delivered
+            await job_journal.record_submit(job_id, channel.id, status_message.id, user.id if user else None, prompt, params, backend.name)
+            # The journal resumes the job from here on, so the request must not be claimed again
+            await work_queue.release(status_message.id)
             
             embed.set_field_at(0, name="Status", value="Generation in progress...", inline=False)
-            embed.add_field(name="🔢 Job ID", value=f"`{job_id}`", inline=False)
-            embed.add_field(name="🖼️ Dimensions", value=f"{params['params']['width']}x{params['params']['height']}", inline=True)
-            embed.add_field(name="🔄 Steps", value=f"{params['params']['steps']}", inline=True)
-            embed.add_field(name="⚖️ CFG Scale", value=f"{params['params']['cfg_scale']}", inline=True)
-            embed.add_field(name="🧪 Sampler", value=f"{params['params']['sampler_name']}", inline=True)
-            embed.add_field(name="🎲 Seed", value=f"`{params['params']['seed']}`", inline=True)
-            embed.add_field(name="🤖 Model", value=f"{params['models'][0]}", inline=True)
+            self.add_param_fields(embed, job_id, params)
+            embed.add_field(name="⏱️ Queue Wait", value=f"{generate_response['queue_wait']:.1f}s", inline=True)
             
-            await status_message.edit(embed=embed)
-            
-            check_count = 0
-            progress_emojis = ["🥚", "🐣", "🐥", "🐤"]
-            total_duration = 30  # 30 seconds for the emoji progression
+            status_updater.update(status_message, embed=embed)
 
-            while time.time() - start_time < MAX_WAIT_TIME:
-                check_count += 1
+        except Exception as e:
+            shed = isinstance(e, (QueueFullError, QueueExpiredError))
+            JOBS.inc(backend=backend.name, outcome="shed" if shed else "failed")
+            await self.show_generation_error(status_message, embed, e)
+            return
+
+        await self.wait_and_deliver(channel, status_message, embed, user, prompt, params, backend, job_id, start_time, cache_key)
+
+    async def wait_and_deliver(self, channel, status_message, embed, user, prompt, params, backend, job_id, start_time, cache_key=None):
+        try:
+            async def show_progress(status_response):
                 elapsed_time = time.time() - start_time
-                
-                # Calculate progress index based on elapsed time
-                progress_index = min(int((elapsed_time / total_duration) * len(progress_emojis)), len(progress_emojis) - 1)
-                progress_emoji = progress_emojis[progress_index]
-                
-                embed.set_field_at(0, name="Status", value=f"{progress_emoji} Generation in progress...\n Check attempt: {check_count}\n⏳ Time elapsed: {elapsed_time:.1f}s", inline=False)
-                await status_message.edit(embed=embed)
-                
-                status_response = await check_image_status_queued(job_id)
-                
-                if status_response["success"] and status_response["done"]:
-                    # Use the chicken emoji when generation is complete
-                    embed.set_field_at(0, name="Status", value="🐔 Generation complete! Preparing image...", inline=False)
-                    await status_message.edit(embed=embed)
-                    
-                    img_url = await retrieve_generated_image_queued(job_id)
-                    if img_url:
-                        download_response = download_image(img_url)
-                        if download_response["success"]:
-                            image_path = f"generated_images/{job_id}.png"
-                            with open(image_path, "wb") as f:
-                                f.write(download_response["content"])
-                            
-                            file = nextcord.File(image_path, filename=f"{job_id}.png")
-                            embed.set_image(url=f"attachment://{job_id}.png")
-                            embed.set_field_at(0, name="Status", value=f"✨ Image generated in {elapsed_time:.1f}s", inline=False)
-                            
-                            # Create a view with the refresh, change seed, and change dimensions buttons
-                            view = ImageGenerationView(self, prompt, params)
-                            
-                            # Mention the user who initiated the request
-                            content = f"{user.mention if user else 'Your'} image is ready!"
-                            
-                            await status_message.delete()
-                            await channel.send(content=content, embed=embed, file=file, view=view)
-                            return
-                
-                await asyncio.sleep(CHECK_INTERVAL)
-            
+
+                if status_response.get("processing"):
+                    state = "🎨 Generating..."
+                else:
+                    state = f"🕒 Waiting for a worker (queue position {status_response.get('queue_position', '?')})"
+                eta = status_response.get("wait_time")
+                eta_text = f"~{eta}s" if eta is not None else "unknown"
+
+                embed.set_field_at(0, name="Status", value=f"{state}\n⏳ Server ETA: {eta_text}\n⌛ Time elapsed: {elapsed_time:.1f}s", inline=False)
+                status_updater.update(status_message, embed=embed)
+
+            # The shared poller checks this job alongside every other in-flight job
+            try:
+                status_response = await asyncio.wait_for(
+                    job_poller.watch(job_id, on_update=show_progress, check_func=backend.status),
+                    timeout=max(MAX_WAIT_TIME - (time.time() - start_time), 0)
+                )
+            except asyncio.TimeoutError:
+                job_poller.unwatch(job_id)
+                status_response = None
+
+            if status_response and not status_response["done"]:
+                raise Exception(f"Image generation for job {job_id} cannot be completed")
+
+            if status_response:
+                elapsed_time = time.time() - start_time
+                await job_journal.update_state(job_id, STATE_DONE)
+
+                embed.set_field_at(0, name="Status", value="✅ Generation complete! Preparing image...", inline=False)
+                status_updater.update(status_message, embed=embed)
+
+                fetched = await self.fetch_job_images(backend, job_id)
+                if fetched:
+                    content, seeds = fetched
+                    # Followers get the bytes straight away; the image store is written after the upload
+                    if cache_key:
+                        result_cache.complete(cache_key, job_id, content, seeds)
+
+                    await self.deliver_image(channel, status_message, embed, user, prompt, params, backend, job_id, io.BytesIO(content), f"✨ Image generated in {elapsed_time:.1f}s", seeds)
+                    self.archive_image(backend, job_id, content, prompt, params, seeds)
+                    await job_journal.update_state(job_id, STATE_DELIVERED)
+                    JOBS.inc(backend=backend.name, outcome="delivered")
+                    return
+
             # If we've reached this point, it means we've hit the timeout
+            await job_journal.update_state(job_id, STATE_TIMEOUT)
+            JOBS.inc(backend=backend.name, outcome="timeout")
             embed.color = 0xFFA500  # Orange color to indicate pending status
             embed.set_field_at(0, name="Status", value="⏳ Timeout reached. The image generation may still be in progress.", inline=False)
             
             # Add a "Check Status" button
-            view = ManualCheckView(self, job_id)
+            view = ManualCheckView(job_id)
             
-            await status_message.edit(embed=embed, view=view)
+            await status_updater.update(status_message, terminal=True, embed=embed, view=view)
             
             return  # Exit the function without raising an exception
 
-        except HTTPError as http_err:
-            error(f"HTTP error occurred: {http_err}")
-            if http_err.response.status_code == 403:
+        except Exception as e:
+            await job_journal.update_state(job_id, STATE_FAILED)
+            JOBS.inc(backend=backend.name, outcome="failed")
+            await self.show_generation_error(status_message, embed, e)
+        finally:
+            # Free the backend's job slot whether the job was delivered, failed or timed out
+            backend.finish(job_id)
+
+    async def fetch_job_images(self, backend, job_id):
+        """
+        Fetch every image of a finished job from its backend.
+
+        Returns ``(content, seeds)`` with the image bytes (a numbered grid when
+        the job produced several images) and the seed of each image, or None
+        when nothing could be fetched.
+        """
+        images = await backend.fetch_result(job_id)
+        if not images:
+            return None
+        seeds = [image["seed"] for image in images]
+        if len(images) == 1:
+            return images[0]["content"], seeds
+
+        with time_stage("composite", backend.name):
+            content = await asyncio.to_thread(composite_grid, [image["content"] for image in images])
+        return content, seeds
+
+    def archive_image(self, backend, job_id, content, prompt, params, seeds):
+        """Write a delivered image to the image store in a background task, off the delivery path."""
+        if not ARCHIVE_GENERATED_IMAGES:
+            return
+
+        async def archive():
+            try:
+                with time_stage("store", backend.name, params['models'][0] if params else None):
+                    await image_store.put(job_id, content, prompt, params, seeds)
+            except Exception as e:
+                error(f"Failed to archive image for job {job_id}: {str(e)}")
+
+        task = asyncio.create_task(archive())
+        self.archive_tasks.add(task)
+        task.add_done_callback(self.archive_tasks.discard)
+
+    async def show_generation_error(self, status_message, embed, exc):
+        if isinstance(exc, GenerationRequestError):
+            error(f"HTTP error occurred ({exc.status}): {exc}")
+            if exc.status == 403:
                 error_message = ("Generation failed. This might be due to high resource usage. "
                                  "Please try lowering the number of steps or reducing the image dimensions.")
             else:
-                error_message = f"An error occurred while generating the image: {http_err}"
-            
-            embed.color = 0xff0000
-            embed.set_field_at(0, name="Status", value=f"❌ Error: {error_message}", inline=False)
-            
-            await status_message.edit(embed=embed)
-
-        except Exception as e:
-            error(f"Error in image generation: {str(e)}")
+                error_message = f"An error occurred while generating the image: {exc}"
+        elif isinstance(exc, QueueFullError):
+            info(f"Request shed: {str(exc)}")
+            error_message = self.busy_message(exc)
+        elif isinstance(exc, QueueExpiredError):
+            info(f"Request dropped: {str(exc)}")
+            error_message = "The bot was too busy to start this request in time. Please try again."
+        else:
+            error(f"Error in image generation: {str(exc)}")
             error_message = ("You have exceeded the compute for the generation. "
                              "Please reduce steps and/or dimensions and try again.")
-            embed.color = 0xff0000
-            embed.set_field_at(0, name="Status", value=f"❌ Error: {error_message}", inline=False)
-            
+
+        embed.color = 0xff0000
+        embed.set_field_at(0, name="Status", value=f"❌ Error: {error_message}", inline=False)
+
+        await status_updater.update(status_message, terminal=True, embed=embed, view=None)
+
+    async def cancel_request(self, message_id, deleted=False):
+        """
+        Cancel the request behind a status message, wherever it runs.
+
+        Returns "running" when this process cancelled it, "queued" when it was
+        taken out of the shared queue before any worker saw it, "requested"
+        when a worker was asked to cancel it, and None when it has already
+        finished or is not known.
+        """
+        request = self.requests.get(message_id)
+        if request is not None:
+            request["deleted"] = request["deleted"] or deleted
+            # A repeated cancel (a double click, or Cancel and then deleting the message) must not interrupt the cleanup
+            if not request["cancelling"]:
+                request["cancelling"] = True
+                request["task"].cancel()
+            return "running"
+        if work_queue.shared:
+            outcome = await work_queue.cancel(message_id, deleted)
+            if outcome is not None:
+                return "queued" if outcome else "requested"
+        self.status_messages.pop(message_id, None)
+        return None
+
+    async def finish_request(self, message_id):
+        """Stop tracking a finished request, so deleting or superseding its status message cancels nothing."""
+        self.status_messages.pop(message_id, None)
+        if self.requests.pop(message_id, None) is not None:
+            await work_queue.finish(message_id)
+
+    async def finish_cancelled(self, request, status_message, prompt):
+        """Stop a cancelled request's job on its backend and mark its status message as cancelled."""
+        backend = get_backend(request["backend"])
+        job_id = request["job_id"]
+        if job_id:
+            # Stop polling first; the DELETE then frees the grid worker and the kudos
+            job_poller.unwatch(job_id)
+            await backend.cancel(job_id)
+            await job_journal.update_state(job_id, STATE_CANCELLED)
+        info(f"Request {status_message.id} cancelled" + (f" along with job {job_id}" if job_id else " before submission"))
+        JOBS.inc(backend=backend.name, outcome="cancelled")
+        if request["deleted"]:
+            status_updater.discard(status_message)
+        else:
+            await self.show_cancelled(status_message, request["embed"] or self.new_status_embed(prompt))
+
+    async def show_cancelled(self, status_message, embed):
+        embed.color = 0x808080
+        embed.set_field_at(0, name="Status", value="🛑 Cancelled", inline=False)
+        await status_updater.update(status_message, terminal=True, embed=embed, view=None)
+
+    async def cancel_from_button(self, interaction, user_id):
+        permissions = getattr(interaction.user, "guild_permissions", None)
+        if interaction.user.id != user_id and not (permissions and permissions.manage_messages):
+            await interaction.response.send_message("Only the person who started this request can cancel it.", ephemeral=True)
+            return
+        await interaction.response.defer()
+        outcome = await self.cancel_request(interaction.message.id)
+        if outcome == "queued":
+            # No worker ever saw the request, so nobody else updates its status message
+            await self.show_cancelled(interaction.message, interaction.message.embeds[0])
+        elif outcome is None:
+            await interaction.followup.send("This request has already finished.", ephemeral=True)
+
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload):
+        """Deleting a status message cancels its request."""
+        if payload.message_id in self.requests or payload.message_id in self.status_messages:
+            await self.cancel_request(payload.message_id, deleted=True)
+            # The message is gone, so nothing can refer to it again
+            self.status_messages.pop(payload.message_id, None)
+
+    async def watch_requests(self):
+        """
+        Keep the shared queue's leases on running requests alive and cancel
+        those that a gateway was asked to cancel.
+        """
+        renewed_at = time.monotonic()
+        while True:
+            await asyncio.sleep(WORK_POLL_INTERVAL)
+            if not self.requests:
+                continue
+            if time.monotonic() - renewed_at >= WORK_LEASE_TIME / 3:
+                renewed_at = time.monotonic()
+                await work_queue.renew(list(self.requests))
+            for message_id, deleted in await work_queue.cancelled(list(self.requests)):
+                await self.cancel_request(message_id, deleted)
+
+    async def resume_jobs(self):
+        """Resume polling and delivery for jobs that were still in flight when the bot stopped."""
+        # Worker processes never connect to the gateway, so they are never "ready"
+        if BOT_ROLE != "worker":
+            await self.bot.wait_until_ready()
+        await job_journal.expire(JOB_RESUME_MAX_AGE)
+        jobs = await job_journal.unfinished(JOB_RESUME_MAX_AGE, before=self.started_at)
+        if jobs:
+            info(f"Resuming {len(jobs)} unfinished job(s) from the journal")
+        for job in jobs:
+            asyncio.create_task(self.resume_job(job))
+
+    async def resume_job(self, job):
+        job_id = job["job_id"]
+        set_correlation_id(job_id)
+        try:
+            channel = self.bot.get_channel(job["channel_id"]) or await self.bot.fetch_channel(job["channel_id"])
+        except nextcord.HTTPException as e:
+            error(f"Cannot resume job {job_id}: channel {job['channel_id']} is unavailable ({str(e)})")
+            await job_journal.update_state(job_id, STATE_FAILED)
+            return
+
+        user = self.find_user(channel, job["user_id"])
+
+        embed = self.new_status_embed(job['prompt'])
+        embed.set_field_at(0, name="Status", value="🔁 Resumed after restart...", inline=False)
+        self.add_param_fields(embed, job_id, job["params"])
+
+        try:
+            status_message = await channel.fetch_message(job["message_id"])
             await status_message.edit(embed=embed)
+        except nextcord.HTTPException:
+            status_message = await channel.send(embed=embed)
+
+        await self.wait_and_deliver(channel, status_message, embed, user, job["prompt"], job["params"], get_backend(job["backend"]), job_id, time.time())
+
+    def add_param_fields(self, embed, job_id, params):
+        embed.add_field(name="🔢 Job ID", value=f"`{job_id}`", inline=False)
+        embed.add_field(name="🖼️ Dimensions", value=f"{params['params']['width']}x{params['params']['height']}", inline=True)
+        embed.add_field(name="🔄 Steps", value=f"{params['params']['steps']}", inline=True)
+        # Not every backend has a CFG scale or sampler
+        if 'cfg_scale' in params['params']:
+            embed.add_field(name="⚖️ CFG Scale", value=f"{params['params']['cfg_scale']}", inline=True)
+        if 'sampler_name' in params['params']:
+            embed.add_field(name="🧪 Sampler", value=f"{params['params']['sampler_name']}", inline=True)
+        embed.add_field(name="🎲 Seed", value=f"`{params['params']['seed']}`", inline=True)
+        embed.add_field(name="🤖 Model", value=f"{params['models'][0]}", inline=True)
+
+    async def build_image_view(self, prompt, params, backend, seeds=None):
+        """Store the state behind a posted image's buttons and return its view."""
+        # Post-processing belongs to the upscale request only; re-rolls from its result start without it
+        params = copy.deepcopy(params)
+        params['params'].pop('post_processing', None)
+        image_keys = []
+        if seeds and len(seeds) > 1:
+            # Each image of a batch can be re-rolled or upscaled on its own from its seed
+            for index, seed in enumerate(seeds):
+                image_params = copy.deepcopy(params)
+                image_params['params']['n'] = 1
+                image_params['params'].pop('seed_variation', None)
+                if seed is not None:
+                    image_params['params']['seed'] = str(seed)
+                else:
+                    image_params['params']['seed'] = str(int(params['params']['seed']) + index)
+                image_keys.append(await view_state_store.put(prompt, image_params, backend.name))
+        return ImageGenerationView(await view_state_store.put(prompt, params, backend.name), image_keys, backend.button_actions)
+
+    async def deliver_image(self, channel, status_message, embed, user, prompt, params, backend, job_id, buffer, status_text, seeds=None):
+        # The status message is replaced, so pending progress edits are obsolete, and the
+        # request can no longer be cancelled by deleting it
+        status_updater.discard(status_message)
+        await self.finish_request(status_message.id)
+
+        file = nextcord.File(buffer, filename=f"{job_id}.png")
+        embed.set_image(url=f"attachment://{job_id}.png")
+        embed.set_field_at(0, name="Status", value=status_text, inline=False)
+
+        # Create a view with the refresh, change seed, and change dimensions buttons
+        view = await self.build_image_view(prompt, params, backend, seeds)
+
+        # Mention the user who initiated the request
+        noun = f"{len(seeds)} images are" if seeds and len(seeds) > 1 else "image is"
+        content = f"{f'<@{user.id}>' if user else 'Your'} {noun} ready!"
+
+        await status_message.delete()
+        with time_stage("upload", backend.name, params['models'][0]):
+            await self.send_view(channel, content=content, embed=embed, file=file, view=view)
+
+    async def send_view(self, channel, **kwargs):
+        """Send a message with a ``KeyedView`` and drop nextcord's reference to the view."""
+        message = await channel.send(**kwargs)
+        view_store = getattr(getattr(self.bot, "_connection", None), "_view_store", None)
+        if view_store is not None:
+            view_store.remove_message_tracking(message.id)
+        return message
 
     async def check_generation_status(self, interaction: Interaction, job_id: str):
+        set_correlation_id(job_id)
         embed = interaction.message.embeds[0]
-        
-        status_response = await check_image_status_queued(job_id)
-        
-        if status_response["success"] and status_response["done"]:
+        job = await job_journal.get(job_id) or {}
+        backend = get_backend(job.get("backend"))
+        metadata = image_store.metadata(job_id) or {}
+        prompt = metadata.get("prompt") or job.get("prompt") or (embed.description or "").replace("Prompt: ", "", 1)
+        params = metadata.get("params") or job.get("params")
+
+        # Images that were already delivered are served from the store without any API calls
+        content = await image_store.get(job_id)
+        if content is not None:
+            await interaction.response.defer()
+            buffer = io.BytesIO(content)
+        else:
+            status_response = await backend.status(job_id)
+
+            if not (status_response["success"] and status_response["done"]):
+                # If the image is not ready yet
+                embed.set_field_at(0, name="Status", value="🔄 Image is still being generated. Please check again later.", inline=False)
+                await interaction.response.edit_message(embed=embed)
+                return
+
             embed.set_field_at(0, name="Status", value="✅ Generation complete! Preparing image...", inline=False)
             await interaction.response.edit_message(embed=embed)
-            
-            img_url = await retrieve_generated_image_queued(job_id)
-            if img_url:
-                download_response = download_image(img_url)
-                if download_response["success"]:
-                    image_path = f"generated_images/{job_id}.png"
-                    with open(image_path, "wb") as f:
-                        f.write(download_response["content"])
-                    
-                    file = nextcord.File(image_path, filename=f"{job_id}.png")
-                    embed.set_image(url=f"attachment://{job_id}.png")
-                    embed.set_field_at(0, name="Status", value="✨ Image generated successfully!", inline=False)
-                    
-                    # Create a view with the refresh, change seed, and change dimensions buttons
-                    view = ImageGenerationView(self, embed.fields[0].value.strip('`'), {})
-                    
-                    await interaction.edit_original_message(embed=embed, file=file, view=view)
-                    return
-        
-        # If the image is not ready yet
-        embed.set_field_at(0, name="Status", value="🔄 Image is still being generated. Please check again later.", inline=False)
-        await interaction.response.edit_message(embed=embed)
+
+            fetched = await self.fetch_job_images(backend, job_id)
+            if not fetched:
+                embed.set_field_at(0, name="Status", value="🔄 The image could not be downloaded. Please check again later.", inline=False)
+                await interaction.edit_original_message(embed=embed)
+                return
+
+            content, seeds = fetched
+            metadata = {**metadata, "seeds": seeds}
+            buffer = io.BytesIO(content)
+            self.archive_image(backend, job_id, content, prompt, params, seeds)
+
+        file = nextcord.File(buffer, filename=f"{job_id}.png")
+        embed.set_image(url=f"attachment://{job_id}.png")
+        embed.set_field_at(0, name="Status", value="✨ Image generated successfully!", inline=False)
+
+        # The image buttons need the original params, which are only known for journaled or archived jobs
+        view = await self.build_image_view(prompt, params, backend, metadata.get("seeds")) if params else None
+
+        await interaction.edit_original_message(embed=embed, file=file, view=view)
+
+    def get_request_priority(self, user, is_reroll=False):
+        roles = getattr(user, 'roles', [])
+        if any(role.id in STAFF_ROLE_IDS for role in roles):
+            return PRIORITY_STAFF
+        if is_reroll:
+            return PRIORITY_REROLL
+        return PRIORITY_NORMAL
 
     def deep_update(self, d, u):
         for k, v in u.items():
@@ -587,32 +1287,6 @@ class ImageGeneration(commands.Cog):
                 d[k] = v
         return d
 
-    async def get_available_models(self):
-        try:
-            result = subprocess.run(['python', 'test/workers.py'], capture_output=True, text=True, check=True)
-            debug(f"Raw output from workers.py: {result.stdout}")
-            
-            models = set()
-            current_worker_type = None
-            for line in result.stdout.split('\n'):
-                line = line.strip()
-                if line.startswith("Type:"):
-                    current_worker_type = line.split(":")[1].strip()
-                elif line.startswith("*") and current_worker_type == "image":
-                    model = line[1:].strip()
-                    models.add(model)
-            
-            available_models = list(models)
-            debug(f"Available image models: {available_models}")
-            return available_models
-        except subprocess.CalledProcessError as e:
-            error(f"Error running workers.py: {e}")
-            error(f"workers.py stderr: {e.stderr}")
-            raise
-        except Exception as e:
-            error(f"Unexpected error in get_available_models: {e}")
-            raise
-
 def setup(bot):
     bot.add_cog(ImageGeneration(bot))
     info("ImageGeneration cog setup complete")
\ No newline at end of file
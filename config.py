@@ -4,13 +4,62 @@ from dotenv import load_dotenv
 load_dotenv()
 
 DISCORD_BOT_TOKEN = os.getenv('DISCORD_BOT_TOKEN')
-CHANNEL_ID = int(os.getenv('CHANNEL_ID'))
+# Legacy single channel, used in guilds that have no allowed channels configured
+CHANNEL_ID = int(os.getenv('CHANNEL_ID')) if os.getenv('CHANNEL_ID') else None
 API_BASE_URL = os.getenv('API_ENDPOINT')
 API_KEY = os.getenv('AI_POWER_GRID_API_KEY')
 
+# Logging: level name and output format ("text" or "json")
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text').lower()
+
 HEADERS = {
     "accept": "application/json",
     "apikey": API_KEY,
     "Client-Agent": "DiscordBot:1.0:test",
     "Content-Type": "application/json"
-}
\ No newline at end of file
+}
+
+# Members with any of these role IDs get priority in the request queue
+STAFF_ROLE_IDS = [int(role_id) for role_id in os.getenv('STAFF_ROLE_IDS', '').split(',') if role_id.strip()]
+
+# Generated images are uploaded straight from memory; keeping them in the image store is optional
+ARCHIVE_GENERATED_IMAGES = os.getenv('ARCHIVE_GENERATED_IMAGES', 'true').lower() in ('1', 'true', 'yes')
+IMAGE_STORE_DIR = os.getenv('IMAGE_STORE_DIR', 'generated_images')
+IMAGE_STORE_MAX_BYTES = int(os.getenv('IMAGE_STORE_MAX_BYTES', 2 * 1024 ** 3))
+IMAGE_STORE_COMPACTION_INTERVAL = float(os.getenv('IMAGE_STORE_COMPACTION_INTERVAL', 600))
+
+# SQLite journal of in-flight jobs, used to resume them after a restart
+JOB_JOURNAL_PATH = os.getenv('JOB_JOURNAL_PATH', 'data/jobs.db')
+
+# SQLite store of the prompt and params behind each posted image's buttons
+VIEW_STATE_PATH = os.getenv('VIEW_STATE_PATH', 'data/views.db')
+
+# Process role: "all" receives Discord events and runs the jobs, "gateway" only receives events
+# and queues the work, "worker" only runs queued work (posting results through Discord's REST API)
+BOT_ROLE = os.getenv('BOT_ROLE', 'all').lower()
+# Where queued work and rate-limit budgets live: "memory" (this process only) or "sqlite"
+# (shared by every gateway and worker process on this machine)
+STATE_BACKEND = os.getenv('STATE_BACKEND', 'memory').lower()
+SHARED_STATE_PATH = os.getenv('SHARED_STATE_PATH', 'data/shared.db')
+# Stable, unique name of this worker; after a restart it resumes only its own journaled jobs
+WORKER_ID = os.getenv('WORKER_ID', 'main')
+# Requests a worker takes from a shared queue at once
+WORKER_MAX_JOBS = int(os.getenv('WORKER_MAX_JOBS', 20))
+
+# SQLite store of per-guild settings: allowed channels, default model and limits
+GUILD_CONFIG_PATH = os.getenv('GUILD_CONFIG_PATH', 'data/guilds.db')
+
+# Local Flux Gradio app used by the "Flux it" button
+FLUX_API_URL = os.getenv('FLUX_API_URL', 'http://127.0.0.1:7860/')
+FLUX_CONCURRENCY = int(os.getenv('FLUX_CONCURRENCY', 1))
+
+# Local Prometheus endpoint (/metrics); set METRICS_PORT to 0 to disable it
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', 9108))
+
+# HTTP client settings for the AI Power Grid API
+API_CONNECTION_LIMIT = int(os.getenv('API_CONNECTION_LIMIT', 10))
+API_TIMEOUT = float(os.getenv('API_TIMEOUT', 60))
+API_CONNECT_TIMEOUT = float(os.getenv('API_CONNECT_TIMEOUT', 10))
+API_KEEPALIVE_TIMEOUT = float(os.getenv('API_KEEPALIVE_TIMEOUT', 30))
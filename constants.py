@@ -24,4 +24,85 @@ DEFAULT_IMAGE_PARAMS = {
 }
 
 MAX_WAIT_TIME = 300  # 5 minutes
-CHECK_INTERVAL = 5  # 5 seconds
\ No newline at end of file
+JOB_RESUME_MAX_AGE = 3600  # Jobs older than this are not resumed after a restart
+CHECK_INTERVAL = 5  # 5 seconds, used when the API reports no wait time
+MIN_CHECK_INTERVAL = 1  # Never check a job more often than this
+MAX_CHECK_INTERVAL = 30  # Never leave a job unchecked for longer than this
+POLL_WAIT_FRACTION = 0.5  # Re-check after this fraction of the reported wait_time
+# Upper bound on a backend's jobs checked per poll round; the round size otherwise follows the backend's status budget
+POLL_BATCH_MAX = 50
+WORK_POLL_INTERVAL = 0.5  # Seconds between checks of an empty shared work queue and for cancelled requests
+WORK_LEASE_TIME = 60  # Seconds a worker holds a claimed request without renewing it before another worker may take it
+CANCEL_RECORD_TTL = 3600  # Seconds cancelled and finished requests are remembered in the shared state
+
+# Token bucket budgets per "<backend>.<operation>" endpoint: (requests, per seconds)
+RATE_LIMITS = {
+    "aipg.submit": (2, 10),
+    "aipg.status": (10, 10),  # /generate/check, used by the poller
+    "aipg.fetch": (2, 10),  # /generate/status, which the API limits much more strictly
+    "aipg.download": (10, 10),
+    "aipg.cancel": (2, 10),
+    "flux.submit": (10, 1),
+    "flux.status": (50, 1),
+    "flux.fetch": (10, 1),
+    "flux.cancel": (10, 1),
+    "default": (2, 10)
+}
+
+# Maximum number of submitted jobs each backend may have in flight at once
+BACKEND_CONCURRENCY = {
+    "aipg": 20,
+    "flux": 4,
+    "fake": 8
+}
+DEFAULT_BACKEND = "aipg"
+# Share of a backend's job slots one guild may hold unless its config sets max_jobs
+GUILD_CONCURRENCY_SHARE = 0.5
+
+# Request queue scheduling
+FAIR_QUEUEING = True  # Round-robin between guilds and users instead of strict FIFO
+PRIORITY_STAFF = 0
+PRIORITY_NORMAL = 1
+PRIORITY_REROLL = 2
+
+# Backpressure: new jobs beyond these queue depths are rejected with the position they would have had
+MAX_QUEUE_DEPTH = 100
+MAX_QUEUE_DEPTH_PER_USER = 3
+INTERACTION_TTL = 15 * 60  # Discord interaction tokens expire after 15 minutes
+
+STATUS_EDIT_INTERVAL = 1.0  # Minimum seconds between status message edits per channel
+
+MAX_IMAGE_BYTES = 10 * 1024 * 1024  # Discord's default upload limit per attachment
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+RESULT_CACHE_TTL = 3600  # Seconds an identical request is served from the image store
+RESULT_CACHE_MAX_ENTRIES = 1000
+
+MODEL_CATALOG_TTL = 300  # Seconds before the worker/model index is refreshed in the background
+CAPACITY_AUTO_DOWNSCALE = True  # Shrink oversized requests to fit the workers instead of rejecting them
+
+VIEW_STATE_MAX_ENTRIES = 50000  # Button state kept on disk; the least recently used is pruned beyond this
+VIEW_STATE_CACHE_SIZE = 500  # Button states kept in memory
+
+GUILD_CONFIG_CACHE_TTL = 30  # Seconds a guild's settings are cached before they are read again, so workers see admin changes
+
+DISPATCH_HISTORY_SIZE = 1000  # Recent user actions remembered so a redelivered action never starts a second job
+
+BATCH_MAX_IMAGES = 4  # Largest n accepted by "!dream --n N"
+GRID_TILE_SIZE = 512  # Batch images are shrunk to fit this size in the grid attachment
+UPSCALER = "RealESRGAN_x2plus"  # Post-processor used by the per-image Upscale buttons
+
+# Upper bounds (seconds) of the pipeline stage latency histograms
+METRICS_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# Arguments of the Flux app's /infer endpoint, passed in this order
+FLUX_DEFAULT_PARAMS = {
+    "model": "black-forest-labs/FLUX.1-schnell",
+    "seed": None,  # Random per request when None
+    "guidance_scale": 0,
+    "num_images": 1,
+    "randomize_seed": True,
+    "width": 1024,
+    "height": 576,
+    "steps": 4
+}
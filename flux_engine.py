@@ -0,0 +1,113 @@
+import asyncio
+import random
+from gradio_client import Client
+from config import FLUX_API_URL, FLUX_CONCURRENCY
+from constants import FLUX_DEFAULT_PARAMS
+from utils.logger import info, error, debug
+
+class FluxEngine:
+    """
+    Runs Flux generations against the local Gradio app with warm clients.
+
+    ``start`` creates one ``gradio_client.Client`` per concurrency slot so
+    the app's API schema is downloaded once instead of on every click.
+    A semaphore bounds the number of generations running at once and
+    ``queue_depth`` reports how many requests are running or waiting.
+    A client whose call fails is dropped and replaced on next use.
+    Cancelling ``generate`` is best-effort: the caller stops waiting, but
+    the running call keeps its slot until the Flux app returns.
+    """
+
+    def __init__(self, url=FLUX_API_URL, concurrency=FLUX_CONCURRENCY):
+        self.url = url
+        self.concurrency = concurrency
+        self.clients = []
+        self.waiting = 0
+        self.running = 0
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    @property
+    def queue_depth(self):
+        """Number of requests running or waiting for a slot."""
+        return self.waiting + self.running
+
+    async def _create_client(self):
+        # Client() fetches the app's API schema over HTTP, so keep it off the event loop
+        return await asyncio.to_thread(Client, self.url, verbose=False)
+
+    async def start(self):
+        """Pre-warm the client pool; failures are logged and retried on first use."""
+        results = await asyncio.gather(
+            *(self._create_client() for _ in range(self.concurrency - len(self.clients))),
+            return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                error(f"Failed to connect to the Flux server at {self.url}: {str(result)}")
+            else:
+                self.clients.append(result)
+        info(f"Flux engine ready with {len(self.clients)}/{self.concurrency} warm client(s) for {self.url}")
+
+    async def generate(self, prompt, on_queued=None, **overrides):
+        """
+        Generate one Flux image and return ``{"success", "image_path", "seed"}``.
+
+        ``on_queued(position)`` is awaited when every slot is busy; overrides
+        replace entries of ``FLUX_DEFAULT_PARAMS`` for this request.
+        """
+        params = {**FLUX_DEFAULT_PARAMS, **overrides}
+        if params["seed"] is None:
+            params["seed"] = random.randint(0, 2**32 - 1)
+
+        self.waiting += 1
+        try:
+            if self._semaphore.locked() and on_queued:
+                try:
+                    await on_queued(self.waiting)
+                except Exception as e:
+                    error(f"Flux queue position callback failed: {str(e)}")
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.running += 1
+        # A Gradio call can't be interrupted once it runs in its thread. Cancelling the caller
+        # only stops the wait, and the slot stays held until the call returns.
+        run = asyncio.ensure_future(self._run(prompt, params))
+        run.add_done_callback(self._release)
+        return await asyncio.shield(run)
+
+    def _release(self, _):
+        self.running -= 1
+        self._semaphore.release()
+
+    async def _run(self, prompt, params):
+        try:
+            client = self.clients.pop() if self.clients else await self._create_client()
+            debug(f"Starting Flux image generation for prompt: {prompt} ({self.running} running, {self.waiting} waiting)")
+            result = await asyncio.to_thread(
+                client.predict,
+                prompt,
+                params["model"],
+                params["seed"],
+                params["guidance_scale"],
+                params["num_images"],
+                params["randomize_seed"],
+                params["width"],
+                params["height"],
+                params["steps"],
+                api_name="/infer"
+            )
+            # Only clients that just worked go back to the pool
+            self.clients.append(client)
+            debug(f"Flux API response received: {result}")
+
+            if not result or len(result) < 2 or not result[0]:
+                return {"success": False, "message": "Unexpected result format from Flux API"}
+            return {"success": True, "image_path": result[0][0]["image"], "seed": result[1]}
+        except Exception as e:
+            error(f"Error generating Flux image: {str(e)}")
+            return {"success": False, "message": str(e)}
+
+# Create a global instance of FluxEngine
+flux_engine = FluxEngine()
@@ -0,0 +1,132 @@
+import time
+from config import GUILD_CONFIG_PATH, CHANNEL_ID
+from constants import GUILD_CONFIG_CACHE_TTL
+from utils.logger import info
+from utils.sqlite_store import SQLiteStore
+
+# Settings a guild can override, with the type their values are stored as
+SETTINGS = {
+    "default_model": str,
+    "max_width": int,
+    "max_height": int,
+    "max_steps": int,
+    "max_jobs": int
+}
+
+class GuildSettings:
+    """A guild's allowed channels, default model and limits; ``None`` means the bot default."""
+
+    __slots__ = ("guild_id", "channels", "default_model", "max_width", "max_height", "max_steps", "max_jobs")
+
+    def __init__(self, guild_id, channels=(), default_model=None, max_width=None, max_height=None, max_steps=None, max_jobs=None):
+        self.guild_id = guild_id
+        self.channels = set(channels)
+        self.default_model = default_model
+        self.max_width = max_width
+        self.max_height = max_height
+        self.max_steps = max_steps
+        self.max_jobs = max_jobs
+
+    @property
+    def allowed_channels(self):
+        """Channels the bot answers in; guilds without any configured fall back to ``CHANNEL_ID``."""
+        if self.channels:
+            return self.channels
+        return {CHANNEL_ID} if CHANNEL_ID else set()
+
+    def allows(self, channel_id):
+        return channel_id in self.allowed_channels
+
+    def apply_limits(self, params):
+        """Clamp ``params`` to the guild's size and step caps in place and return a warning per change."""
+        options = params.get("params", {})
+        warnings = []
+        for key, limit in (("width", self.max_width), ("height", self.max_height), ("steps", self.max_steps)):
+            if limit is not None and key in options and options[key] > limit:
+                warnings.append(f"{key.capitalize()} lowered from {options[key]} to {limit} (server limit)")
+                options[key] = limit
+        return warnings
+
+class GuildConfigStore(SQLiteStore):
+    """
+    Per-guild settings and allowed channels, configured with the admin
+    commands and kept in SQLite so they survive restarts.
+
+    Settings are looked up on every command, so each guild's record is
+    cached in memory and updated on every change made by this process.
+    Changes made by another process (a gateway, for its workers) are
+    picked up once the cached record is older than ``cache_ttl``.
+    """
+
+    SCHEMA = [
+        """
+        CREATE TABLE IF NOT EXISTS guild_settings (
+            guild_id INTEGER PRIMARY KEY,
+            default_model TEXT,
+            max_width INTEGER,
+            max_height INTEGER,
+            max_steps INTEGER,
+            max_jobs INTEGER
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS allowed_channels (
+            guild_id INTEGER NOT NULL,
+            channel_id INTEGER NOT NULL,
+            PRIMARY KEY (guild_id, channel_id)
+        )
+        """
+    ]
+
+    def __init__(self, path=GUILD_CONFIG_PATH, cache_ttl=GUILD_CONFIG_CACHE_TTL):
+        super().__init__(path)
+        self.cache_ttl = cache_ttl
+        # Guild ID -> (settings, time.monotonic() when loaded)
+        self.cache = {}
+
+    async def get(self, guild_id):
+        """Return the settings of ``guild_id``; DMs (``None``) get the bot defaults."""
+        if guild_id is None:
+            return GuildSettings(None)
+        cached = self.cache.get(guild_id)
+        if cached and time.monotonic() - cached[1] < self.cache_ttl:
+            return cached[0]
+
+        rows = await self._run("SELECT * FROM guild_settings WHERE guild_id = ?", (guild_id,))
+        channels = await self._run("SELECT channel_id FROM allowed_channels WHERE guild_id = ?", (guild_id,))
+        values = {name: rows[0][name] for name in SETTINGS} if rows else {}
+        settings = GuildSettings(guild_id, (row["channel_id"] for row in channels), **values)
+        self.cache[guild_id] = (settings, time.monotonic())
+        return settings
+
+    async def set(self, guild_id, name, value):
+        """Set one of ``SETTINGS`` for a guild; ``None`` restores the bot default."""
+        if name not in SETTINGS:
+            raise ValueError(f"Unknown setting '{name}'. Available settings: {', '.join(SETTINGS)}")
+        if value is not None:
+            value = SETTINGS[name](value)
+            if isinstance(value, int) and value <= 0:
+                raise ValueError(f"{name} must be a positive number")
+
+        settings = await self.get(guild_id)
+        await self._run("INSERT OR IGNORE INTO guild_settings (guild_id) VALUES (?)", (guild_id,))
+        await self._run(f"UPDATE guild_settings SET {name} = ? WHERE guild_id = ?", (value, guild_id))
+        setattr(settings, name, value)
+        info(f"Guild {guild_id} setting {name} set to {value}")
+        return settings
+
+    async def allow_channel(self, guild_id, channel_id):
+        settings = await self.get(guild_id)
+        await self._run("INSERT OR IGNORE INTO allowed_channels (guild_id, channel_id) VALUES (?, ?)", (guild_id, channel_id))
+        settings.channels.add(channel_id)
+        info(f"Guild {guild_id} allowed channel {channel_id}")
+        return settings
+
+    async def disallow_channel(self, guild_id, channel_id):
+        settings = await self.get(guild_id)
+        await self._run("DELETE FROM allowed_channels WHERE guild_id = ? AND channel_id = ?", (guild_id, channel_id))
+        settings.channels.discard(channel_id)
+        info(f"Guild {guild_id} disallowed channel {channel_id}")
+        return settings
+
+guild_config = GuildConfigStore()
@@ -1,48 +1,40 @@
-import requests
-import json
+import aiohttp
+import asyncio
+import io
 import traceback
 from config import API_BASE_URL, HEADERS
-from utils.logger import info, error, debug
-from constants import DEFAULT_IMAGE_PARAMS
+from utils.logger import info, error, debug, lazy_json
+from constants import DEFAULT_IMAGE_PARAMS, MAX_IMAGE_BYTES, DOWNLOAD_CHUNK_SIZE
 import copy
-from queue_manager import queue_manager
+from api_client import api_client
 
-async def generate_image_queued(prompt, custom_params=None):
-    async def generate_wrapper():
-        return generate_image(prompt, custom_params)
-    return await queue_manager.run_coroutine(generate_wrapper())
+class GenerationRequestError(Exception):
+    """The API did not accept a generation request; ``status`` is its HTTP status code, or 0 if it never answered."""
 
-async def check_image_status_queued(job_id):
-    async def check_wrapper():
-        return check_image_status(job_id)
-    return await queue_manager.run_coroutine(check_wrapper())
+    def __init__(self, message, status=0):
+        self.status = status
+        super().__init__(message)
 
-async def retrieve_generated_image_queued(job_id):
-    async def retrieve_wrapper():
-        return retrieve_generated_image(job_id)
-    return await queue_manager.run_coroutine(retrieve_wrapper())
-
-def generate_image(prompt, custom_params=None):
+async def generate_image(prompt, custom_params=None):
     endpoint = f"{API_BASE_URL}/api/v2/generate/async"
     params = copy.deepcopy(DEFAULT_IMAGE_PARAMS)
-    
+
     if custom_params:
         params.update(custom_params)
-    
+
     params['prompt'] = prompt
-    
-    debug(f"Image generation parameters: {json.dumps(params, indent=2)}")
+
+    debug("Image generation parameters: %s", lazy_json(params))
     info(f"Attempting to access endpoint: {endpoint}")
-    debug(f"Headers: {json.dumps(HEADERS, indent=2)}")
 
     try:
-        response = requests.post(endpoint, headers=HEADERS, json=params)
-        debug(f"Response status code: {response.status_code}")
-        debug(f"Response content: {response.text}")
-        response.raise_for_status()
-        data = response.json()
+        session = await api_client.get_session()
+        async with session.post(endpoint, headers=HEADERS, json=params) as response:
+            debug(f"Response status code: {response.status}")
+            response.raise_for_status()
+            data = await response.json(content_type=None)
 
-        debug(f"API response: {json.dumps(data, indent=2)}")
+        debug("API response: %s", lazy_json(data))
 
         if 'id' in data:
             info(f"Image generation initiated successfully. Job ID: {data['id']}")
@@ -52,19 +44,19 @@ def generate_image(prompt, custom_params=None):
                 "kudos": data.get('kudos')
             }
         else:
-            error(f"Failed to initiate image generation. API response: {json.dumps(data, indent=2)}")
+            error("Failed to initiate image generation. API response: %s", lazy_json(data))
             return {
                 "success": False,
-                "statusCode": response.status_code,
+                "statusCode": response.status,
                 "errors": data.get('errors', []),
                 "message": data.get('message', 'Unknown error')
             }
 
-    except requests.exceptions.RequestException as e:
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
         error(f"Error: Unable to send generate image request. Details:\n{traceback.format_exc()}")
         return {
             "success": False,
-            "statusCode": getattr(e.response, 'status_code', 0),
+            "statusCode": getattr(e, 'status', 0),
             "errors": [{"error": str(e)}],
             "message": f"Request failed: {str(e)}"
         }
@@ -77,15 +69,16 @@ def generate_image(prompt, custom_params=None):
             "message": f"An unexpected error occurred: {str(e)}"
         }
 
-def check_image_status(job_id):
+async def check_image_status(job_id):
     endpoint = f"{API_BASE_URL}/api/v2/generate/check/{job_id}"
 
     try:
-        response = requests.get(endpoint, headers=HEADERS)
-        response.raise_for_status()
-        data = response.json()
+        session = await api_client.get_session()
+        async with session.get(endpoint, headers=HEADERS) as response:
+            response.raise_for_status()
+            data = await response.json(content_type=None)
 
-        debug(f"Status check response for job {job_id}: {json.dumps(data, indent=2)}")
+        debug("Status check response for job %s: %s", job_id, lazy_json(data))
 
         if 'done' in data and 'is_possible' in data:
             return {
@@ -93,18 +86,18 @@ def check_image_status(job_id):
                 **data
             }
         else:
-            error(f"Unexpected response format for job {job_id}: {json.dumps(data, indent=2)}")
+            error("Unexpected response format for job %s: %s", job_id, lazy_json(data))
             return {
                 "success": False,
                 "message": data.get('message', 'Unknown error'),
-                "statusCode": response.status_code
+                "statusCode": response.status
             }
 
-    except requests.exceptions.RequestException as e:
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
         error(f"Error checking status for jobId: {job_id}. Details:\n{traceback.format_exc()}")
         return {
             "success": False,
-            "statusCode": getattr(e.response, 'status_code', 0),
+            "statusCode": getattr(e, 'status', 0),
             "message": str(e)
         }
     except Exception as e:
@@ -115,41 +108,126 @@ def check_image_status(job_id):
             "message": f"An unexpected error occurred: {str(e)}"
         }
 
-def download_image(img_url):
+async def download_image(img_url, max_bytes=MAX_IMAGE_BYTES):
+    """Stream an image into an in-memory buffer, refusing bodies larger than ``max_bytes``."""
     try:
-        response = requests.get(img_url)
-        response.raise_for_status()
-
+        session = await api_client.get_session()
+        async with session.get(img_url) as response:
+            response.raise_for_status()
+
+            if response.content_length and response.content_length > max_bytes:
+                error(f"Image at {img_url} is too large: {response.content_length} bytes (limit {max_bytes})")
+                return {
+                    "success": False,
+                    "statusCode": 413,
+                    "message": "image too large",
+                    "details": f"{response.content_length} bytes exceeds the {max_bytes} byte limit"
+                }
+
+            buffer = io.BytesIO()
+            async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                if buffer.tell() + len(chunk) > max_bytes:
+                    error(f"Image at {img_url} exceeded the {max_bytes} byte limit while downloading")
+                    return {
+                        "success": False,
+                        "statusCode": 413,
+                        "message": "image too large",
+                        "details": f"download exceeded the {max_bytes} byte limit"
+                    }
+                buffer.write(chunk)
+
+        size = buffer.tell()
+        buffer.seek(0)
         return {
             "success": True,
-            "content": response.content
+            "buffer": buffer,
+            "size": size
         }
 
-    except requests.exceptions.RequestException as e:
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
         error(f"Error attempting to download image: {img_url}. {str(e)}")
         return {
             "success": False,
-            "statusCode": getattr(e.response, 'status_code', 0),
+            "statusCode": getattr(e, 'status', 0),
             "message": "unknown error",
             "details": str(e)
         }
 
-def retrieve_generated_image(job_id):
+async def retrieve_generated_images(job_id):
+    """Return the image URL and seed of every generation of a finished job, or an empty list."""
+    endpoint = f"{API_BASE_URL}/api/v2/generate/status/{job_id}"
+
+    try:
+        session = await api_client.get_session()
+        async with session.get(endpoint, headers=HEADERS) as response:
+            response.raise_for_status()
+            data = await response.json(content_type=None)
+
+        debug("Image retrieval response for job %s: %s", job_id, lazy_json(data))
+
+        generations = [
+            {"img": generation["img"], "seed": generation.get("seed")}
+            for generation in data.get("generations") or []
+            if generation.get("img")
+        ]
+        if not generations:
+            error(f"No image URL found in the retrieval response for job {job_id}")
+        return generations
+
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        error(f"Error: Unable to retrieve generated image for jobId: {job_id}. Details:\n{traceback.format_exc()}")
+        return []
+
+async def cancel_image_generation(job_id):
+    """Cancel a job on the grid; generations that already finished are still returned."""
     endpoint = f"{API_BASE_URL}/api/v2/generate/status/{job_id}"
 
     try:
-        response = requests.get(endpoint, headers=HEADERS)
-        response.raise_for_status()
-        data = response.json()
+        session = await api_client.get_session()
+        async with session.delete(endpoint, headers=HEADERS) as response:
+            response.raise_for_status()
+            data = await response.json(content_type=None)
 
-        debug(f"Image retrieval response for job {job_id}: {json.dumps(data, indent=2)}")
+        info(f"Cancelled job {job_id}")
+        return {
+            "success": True,
+            **data
+        }
 
-        if "generations" in data and data["generations"]:
-            return data["generations"][0].get("img")
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        error(f"Error cancelling jobId: {job_id}. Details:\n{traceback.format_exc()}")
+        return {
+            "success": False,
+            "statusCode": getattr(e, 'status', 0),
+            "message": str(e)
+        }
+
+async def fetch_workers():
+    endpoint = f"{API_BASE_URL}/api/v2/workers"
+
+    try:
+        session = await api_client.get_session()
+        async with session.get(endpoint, headers=HEADERS) as response:
+            response.raise_for_status()
+            data = await response.json(content_type=None)
+
+        if isinstance(data, list):
+            return {
+                "success": True,
+                "workers": data
+            }
         else:
-            error(f"No image URL found in the retrieval response for job {job_id}")
-            return None
+            error(f"Unexpected workers response format: {data}")
+            return {
+                "success": False,
+                "statusCode": response.status,
+                "message": "unexpected response format"
+            }
 
-    except requests.exceptions.RequestException as e:
-        error(f"Error: Unable to retrieve generated image for jobId: {job_id}. Details:\n{traceback.format_exc()}")
-        return None
\ No newline at end of file
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        error(f"Error: Unable to fetch workers. Details:\n{traceback.format_exc()}")
+        return {
+            "success": False,
+            "statusCode": getattr(e, 'status', 0),
+            "message": str(e)
+        }
@@ -0,0 +1,232 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from config import IMAGE_STORE_DIR, IMAGE_STORE_MAX_BYTES, IMAGE_STORE_COMPACTION_INTERVAL
+from utils.logger import info, error, debug
+
+ORPHAN_GRACE_PERIOD = 300  # Seconds before an unindexed file is adopted into the index, or deleted if it is a partial write
+
+class ImageStore:
+    """
+    Content-addressed store for generated images.
+
+    Image bytes are written once per SHA-256 digest under ``objects/`` and a
+    small JSON index maps job IDs to digests along with the prompt, params,
+    size and last access time. When the stored bytes exceed ``max_bytes`` the
+    least recently used images are evicted. All disk I/O runs in worker
+    threads; the index itself is only mutated on the event loop.
+    """
+
+    def __init__(self, root=IMAGE_STORE_DIR, max_bytes=IMAGE_STORE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(root, "index.json")
+        self.objects = {}
+        self.jobs = {}
+        self.total_bytes = 0
+        self.dirty = False
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+
+    def _object_path(self, digest):
+        return os.path.join(self.root, "objects", digest[:2], f"{digest}.png")
+
+    async def _ensure_loaded(self):
+        if self._loaded:
+            return
+        async with self._load_lock:
+            if self._loaded:
+                return
+            index = await asyncio.to_thread(self._read_index)
+            self.objects = index.get("objects", {})
+            self.jobs = index.get("jobs", {})
+            self.total_bytes = sum(entry["size"] for entry in self.objects.values())
+            self._loaded = True
+            info(f"Image store loaded: {len(self.objects)} images, {self.total_bytes} bytes")
+
+    def _read_index(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            error(f"Failed to read image store index, starting empty: {str(e)}")
+            return {}
+
+    def _write_index(self, snapshot):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(snapshot)
+        os.replace(tmp_path, self.index_path)
+
+    def _write_object(self, path, content):
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+    def _read_object(self, path):
+        with open(path, "rb") as f:
+            return f.read()
+
+    async def put(self, job_id, content, prompt=None, params=None, seeds=None):
+        """Store image bytes for a job and return their digest."""
+        await self._ensure_loaded()
+        digest = hashlib.sha256(content).hexdigest()
+
+        if digest not in self.objects:
+            try:
+                await asyncio.to_thread(self._write_object, self._object_path(digest), content)
+            except OSError as e:
+                error(f"Failed to store image for job {job_id}: {str(e)}")
+                return None
+            # Another put of the same bytes may have finished while we were writing
+            if digest not in self.objects:
+                self.objects[digest] = {"size": len(content), "last_access": time.time()}
+                self.total_bytes += len(content)
+        else:
+            self.objects[digest]["last_access"] = time.time()
+            debug(f"Image for job {job_id} deduplicated against {digest}")
+
+        self.jobs[job_id] = {
+            "digest": digest,
+            "prompt": prompt,
+            "params": params,
+            "seeds": seeds,
+            "created": time.time()
+        }
+        self.dirty = True
+
+        if self.total_bytes > self.max_bytes:
+            await self._evict()
+        return digest
+
+    async def get(self, job_id):
+        """Return the stored bytes for a job, or None if it is not in the store."""
+        await self._ensure_loaded()
+        job = self.jobs.get(job_id)
+        if job is None or job["digest"] not in self.objects:
+            return None
+
+        try:
+            content = await asyncio.to_thread(self._read_object, self._object_path(job["digest"]))
+        except OSError:
+            self._drop_object(job["digest"])
+            return None
+
+        self.objects[job["digest"]]["last_access"] = time.time()
+        self.dirty = True
+        return content
+
+    def metadata(self, job_id):
+        return self.jobs.get(job_id)
+
+    def _drop_object(self, digest):
+        entry = self.objects.pop(digest, None)
+        if entry:
+            self.total_bytes -= entry["size"]
+        for job_id in [job_id for job_id, job in self.jobs.items() if job["digest"] == digest]:
+            del self.jobs[job_id]
+        self.dirty = True
+
+    async def _evict(self):
+        victims = []
+        for digest, entry in sorted(self.objects.items(), key=lambda item: item[1]["last_access"]):
+            if self.total_bytes <= self.max_bytes:
+                break
+            victims.append(digest)
+            self._drop_object(digest)
+
+        for digest in victims:
+            try:
+                await asyncio.to_thread(os.remove, self._object_path(digest))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                error(f"Failed to evict image {digest}: {str(e)}")
+        if victims:
+            info(f"Evicted {len(victims)} image(s) from the image store ({self.total_bytes} bytes remain)")
+
+    def _scan_orphans(self, known, grace_period=ORPHAN_GRACE_PERIOD):
+        """Delete stale partial writes and return ``(digest, size, mtime)`` of complete files missing from the index."""
+        removed = []
+        unindexed = []
+        cutoff = time.time() - grace_period
+        objects_dir = os.path.join(self.root, "objects")
+        for dirpath, _, filenames in os.walk(objects_dir):
+            for filename in filenames:
+                digest = filename.split(".")[0]
+                path = os.path.join(dirpath, filename)
+                # Recent files may belong to a put that has not reached the index yet
+                if digest in known or os.path.getmtime(path) >= cutoff:
+                    continue
+                if filename.endswith(".tmp"):
+                    os.remove(path)
+                    removed.append(path)
+                else:
+                    stat = os.stat(path)
+                    unindexed.append((digest, stat.st_size, stat.st_mtime))
+        return removed, unindexed
+
+    async def compact(self):
+        """Enforce the byte budget, clean up files missing from the index and persist the index."""
+        await self._ensure_loaded()
+        try:
+            removed, unindexed = await asyncio.to_thread(self._scan_orphans, set(self.objects))
+            if removed:
+                info(f"Removed {len(removed)} partial file(s) from the image store")
+            # Images stored after the index was last saved; keep them so they count towards the budget
+            for digest, size, mtime in unindexed:
+                if digest not in self.objects:
+                    self.objects[digest] = {"size": size, "last_access": mtime}
+                    self.total_bytes += size
+                    self.dirty = True
+            if unindexed:
+                info(f"Adopted {len(unindexed)} unindexed image(s) into the image store")
+        except OSError as e:
+            error(f"Failed to scan image store for orphans: {str(e)}")
+
+        if self.total_bytes > self.max_bytes:
+            await self._evict()
+        await self.flush()
+
+    def _snapshot(self):
+        self.dirty = False
+        return json.dumps({"objects": self.objects, "jobs": self.jobs})
+
+    async def flush(self):
+        """Persist the index if it changed."""
+        if not self.dirty:
+            return
+        try:
+            await asyncio.to_thread(self._write_index, self._snapshot())
+        except OSError as e:
+            self.dirty = True
+            error(f"Failed to write image store index: {str(e)}")
+
+    def flush_now(self):
+        """Persist the index on the calling thread, for shutdown hooks that can no longer await."""
+        if not self.dirty:
+            return
+        try:
+            self._write_index(self._snapshot())
+            info("Image store index saved")
+        except OSError as e:
+            self.dirty = True
+            error(f"Failed to write image store index: {str(e)}")
+
+    async def run_compaction(self, interval=IMAGE_STORE_COMPACTION_INTERVAL):
+        """Background task that compacts the store every ``interval`` seconds."""
+        while True:
+            await self.compact()
+            await asyncio.sleep(interval)
+
+# Create a global instance of ImageStore
+image_store = ImageStore()
@@ -0,0 +1,93 @@
+import json
+import time
+from config import JOB_JOURNAL_PATH, WORKER_ID
+from constants import DEFAULT_BACKEND
+from utils.logger import info
+from utils.sqlite_store import SQLiteStore
+
+STATE_SUBMITTED = "submitted"
+STATE_DONE = "done"
+STATE_DELIVERED = "delivered"
+STATE_TIMEOUT = "timeout"
+STATE_FAILED = "failed"
+STATE_CANCELLED = "cancelled"
+
+UNFINISHED_STATES = (STATE_SUBMITTED, STATE_DONE)
+
+class JobJournal(SQLiteStore):
+    """
+    Durable SQLite (WAL mode) record of submitted AI Power Grid jobs.
+
+    Every job is written at submit time with everything needed to finish it
+    (channel, status message, user, prompt and params) and its state is
+    updated as it progresses, so jobs still running when the bot stops can
+    be resumed on the next start. Jobs are tagged with the worker that
+    submitted them, so several workers can share one journal and each
+    resumes only its own jobs.
+    """
+
+    SCHEMA = [
+        """
+        CREATE TABLE IF NOT EXISTS jobs (
+            job_id TEXT PRIMARY KEY,
+            channel_id INTEGER NOT NULL,
+            message_id INTEGER,
+            user_id INTEGER,
+            prompt TEXT NOT NULL,
+            params TEXT NOT NULL,
+            state TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state)"
+    ]
+    COLUMNS = [
+        ("jobs", "backend", f"TEXT NOT NULL DEFAULT '{DEFAULT_BACKEND}'"),
+        ("jobs", "worker", "TEXT NOT NULL DEFAULT 'main'")
+    ]
+
+    def __init__(self, path=JOB_JOURNAL_PATH):
+        super().__init__(path)
+
+    async def record_submit(self, job_id, channel_id, message_id, user_id, prompt, params, backend=DEFAULT_BACKEND, worker=WORKER_ID):
+        now = time.time()
+        await self._run(
+            "INSERT OR REPLACE INTO jobs (job_id, channel_id, message_id, user_id, prompt, params, state, created_at, updated_at, backend, worker) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (job_id, channel_id, message_id, user_id, prompt, json.dumps(params), STATE_SUBMITTED, now, now, backend, worker)
+        )
+
+    async def get(self, job_id):
+        """Return the journal entry for a job, or None."""
+        rows = await self._run("SELECT * FROM jobs WHERE job_id = ?", (job_id,))
+        return {**dict(rows[0]), "params": json.loads(rows[0]["params"])} if rows else None
+
+    async def update_state(self, job_id, state):
+        await self._run("UPDATE jobs SET state = ?, updated_at = ? WHERE job_id = ?", (state, time.time(), job_id))
+
+    async def unfinished(self, max_age, worker=WORKER_ID, before=None):
+        """
+        Return ``worker``'s unfinished jobs submitted within the last ``max_age``
+        seconds and before the ``before`` timestamp (default: now), oldest first.
+        """
+        placeholders = ", ".join("?" for _ in UNFINISHED_STATES)
+        rows = await self._run(
+            f"SELECT * FROM jobs WHERE state IN ({placeholders}) AND created_at >= ? AND created_at < ? AND worker = ? ORDER BY created_at",
+            (*UNFINISHED_STATES, time.time() - max_age, before or time.time(), worker)
+        )
+        return [{**dict(row), "params": json.loads(row["params"])} for row in rows]
+
+    async def expire(self, max_age):
+        """Mark unfinished jobs older than ``max_age`` as timed out and drop finished jobs past the retention period."""
+        placeholders = ", ".join("?" for _ in UNFINISHED_STATES)
+        cutoff = time.time() - max_age
+        await self._run(
+            f"UPDATE jobs SET state = ?, updated_at = ? WHERE state IN ({placeholders}) AND created_at < ?",
+            (STATE_TIMEOUT, time.time(), *UNFINISHED_STATES, cutoff)
+        )
+        await self._run(f"DELETE FROM jobs WHERE state NOT IN ({placeholders}) AND updated_at < ?", (*UNFINISHED_STATES, cutoff))
+        info("Job journal expired old entries")
+
+# Create a global instance of JobJournal
+job_journal = JobJournal()
@@ -0,0 +1,168 @@
+import asyncio
+import math
+import time
+from constants import CHECK_INTERVAL, MIN_CHECK_INTERVAL, MAX_CHECK_INTERVAL, POLL_WAIT_FRACTION, POLL_BATCH_MAX
+from utils.logger import info, error, debug, set_correlation_id
+
+def next_check_delay(status):
+    """
+    Pick the delay before the next check from the grid's own estimate.
+
+    Jobs are re-checked after a fraction of their reported ``wait_time``,
+    so long jobs are polled rarely and checks tighten as completion nears.
+    Jobs still waiting in the grid queue are not checked more often than
+    once per queue position ahead of them.
+    """
+    wait_time = status.get("wait_time")
+    if wait_time is None:
+        return CHECK_INTERVAL
+
+    delay = wait_time * POLL_WAIT_FRACTION
+    queue_position = status.get("queue_position") or 0
+    if queue_position and not status.get("processing"):
+        delay = max(delay, queue_position * MIN_CHECK_INTERVAL)
+    return min(max(delay, MIN_CHECK_INTERVAL), MAX_CHECK_INTERVAL)
+
+class JobPoller:
+    """
+    Background service that polls every in-flight job on a shared schedule.
+
+    Callers register a job ID and the function that checks it (usually a
+    backend's ``status``) with ``watch`` and await the returned future, which
+    resolves with the final check payload once the job is done or can no
+    longer complete. Each job carries its own next-check time derived
+    from the grid's ``wait_time`` and ``queue_position``. Jobs are polled in
+    one lane per backend: each round of a lane checks as many due jobs as
+    the backend's ``status`` budget has tokens for (or a fixed
+    ``batch_size``), and its rounds are at least ``MIN_CHECK_INTERVAL``
+    apart, so status calls stay within the rate limit no matter how many
+    users are waiting, and a backend waiting on its rate limit never holds
+    up another backend's jobs.
+    """
+
+    def __init__(self, check_func=None, batch_size=None, initial_delay=MIN_CHECK_INTERVAL * 2):
+        self.check_func = check_func
+        self.batch_size = batch_size
+        self.initial_delay = initial_delay
+        self.jobs = {}
+        # Lane name -> {"task", "wakeup"}
+        self.lanes = {}
+
+    @staticmethod
+    def lane_of(check_func):
+        """Jobs checked by a backend's ``status`` share that backend's lane."""
+        return getattr(getattr(check_func, "__self__", None), "name", "default")
+
+    def lane_batch_size(self, check_func):
+        """Return how many of a lane's due jobs one round may check."""
+        if self.batch_size is not None:
+            return self.batch_size
+        backend = getattr(check_func, "__self__", None)
+        try:
+            bucket = backend.scheduler.buckets[backend.endpoint("status")]
+        except (AttributeError, KeyError):
+            # The endpoint's budget only exists once its first request went through
+            return 1
+        # Take the tokens left now, but at least one round's refill, since a shared bucket only
+        # learns its balance from its own requests
+        refill = math.ceil(bucket.fill_rate * MIN_CHECK_INTERVAL)
+        return min(max(int(bucket.available()), refill, 1), POLL_BATCH_MAX)
+
+    def watch(self, job_id, on_update=None, check_func=None):
+        """Start tracking a job and return a future resolved with its final status."""
+        if job_id in self.jobs:
+            return self.jobs[job_id]["future"]
+
+        check_func = check_func or self.check_func
+        future = asyncio.get_running_loop().create_future()
+        self.jobs[job_id] = {
+            "future": future,
+            "check_func": check_func,
+            "lane": self.lane_of(check_func),
+            "on_update": on_update,
+            "next_check": time.monotonic() + self.initial_delay,
+            "checks": 0
+        }
+        lane = self._ensure_running(self.jobs[job_id]["lane"])
+        lane["wakeup"].set()
+        debug("Poller watching job %s. In-flight jobs: %d", job_id, len(self.jobs))
+        return future
+
+    def unwatch(self, job_id):
+        """Stop tracking a job, cancelling its future if nobody resolved it yet."""
+        job = self.jobs.pop(job_id, None)
+        if job and not job["future"].done():
+            job["future"].cancel()
+
+    def _ensure_running(self, name):
+        lane = self.lanes.setdefault(name, {"task": None, "wakeup": asyncio.Event()})
+        if lane["task"] is None or lane["task"].done():
+            lane["task"] = asyncio.create_task(self._run(name, lane["wakeup"]), name=f"job_poller_{name}")
+            info(f"Job poller started for {name}")
+        return lane
+
+    async def _run(self, name, wakeup):
+        while True:
+            jobs = {job_id: job for job_id, job in self.jobs.items() if job["lane"] == name}
+            if not jobs:
+                break
+            now = time.monotonic()
+            # Jobs the grid has already reported on go before jobs awaiting their first check, so a
+            # burst of new requests never delays jobs that are due to finish
+            due = sorted((job_id for job_id, job in jobs.items() if job["next_check"] <= now),
+                         key=lambda job_id: (jobs[job_id]["checks"] == 0, jobs[job_id]["next_check"]))
+            if due:
+                due = due[:self.lane_batch_size(jobs[due[0]]["check_func"])]
+
+            if not due:
+                # Sleep until the lane's earliest job is due, or until a new job is watched
+                delay = min(job["next_check"] for job in jobs.values()) - now
+                wakeup.clear()
+                try:
+                    await asyncio.wait_for(wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await asyncio.gather(*(self._check(job_id) for job_id in due))
+            await asyncio.sleep(MIN_CHECK_INTERVAL)
+        info(f"Job poller idle for {name}")
+
+    async def _check(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None:
+            return
+
+        # Each check runs in its own task, so this only tags this job's records
+        set_correlation_id(job_id)
+        job["checks"] += 1
+        try:
+            status = await job["check_func"](job_id)
+        except Exception as e:
+            error(f"Poller failed to check job {job_id}: {str(e)}")
+            job["next_check"] = time.monotonic() + CHECK_INTERVAL
+            return
+
+        # The job may have been unwatched while the check was in flight
+        if self.jobs.get(job_id) is not job:
+            return
+
+        status["checks"] = job["checks"]
+        if status.get("success") and (status.get("done") or status.get("faulted") or not status.get("is_possible", True)):
+            self.jobs.pop(job_id, None)
+            if not job["future"].done():
+                job["future"].set_result(status)
+            return
+
+        job["next_check"] = time.monotonic() + (next_check_delay(status) if status.get("success") else CHECK_INTERVAL)
+        debug("Job %s: wait_time=%s, queue_position=%s, next check in %.1fs", job_id, status.get("wait_time"),
+              status.get("queue_position"), job["next_check"] - time.monotonic())
+
+        if job["on_update"]:
+            try:
+                await job["on_update"](status)
+            except Exception as e:
+                error(f"Poller update callback failed for job {job_id}: {str(e)}")
+
+# Create a global instance of JobPoller
+job_poller = JobPoller()
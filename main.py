@@ -1,11 +1,13 @@
+import asyncio
 import os
 import nextcord
 from nextcord.ext import commands
-from config import DISCORD_BOT_TOKEN, CHANNEL_ID
+from config import DISCORD_BOT_TOKEN, CHANNEL_ID, ARCHIVE_GENERATED_IMAGES, IMAGE_STORE_DIR, BOT_ROLE, STATE_BACKEND, WORKER_ID
 from utils.logger import logger
 
 # Create necessary directories
-os.makedirs('generated_images', exist_ok=True)
+if ARCHIVE_GENERATED_IMAGES:
+    os.makedirs(IMAGE_STORE_DIR, exist_ok=True)
 
 # Bot setup
 intents = nextcord.Intents.default()
@@ -26,8 +28,10 @@ async def on_ready():
     for guild in bot.guilds:
         logger.info(f' - {guild.name} (ID: {guild.id})')
     
-    # Send online message
-    channel = bot.get_channel(int(CHANNEL_ID))
+    # Send online message to the legacy default channel, if one is configured
+    if not CHANNEL_ID:
+        return
+    channel = bot.get_channel(CHANNEL_ID)
     if channel:
         user_id = 277656871987576833
         try:
@@ -42,13 +46,34 @@ async def on_ready():
 
 @bot.event
 async def on_message(message):
-    if message.channel.id != int(CHANNEL_ID):
+    # Each command checks the guild's allowed channels itself
+    if message.author.bot:
         return
     await bot.process_commands(message)
 
-if __name__ == "__main__":
-    logger.info("Main script started")
+async def run_worker():
+    """Run queued requests without a gateway connection; results are posted through the REST API."""
+    await bot.login(DISCORD_BOT_TOKEN)
+    logger.info(f"Worker {WORKER_ID} started")
     try:
-        bot.run(DISCORD_BOT_TOKEN)
-    except Exception as e:
-        logger.error(f"Failed to start the bot: {str(e)}")
\ No newline at end of file
+        await asyncio.Event().wait()
+    finally:
+        await bot.close()
+
+if __name__ == "__main__":
+    logger.info(f"Main script started as {BOT_ROLE}")
+    if BOT_ROLE not in ("all", "gateway", "worker"):
+        logger.error(f"Unknown BOT_ROLE '{BOT_ROLE}'; use all, gateway or worker")
+    elif BOT_ROLE != "all" and STATE_BACKEND != "sqlite":
+        logger.error(f"BOT_ROLE={BOT_ROLE} needs STATE_BACKEND=sqlite so gateway and workers share one queue")
+    else:
+        try:
+            if BOT_ROLE == "worker":
+                # The cog's startup tasks were scheduled on the bot's loop when it was loaded
+                bot.loop.run_until_complete(run_worker())
+            else:
+                bot.run(DISCORD_BOT_TOKEN)
+        except KeyboardInterrupt:
+            pass
+        except Exception as e:
+            logger.error(f"Failed to start the bot: {str(e)}")
\ No newline at end of file
@@ -0,0 +1,187 @@
+import bisect
+import time
+from contextlib import contextmanager
+from aiohttp import web
+from constants import METRICS_BUCKETS
+from utils.logger import info, error
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _label_text(labelnames, values):
+    if not labelnames:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)) + "}"
+
+class Gauge:
+    """
+    Value read from ``func`` at collection time.
+
+    ``func`` returns ``{label_value(s): value}``, so existing state such as
+    queue lengths is reported without being mirrored on every change.
+    """
+
+    type = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), func=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.func = func
+
+    def samples(self):
+        try:
+            values = self.func()
+        except Exception as e:
+            error(f"Failed to collect metric {self.name}: {str(e)}")
+            return
+        for key, value in values.items():
+            yield self.name, self.labelnames, key if isinstance(key, tuple) else (key,), value
+
+class Counter(Gauge):
+    """Monotonic counter, one value per combination of label values; read from ``func`` if given."""
+
+    type = "counter"
+
+    def __init__(self, name, documentation, labelnames=(), func=None):
+        super().__init__(name, documentation, labelnames, func or (lambda: self.values))
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        self.values[key] = self.values.get(key, 0) + amount
+
+class Histogram:
+    """Cumulative-bucket histogram of observed durations, per combination of label values."""
+
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=METRICS_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.series = {}
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+        series["counts"][bisect.bisect_left(self.buckets, value)] += 1
+        series["sum"] += value
+        series["count"] += 1
+
+    def samples(self):
+        labelnames = self.labelnames + ("le",)
+        for key, series in self.series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series["counts"]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                yield f"{self.name}_bucket", labelnames, key + (le,), cumulative
+            yield f"{self.name}_sum", self.labelnames, key, series["sum"]
+            yield f"{self.name}_count", self.labelnames, key, series["count"]
+
+    def summary(self, label):
+        """
+        Merge all series by one label and return ``{value: {"count", "mean", "p95"}}``.
+
+        The 95th percentile is the upper bound of the bucket it falls in.
+        """
+        index = self.labelnames.index(label)
+        merged = {}
+        for key, series in self.series.items():
+            entry = merged.setdefault(key[index], {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0})
+            entry["counts"] = [a + b for a, b in zip(entry["counts"], series["counts"])]
+            entry["sum"] += series["sum"]
+            entry["count"] += series["count"]
+
+        result = {}
+        for value, entry in merged.items():
+            target = entry["count"] * 0.95
+            cumulative = 0
+            p95 = float("inf")
+            for bound, count in zip(self.buckets + (float("inf"),), entry["counts"]):
+                cumulative += count
+                if cumulative >= target:
+                    p95 = bound
+                    break
+            result[value] = {"count": entry["count"], "mean": entry["sum"] / entry["count"], "p95": p95}
+        return result
+
+class MetricsRegistry:
+    """
+    In-process metrics rendered in the Prometheus text format.
+
+    Modules register their counters, histograms and gauges at import time;
+    ``render`` collects them all, and ``start_server`` exposes the result on
+    ``/metrics`` for scraping.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self._runner = None
+
+    def _register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=(), func=None):
+        return self._register(Counter(name, documentation, labelnames, func))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=METRICS_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name, documentation, labelnames=(), func=None):
+        return self._register(Gauge(name, documentation, labelnames, func))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labelnames, values, value in metric.samples():
+                lines.append(f"{name}{_label_text(labelnames, values)} {value}")
+        return "\n".join(lines) + "\n"
+
+    async def _handle_metrics(self, request):
+        return web.Response(text=self.render(), content_type="text/plain", charset="utf-8")
+
+    async def start_server(self, host, port):
+        """Serve ``/metrics`` on ``host:port`` until ``stop_server`` is called."""
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle_metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        try:
+            await web.TCPSite(self._runner, host, port).start()
+        except OSError as e:
+            error(f"Could not start the metrics endpoint on {host}:{port}: {str(e)}")
+            await self.stop_server()
+            return
+        info(f"Metrics endpoint listening on http://{host}:{port}/metrics")
+
+    async def stop_server(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+metrics = MetricsRegistry()
+
+# Shared by every module that times a stage of the generation pipeline
+STAGE_SECONDS = metrics.histogram(
+    "aipg_bot_stage_seconds",
+    "Time spent in each stage of the generation pipeline",
+    ("stage", "backend", "model")
+)
+JOBS = metrics.counter("aipg_bot_jobs_total", "Generation requests by outcome", ("backend", "outcome"))
+
+@contextmanager
+def time_stage(stage, backend, model=None):
+    """Record the duration of the ``with`` block as ``stage`` in ``STAGE_SECONDS``."""
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.monotonic() - start, stage=stage, backend=backend, model=model or "")
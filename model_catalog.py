@@ -0,0 +1,155 @@
+import asyncio
+import copy
+import math
+import time
+from constants import MODEL_CATALOG_TTL, MAX_WAIT_TIME, CAPACITY_AUTO_DOWNSCALE
+from utils.logger import info, error, debug
+from image_generation_utils import fetch_workers
+
+def parse_performance(value):
+    """Parse a worker performance string such as ``"1.5 megapixelsteps per second"``."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(str(value).split()[0])
+    except (ValueError, IndexError):
+        return 0.0
+
+class ModelCatalog:
+    """
+    Cached index of the image models served by AI Power Grid workers.
+
+    The index maps each model name to its worker count (total and active),
+    total performance, the largest ``max_pixels`` of any worker serving it
+    and the speed of its fastest active worker. Once the index is older
+    than ``ttl`` it is still returned immediately while a refresh runs in
+    the background (stale-while-revalidate).
+    """
+
+    def __init__(self, ttl=MODEL_CATALOG_TTL):
+        self.ttl = ttl
+        self.index = {}
+        self.updated_at = 0.0
+        self._refresh_task = None
+
+    @property
+    def models(self):
+        """Model names ordered by worker count, most widely served first."""
+        return sorted(self.index, key=lambda model: (-self.index[model]["workers"], model))
+
+    def is_stale(self):
+        return time.monotonic() - self.updated_at > self.ttl
+
+    def build_index(self, workers):
+        index = {}
+        for worker in workers:
+            if worker.get("type", "image") != "image":
+                continue
+            performance = parse_performance(worker.get("performance", 0))
+            speed = parse_performance(worker.get("megapixelsteps_per_second") or performance)
+            max_pixels = worker.get("max_pixels") or 0
+            active = not worker.get("maintenance_mode", False) and not worker.get("paused", False)
+            for model in worker.get("models", []):
+                entry = index.setdefault(model, {
+                    "workers": 0,
+                    "active_workers": 0,
+                    "performance": 0.0,
+                    "max_pixels": 0,
+                    "active_max_pixels": 0,
+                    "max_speed": 0.0
+                })
+                entry["workers"] += 1
+                entry["performance"] += performance
+                entry["max_pixels"] = max(entry["max_pixels"], max_pixels)
+                if active:
+                    entry["active_workers"] += 1
+                    entry["active_max_pixels"] = max(entry["active_max_pixels"], max_pixels)
+                    entry["max_speed"] = max(entry["max_speed"], speed)
+        return index
+
+    def assess(self, params):
+        """
+        Check a request against the capacity of the workers serving its model.
+
+        Returns a dict with ``ok``, the possibly downscaled ``params``, a list of
+        ``warnings``, the ``cost`` in megapixelsteps and ``estimated_time`` on the
+        fastest active worker. ``message`` explains why a request was rejected.
+        """
+        params = copy.deepcopy(params)
+        model = params["models"][0]
+        width = int(params["params"]["width"])
+        height = int(params["params"]["height"])
+        steps = int(params["params"]["steps"])
+        count = int(params["params"].get("n", 1))
+        result = {"ok": True, "params": params, "warnings": [], "cost": None, "estimated_time": None, "message": None}
+
+        entry = self.index.get(model)
+        if not self.index:
+            # Without worker data there is nothing to validate against
+            result["cost"] = width * height * steps * count / 1_000_000
+            return result
+        if entry is None or entry["active_workers"] == 0:
+            result["warnings"].append(f"No active workers are currently serving {model}; the job may wait a long time.")
+            entry = entry or {"max_pixels": 0, "active_max_pixels": 0, "max_speed": 0.0}
+
+        max_pixels = entry["active_max_pixels"]
+        if max_pixels and width * height > max_pixels:
+            if not CAPACITY_AUTO_DOWNSCALE:
+                result["ok"] = False
+                result["message"] = (f"{width}x{height} exceeds the largest size any worker for {model} "
+                                     f"can generate ({max_pixels:,} pixels). Please reduce the dimensions.")
+                return result
+            scale = math.sqrt(max_pixels / (width * height))
+            new_width = max(64, int(width * scale) // 64 * 64)
+            new_height = max(64, int(height * scale) // 64 * 64)
+            params["params"]["width"] = new_width
+            params["params"]["height"] = new_height
+            result["warnings"].append(f"Downscaled from {width}x{height} to {new_width}x{new_height} to fit the available workers.")
+            width, height = new_width, new_height
+
+        cost = width * height * steps * count / 1_000_000
+        result["cost"] = cost
+        if entry["max_speed"]:
+            result["estimated_time"] = cost / entry["max_speed"]
+            if result["estimated_time"] > MAX_WAIT_TIME:
+                result["ok"] = False
+                result["message"] = (f"This request costs {cost:.1f} megapixelsteps, about {result['estimated_time']:.0f}s "
+                                     f"on the fastest worker for {model}. Please reduce steps and/or dimensions.")
+        return result
+
+    async def check_capacity(self, params):
+        await self.get_index()
+        return self.assess(params)
+
+    async def refresh(self):
+        """Fetch the worker list and rebuild the index; keeps the old index on failure."""
+        response = await fetch_workers()
+        if not response["success"]:
+            error(f"Failed to refresh model catalog: {response['message']}")
+            return self.index
+
+        self.index = self.build_index(response["workers"])
+        self.updated_at = time.monotonic()
+        info(f"Model catalog refreshed: {len(self.index)} image models from {len(response['workers'])} workers")
+        debug(f"Model catalog index: {self.index}")
+        return self.index
+
+    def _refresh_in_background(self):
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self.refresh(), name="model_catalog_refresh")
+
+    async def get_index(self):
+        if not self.index:
+            # Nothing to serve yet, so this caller has to wait for the first fetch
+            self._refresh_in_background()
+            await asyncio.shield(self._refresh_task)
+        elif self.is_stale():
+            self._refresh_in_background()
+        return self.index
+
+    async def get_models(self):
+        await self.get_index()
+        return self.models
+
+# Create a global instance of ModelCatalog
+model_catalog = ModelCatalog()
@@ -1,76 +1,389 @@
 import asyncio
 import time
-from collections import deque
+from collections import Counter, deque, OrderedDict
+from constants import RATE_LIMITS, BACKEND_CONCURRENCY, GUILD_CONCURRENCY_SHARE, FAIR_QUEUEING, PRIORITY_NORMAL
+from constants import MAX_QUEUE_DEPTH, MAX_QUEUE_DEPTH_PER_USER
+from utils.logger import debug, error
+from metrics import metrics
+from shared_state import shared_rate_limits
 
-class QueueManager:
-    def __init__(self):
-        self.queue = deque()
-        self.last_request_time = time.time()
-        self.request_count = 0
-        self.lock = asyncio.Lock()
-
-    async def add_to_queue(self, coroutine):
-        await self.lock.acquire()
+class QueueFullError(Exception):
+    """A new job was rejected because the queue, or the user's share of it, is full."""
+
+    def __init__(self, position, per_user=False):
+        self.position = position
+        self.per_user = per_user
+        super().__init__(f"{'user queue limit reached' if per_user else 'busy'}, position {position}")
+
+class QueueExpiredError(Exception):
+    """A request was dropped because it was still waiting when its deadline passed."""
+
+class TokenBucket:
+    """
+    Token bucket allowing ``rate`` requests per ``per`` seconds.
+
+    Tokens refill continuously instead of resetting in fixed windows, and
+    up to ``capacity`` tokens can be spent in a burst.
+    """
+
+    def __init__(self, rate, per, capacity=None):
+        self.capacity = capacity or rate
+        self.fill_rate = rate / per
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.fill_rate)
+        self.updated = now
+
+    def try_acquire(self):
+        """Take a token if one is available; otherwise return the seconds until the next one."""
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.fill_rate
+
+    def available(self):
+        self._refill()
+        return self.tokens
+
+    async def reserve(self):
+        return self.try_acquire()
+
+class QueueTicket:
+    """A single caller waiting in a ``FairQueue``."""
+
+    __slots__ = ("future", "user_id", "priority", "slot", "group", "group_limit", "deadline", "enqueued_at")
+
+    def __init__(self, future, user_id, priority, slot=None, group=None, group_limit=None, deadline=None):
+        self.future = future
+        self.user_id = user_id
+        self.priority = priority
+        self.slot = slot
+        self.group = group
+        self.group_limit = group_limit
+        self.deadline = deadline
+        self.enqueued_at = time.monotonic()
+
+class FairQueue:
+    """
+    Queue that serves priority classes in order and round-robins between
+    groups (guilds), then between users inside each group.
+
+    Every user has their own FIFO; after one of a user's tickets is served
+    the user moves to the back of their group's rotation and the group to
+    the back of the class's rotation, so a single user or a single busy
+    guild flooding the queue only delays their own requests. With
+    ``fair=False`` all tickets share one FIFO per priority class.
+    """
+
+    def __init__(self, fair=FAIR_QUEUEING):
+        self.fair = fair
+        self.classes = {}
+        # Running totals, so depth checks on every request don't walk the queue
+        self.count = 0
+        self.user_counts = Counter()
+
+    def __len__(self):
+        return self.count
+
+    def _keys(self, ticket):
+        return (ticket.group, ticket.user_id) if self.fair else (None, None)
+
+    def push(self, ticket):
+        group, user = self._keys(ticket)
+        groups = self.classes.setdefault(ticket.priority, OrderedDict())
+        groups.setdefault(group, OrderedDict()).setdefault(user, deque()).append(ticket)
+        self.count += 1
+        self.user_counts[ticket.user_id] += 1
+
+    def ordered(self):
+        """Yield the waiting tickets in the order they would be served."""
+        for priority in sorted(self.classes):
+            rotation = deque(
+                (users_key, deque((user, deque(user_queue)) for user, user_queue in users.items()))
+                for users_key, users in self.classes[priority].items()
+            )
+            while rotation:
+                group, users = rotation.popleft()
+                user, user_queue = users.popleft()
+                yield user_queue.popleft()
+                if user_queue:
+                    users.append((user, user_queue))
+                if users:
+                    rotation.append((group, users))
+
+    def peek(self, eligible=None):
+        """Return the next ticket to serve, skipping tickets for which ``eligible(ticket)`` is false."""
+        for ticket in self.ordered():
+            if eligible is None or eligible(ticket):
+                return ticket
+        return None
+
+    def pop(self, ticket=None):
+        ticket = ticket or self.peek()
+        if ticket is not None:
+            self.remove(ticket, rotate=True)
+        return ticket
+
+    def remove(self, ticket, rotate=False):
+        groups = self.classes.get(ticket.priority)
+        group, user = self._keys(ticket)
+        users = groups.get(group) if groups else None
+        if not users or user not in users:
+            return
+        user_queue = users[user]
         try:
-            future = asyncio.Future()
-            self.queue.append((coroutine, future))
-            await self.process_queue()
-            return await future
-        finally:
-            self.lock.release()
-
-    async def process_queue(self):
-        while self.queue:
-            current_time = time.time()
-            if current_time - self.last_request_time >= 10:
-                self.last_request_time = current_time
-                self.request_count = 0
-
-            if self.request_count < 2:
-                coroutine, future = self.queue.popleft()
-                self.request_count += 1
-                try:
-                    result = await coroutine
-                    future.set_result(result)
-                except Exception as e:
-                    future.set_exception(e)
-            else:
-                await asyncio.sleep(0.5)  # Wait a bit before checking again
+            user_queue.remove(ticket)
+        except ValueError:
+            return
+        self.count -= 1
+        self.user_counts[ticket.user_id] -= 1
+        if not self.user_counts[ticket.user_id]:
+            del self.user_counts[ticket.user_id]
+        if not user_queue:
+            del users[user]
+        elif rotate:
+            users.move_to_end(user)
+        if not users:
+            del groups[group]
+        elif rotate:
+            groups.move_to_end(group)
+        if not groups:
+            del self.classes[ticket.priority]
 
-    async def run_coroutine(self, coroutine):
-        return await self.add_to_queue(coroutine)
+    def user_depth(self, user_id):
+        """Return how many tickets ``user_id`` has waiting."""
+        return self.user_counts[user_id]
 
-# Create a global instance of QueueManager
-queue_manager = QueueManager()
-
-class FluxQueueManager(QueueManager):
-    def __init__(self):
-        super().__init__()
-        self.max_concurrent = 1  # Adjust based on Flux API limitations
-
-flux_queue_manager = FluxQueueManager()
-
-class FluxQueueManager(QueueManager):
-    def __init__(self):
-        super().__init__()
-        self.max_concurrent = 1
-
-    async def process_queue(self):
-        while self.queue:
-            if len([task for task in asyncio.all_tasks() if task.get_name().startswith('flux_task')]) < self.max_concurrent:
-                coroutine, future = self.queue.popleft()
-                task = asyncio.create_task(coroutine(), name=f'flux_task_{id(coroutine)}')
-                task.add_done_callback(lambda t: self._task_done(t, future))
+    def position(self, ticket):
+        """Return how many tickets will be served before ``ticket``."""
+        for ahead, queued in enumerate(self.ordered()):
+            if queued is ticket:
+                return ahead
+        return 0
+
+class QueueManager:
+    """
+    Rate-limiting scheduler shared by every generation backend.
+
+    Each ``<backend>.<operation>`` endpoint has its own token bucket and
+    callers wait in a ``FairQueue`` for their endpoint's budget only. Once a
+    token is granted the coroutine runs in the caller's own task, so requests
+    that the rate limit permits run concurrently instead of one at a time.
+
+    Requests can also claim one of a backend's job slots (``concurrency``);
+    they are not dispatched while all slots are taken, and the slot stays
+    claimed until ``release_slot`` is called when the job is finished.
+    Requests from a group (guild) may hold at most ``group_limit`` of a
+    backend's slots. Without a limit a group gets ``GUILD_CONCURRENCY_SHARE``
+    of them, but may borrow idle slots while no other group's request can
+    use them; either way a group at its share is skipped so other groups'
+    requests go first.
+
+    ``bucket_factory(endpoint, rate, per)`` creates the token buckets; by
+    default they live in this process, ``SharedRateLimits.bucket`` makes
+    every process on the machine spend the same budgets.
+
+    New jobs (requests claiming a slot) are rejected with ``QueueFullError``
+    once ``max_depth`` requests wait for the endpoint or the user already
+    has ``max_user_depth`` waiting, and requests still waiting at their
+    ``deadline`` are dropped with ``QueueExpiredError``, so under overload
+    latency stays bounded instead of the queue growing.
+    """
+
+    def __init__(self, rate_limits=RATE_LIMITS, fair=FAIR_QUEUEING, concurrency=BACKEND_CONCURRENCY, bucket_factory=None,
+                 max_depth=MAX_QUEUE_DEPTH, max_user_depth=MAX_QUEUE_DEPTH_PER_USER):
+        self.rate_limits = rate_limits
+        self.max_depth = max_depth
+        self.max_user_depth = max_user_depth
+        self.fair = fair
+        self.bucket_factory = bucket_factory or (lambda endpoint, rate, per: TokenBucket(rate, per))
+        self.buckets = {endpoint: self.bucket_factory(endpoint, rate, per) for endpoint, (rate, per) in rate_limits.items()}
+        self.queues = {endpoint: FairQueue(fair) for endpoint in rate_limits}
+        self.dispatchers = {}
+        self.concurrency = dict(concurrency)
+        self.active = {backend: 0 for backend in concurrency}
+        self.group_active = {}
+        # Set whenever a slot is freed or a queue changes, so a dispatcher waiting for a ready ticket looks again
+        self._wakeup = asyncio.Event()
+        self.rate_limited = metrics.counter(
+            "aipg_bot_rate_limited_total", "Times a request had to wait for its endpoint's rate limit", ("endpoint",)
+        )
+        self.shed = metrics.counter(
+            "aipg_bot_shed_requests_total", "Requests rejected or dropped instead of queued", ("reason",)
+        )
+        metrics.gauge("aipg_bot_queue_depth", "Requests waiting in each endpoint queue", ("endpoint",),
+                      lambda: {endpoint: len(queue) for endpoint, queue in self.queues.items()})
+        metrics.gauge("aipg_bot_jobs_in_flight", "Submitted jobs holding one of the backend's job slots", ("backend",),
+                      lambda: dict(self.active))
+
+    def default_group_limit(self, backend):
+        limit = self.concurrency.get(backend, float("inf"))
+        return max(int(limit * GUILD_CONCURRENCY_SHARE), 1) if limit != float("inf") else limit
+
+    def slot_available(self, backend, group=None, group_limit=None, borrow=False):
+        if self.active.get(backend, 0) >= self.concurrency.get(backend, float("inf")):
+            return False
+        if group is None or (group_limit is None and borrow):
+            return True
+        limit = group_limit if group_limit is not None else self.default_group_limit(backend)
+        return self.group_active.get((backend, group), 0) < limit
+
+    def _ticket_ready(self, ticket, borrow=False):
+        return not ticket.slot or self.slot_available(ticket.slot, ticket.group, ticket.group_limit, borrow)
+
+    def _ticket_borrowing(self, ticket):
+        return self._ticket_ready(ticket, borrow=True)
+
+    def release_slot(self, backend, group=None):
+        """Free a job slot claimed through ``run_coroutine_timed(slot=...)``."""
+        self.active[backend] = max(self.active.get(backend, 0) - 1, 0)
+        if group is not None:
+            key = (backend, group)
+            self.group_active[key] = self.group_active.get(key, 0) - 1
+            if self.group_active[key] <= 0:
+                del self.group_active[key]
+        self._wakeup.set()
+
+    def check_depth(self, depth, user_depth=0):
+        """Raise ``QueueFullError`` if a request behind ``depth`` waiting requests (``user_depth`` of them the user's) would overflow."""
+        if self.max_depth and depth >= self.max_depth:
+            self.shed.inc(reason="queue_full")
+            raise QueueFullError(depth + 1)
+        if self.max_user_depth and user_depth >= self.max_user_depth:
+            self.shed.inc(reason="user_limit")
+            raise QueueFullError(depth + 1, per_user=True)
+
+    def admit(self, endpoint, user_id=None):
+        """Raise ``QueueFullError`` if a new job for ``endpoint`` would exceed the queue depth limits."""
+        queue = self.queues.get(endpoint)
+        if queue is None:
+            return
+        self.check_depth(len(queue), queue.user_depth(user_id) if user_id is not None else 0)
+
+    def _ensure_dispatcher(self, endpoint):
+        task = self.dispatchers.get(endpoint)
+        if task is None or task.done():
+            self.dispatchers[endpoint] = asyncio.create_task(self._dispatch(endpoint), name=f"queue_{endpoint}")
+
+    async def _dispatch(self, endpoint):
+        queue = self.queues[endpoint]
+        bucket = self.buckets[endpoint]
+        while len(queue):
+            abandoned = [ticket for ticket in queue.ordered() if ticket.future.done()]
+            for ticket in abandoned:  # The caller gave up while waiting
+                queue.remove(ticket)
+            if abandoned:
+                continue
+
+            # Skip requests whose backend or group has no free job slot; idle slots go to groups over their share last
+            ticket = queue.peek(self._ticket_ready) or queue.peek(self._ticket_borrowing)
+            if ticket is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            delay = await bucket.reserve()
+            if delay:
+                self.rate_limited.inc(endpoint=endpoint)
+                await asyncio.sleep(delay)
+                continue
+            if ticket.future.done():  # Cancelled while a shared bucket was consulted
+                continue
+
+            queue.pop(ticket)
+            if ticket.slot:
+                self.active[ticket.slot] = self.active.get(ticket.slot, 0) + 1
+                if ticket.group is not None:
+                    key = (ticket.slot, ticket.group)
+                    self.group_active[key] = self.group_active.get(key, 0) + 1
+            ticket.future.set_result(None)
+
+    def queue_position(self, endpoint, ticket):
+        """Return the 1-based position of ``ticket`` in its endpoint queue."""
+        return self.queues[endpoint].position(ticket) + 1
+
+    def estimated_wait(self, endpoint, ticket):
+        """Estimate the seconds until ``ticket`` is granted a token."""
+        bucket = self.buckets[endpoint]
+        needed = self.queue_position(endpoint, ticket) - bucket.available()
+        return max(needed, 0) / bucket.fill_rate
+
+    async def run_coroutine_timed(self, coroutine, endpoint="default", user_id=None, priority=PRIORITY_NORMAL, on_queued=None,
+                                  slot=None, group=None, group_limit=None, deadline=None):
+        """
+        Run a coroutine once its endpoint budget allows and return ``(result, queue_wait_seconds)``.
+
+        If the request has to wait, ``on_queued(position, estimated_wait)`` is
+        awaited once so the caller can show its place in the queue. With
+        ``slot`` set to a backend name the request also claims one of that
+        backend's job slots, which the caller must release with the same
+        ``group``. ``group`` (a guild ID) shares the queue fairly between
+        guilds and caps the guild's slots at ``group_limit``. Requests with a
+        slot are subject to the queue depth limits, and a request still
+        waiting at ``deadline`` (a ``time.time()`` timestamp) is dropped.
+        """
+        if endpoint not in self.queues:
+            # Endpoints without their own budget get a separate queue with the default budget,
+            # so a request waiting for a job slot never blocks other endpoints
+            self.buckets[endpoint] = self.bucket_factory(endpoint, *self.rate_limits["default"])
+            self.queues[endpoint] = FairQueue(self.fair)
+
+        queue = self.queues[endpoint]
+        if slot:
+            try:
+                self.admit(endpoint, user_id)
+            except QueueFullError:
+                coroutine.close()
+                raise
+
+        ticket = QueueTicket(asyncio.get_running_loop().create_future(), user_id, priority, slot, group, group_limit, deadline)
+        queue.push(ticket)
+        # A dispatcher blocked on another group's full share may be able to serve this ticket
+        self._wakeup.set()
+        self._ensure_dispatcher(endpoint)
+
+        try:
+            if on_queued:
+                eta = self.estimated_wait(endpoint, ticket)
+                if eta > 0 or not self._ticket_borrowing(ticket):
+                    try:
+                        await on_queued(self.queue_position(endpoint, ticket), eta)
+                    except Exception as e:
+                        error(f"Queue position callback failed: {str(e)}")
+            if deadline is None:
+                await ticket.future
             else:
-                await asyncio.sleep(0.5)
+                await asyncio.wait_for(asyncio.shield(ticket.future), max(deadline - time.time(), 0))
+        except (asyncio.CancelledError, asyncio.TimeoutError) as e:
+            queue.remove(ticket)
+            self._wakeup.set()
+            coroutine.close()
+            # The slot may have been granted just before the caller was cancelled
+            if slot and ticket.future.done() and not ticket.future.cancelled():
+                self.release_slot(slot, group)
+            ticket.future.cancel()
+            if isinstance(e, asyncio.TimeoutError):
+                self.shed.inc(reason="expired")
+                raise QueueExpiredError(f"{endpoint} request expired after {time.monotonic() - ticket.enqueued_at:.1f}s in queue") from None
+            raise
 
-    def _task_done(self, task, future):
+        wait_time = time.monotonic() - ticket.enqueued_at
+        debug("Dispatching %s request for user %s after %.2fs in queue (%d still waiting)", endpoint, user_id, wait_time, len(queue))
         try:
-            result = task.result()
-            future.set_result(result)
-        except Exception as e:
-            future.set_exception(e)
-        finally:
-            debug(f"Flux task {task.get_name()} completed. Queue size: {len(self.queue)}")
-
-flux_queue_manager = FluxQueueManager()
+            return await coroutine, wait_time
+        except asyncio.CancelledError:
+            # A request cancelled mid-call never reaches the code that would release its slot
+            if slot:
+                self.release_slot(slot, group)
+            raise
+
+    async def run_coroutine(self, coroutine, endpoint="default", user_id=None, priority=PRIORITY_NORMAL):
+        result, _ = await self.run_coroutine_timed(coroutine, endpoint, user_id, priority)
+        return result
+
+# Create a global instance of QueueManager
+queue_manager = QueueManager(bucket_factory=shared_rate_limits.bucket if shared_rate_limits else None)
@@ -0,0 +1,90 @@
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from constants import RESULT_CACHE_TTL, RESULT_CACHE_MAX_ENTRIES
+from utils.logger import debug
+from image_store import image_store
+from metrics import metrics
+
+def fingerprint(params):
+    """Return a stable hash of the final generation params, prompt included."""
+    canonical = json.dumps(params, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+class ResultCache:
+    """
+    Result cache and single-flight registry for identical generation requests.
+
+    ``begin`` marks a fingerprint as in flight; later identical requests get
+    the leader's future from ``join`` instead of submitting a new job. Once
+    the leader calls ``complete`` the job ID is remembered for ``ttl`` seconds
+    so ``lookup`` can serve repeats from the image store.
+    Hit, miss and join counters are kept in ``stats``.
+    """
+
+    def __init__(self, ttl=RESULT_CACHE_TTL, max_entries=RESULT_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.completed = OrderedDict()
+        self.in_flight = {}
+        self.stats = {"hits": 0, "misses": 0, "joins": 0}
+        metrics.counter("aipg_bot_result_cache_total", "Result cache lookups by outcome", ("outcome",), lambda: dict(self.stats))
+
+    async def lookup(self, key):
+        """Return ``(job_id, content)`` of a completed identical request still in the image store, or None."""
+        entry = self.completed.get(key)
+        if entry is None:
+            return None
+        if entry["expires"] < time.monotonic():
+            del self.completed[key]
+            return None
+
+        content = await image_store.get(entry["job_id"])
+        if content is None:
+            # The image was evicted from the store, so the entry is useless
+            self.completed.pop(key, None)
+            return None
+
+        self.completed.move_to_end(key)
+        self.stats["hits"] += 1
+        return entry["job_id"], content
+
+    def join(self, key):
+        """Return the future of an identical in-flight request, or None."""
+        future = self.in_flight.get(key)
+        if future is None:
+            return None
+        self.stats["joins"] += 1
+        return future
+
+    def begin(self, key):
+        """Register a new in-flight request; followers receive its result through ``join``."""
+        self.stats["misses"] += 1
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight[key] = future
+        return future
+
+    def complete(self, key, job_id, content, seeds=None):
+        """Resolve followers with the finished image and remember the job for ``ttl`` seconds."""
+        future = self.in_flight.pop(key, None)
+        if future and not future.done():
+            future.set_result({"job_id": job_id, "content": content, "seeds": seeds})
+
+        self.completed[key] = {"job_id": job_id, "expires": time.monotonic() + self.ttl}
+        self.completed.move_to_end(key)
+        while len(self.completed) > self.max_entries:
+            self.completed.popitem(last=False)
+        debug(f"Cached result for job {job_id}: {self.stats}")
+
+    def fail(self, key, future):
+        """Release followers of a request that did not produce an image."""
+        # A newer leader may have registered the same key after this one completed
+        if self.in_flight.get(key) is future:
+            del self.in_flight[key]
+        if not future.done():
+            future.set_result(None)
+
+# Create a global instance of ResultCache
+result_cache = ResultCache()
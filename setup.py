@@ -19,16 +19,19 @@ setup(
         "License :: OSI Approved :: MIT License",
         "Operating System :: OS Independent",
         "Programming Language :: Python :: 3",
-        "Programming Language :: Python :: 3.7",
-        "Programming Language :: Python :: 3.8",
         "Programming Language :: Python :: 3.9",
+        "Programming Language :: Python :: 3.10",
+        "Programming Language :: Python :: 3.11",
+        "Programming Language :: Python :: 3.12",
     ],
-    python_requires=">=3.7",
+    python_requires=">=3.9",
     install_requires=[
         "nextcord==2.3.2",
         "python-dotenv==1.0.0",
         "certifi==2023.7.22",
         "requests==2.31.0",
+        "aiohttp>=3.8,<4",
+        "Pillow>=9.0",
         "gradio-client==0.5.1",
     ],
 )
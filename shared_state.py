@@ -0,0 +1,293 @@
+import asyncio
+import itertools
+import json
+import sqlite3
+import time
+from config import STATE_BACKEND, SHARED_STATE_PATH, WORKER_ID
+from constants import WORK_POLL_INTERVAL, WORK_LEASE_TIME, CANCEL_RECORD_TTL
+from utils.sqlite_store import SQLiteStore
+
+class WorkItem:
+    """A generation request, handed from the process that received it to the process that runs it."""
+
+    FIELDS = ("prompt", "custom_params", "backend", "channel_id", "guild_id", "message_id", "user_id",
+              "priority", "correlation_id", "created_at", "deadline")
+    __slots__ = FIELDS + ("channel", "status_message", "user", "completion")
+
+    def __init__(self, prompt, custom_params, backend, channel_id, guild_id, message_id, user_id,
+                 priority, correlation_id=None, created_at=None, deadline=None):
+        self.prompt = prompt
+        self.custom_params = custom_params
+        self.backend = backend
+        self.channel_id = channel_id
+        self.guild_id = guild_id
+        self.message_id = message_id
+        self.user_id = user_id
+        self.priority = priority
+        self.correlation_id = correlation_id
+        self.created_at = created_at or time.time()
+        # time.time() after which the request is no longer worth running
+        self.deadline = deadline
+        # Live Discord objects and a completion future; only the in-memory queue carries these
+        self.channel = None
+        self.status_message = None
+        self.user = None
+        self.completion = None
+
+    def to_json(self):
+        return json.dumps({name: getattr(self, name) for name in self.FIELDS})
+
+    @classmethod
+    def from_json(cls, payload):
+        return cls(**json.loads(payload))
+
+class MemoryWorkQueue:
+    """
+    Work queue for a single process: requests go straight to this process's
+    worker loop, with their Discord objects attached, and ``put`` returns a
+    future that resolves once the request has been handled.
+    """
+
+    shared = False
+
+    def __init__(self):
+        self.queue = asyncio.PriorityQueue()
+        self._order = itertools.count()
+
+    def __len__(self):
+        return self.queue.qsize()
+
+    async def depth(self, user_id=None):
+        """Return how many items wait in the queue, and how many of them are ``user_id``'s."""
+        waiting = [item for _, _, item in self.queue._queue]
+        return len(waiting), sum(1 for item in waiting if user_id is not None and item.user_id == user_id)
+
+    async def put(self, item):
+        item.completion = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((item.priority, next(self._order), item))
+        return item.completion
+
+    async def claim(self):
+        _, _, item = await self.queue.get()
+        return item
+
+    async def cancel(self, message_id, deleted=False):
+        # Items are claimed as soon as they are queued, so only running requests can be cancelled
+        return None
+
+    async def cancelled(self, message_ids):
+        return []
+
+    async def renew(self, message_ids):
+        pass
+
+    async def release(self, message_id):
+        pass
+
+    async def finish(self, message_id):
+        pass
+
+class SQLiteWorkQueue(SQLiteStore):
+    """
+    Work queue shared by the gateway and worker processes on one machine.
+
+    Items are serialized to JSON and served by priority and then in order of
+    arrival. A worker claims an item with a lease of ``lease_time`` seconds,
+    which it renews while it works on the request. Once the request's job is
+    journaled under the worker's ``WORKER_ID`` the item is released: from
+    then on the journal resumes it. If a worker dies before that, its lease
+    expires and another worker claims the item again, so requests run at
+    least once, and at most once from submission on. Requests are cancelled by
+    their status message ID: a queued item is simply deleted, a running one
+    gets a record in ``cancelled_requests`` that its worker picks up. Workers
+    mark finished requests in ``finished_requests`` so that cancelling them,
+    e.g. when the delivered request's status message is deleted, is a no-op.
+    """
+
+    shared = True
+    SCHEMA = [
+        """
+        CREATE TABLE IF NOT EXISTS work_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            payload TEXT NOT NULL,
+            priority INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            message_id INTEGER,
+            claimed_by TEXT,
+            lease_until REAL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS work_items_order ON work_items (priority, id)",
+        """
+        CREATE TABLE IF NOT EXISTS cancelled_requests (
+            message_id INTEGER PRIMARY KEY,
+            deleted INTEGER NOT NULL,
+            created_at REAL NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS finished_requests (
+            message_id INTEGER PRIMARY KEY,
+            created_at REAL NOT NULL
+        )
+        """
+    ]
+    COLUMNS = [
+        ("work_items", "message_id", "INTEGER"),
+        ("work_items", "claimed_by", "TEXT"),
+        ("work_items", "lease_until", "REAL")
+    ]
+    # Items nobody holds a live lease on
+    WAITING = "(lease_until IS NULL OR lease_until < :now)"
+
+    def __init__(self, path=SHARED_STATE_PATH, poll_interval=WORK_POLL_INTERVAL, lease_time=WORK_LEASE_TIME, worker=WORKER_ID):
+        super().__init__(path)
+        self.poll_interval = poll_interval
+        self.lease_time = lease_time
+        self.worker = worker
+
+    async def put(self, item):
+        await self._run(
+            "INSERT INTO work_items (payload, priority, created_at, message_id) VALUES (?, ?, ?, ?)",
+            (item.to_json(), item.priority, item.created_at, item.message_id)
+        )
+        return None
+
+    async def depth(self, user_id=None):
+        """Return how many items wait in the queue, and how many of them are ``user_id``'s."""
+        rows = await self._run(
+            "SELECT COUNT(*) AS depth, COALESCE(SUM(json_extract(payload, '$.user_id') = :user_id), 0) AS user_depth "
+            f"FROM work_items WHERE {self.WAITING}",
+            {"user_id": user_id, "now": time.time()}
+        )
+        return (rows[0]["depth"], rows[0]["user_depth"]) if rows else (0, 0)
+
+    async def claim(self):
+        """Wait for the next item and lease it in one atomic statement."""
+        while True:
+            now = time.time()
+            rows = await self._run(
+                "UPDATE work_items SET claimed_by = :worker, lease_until = :lease_until "
+                f"WHERE id = (SELECT id FROM work_items WHERE {self.WAITING} ORDER BY priority, id LIMIT 1) "
+                "RETURNING payload",
+                {"worker": self.worker, "lease_until": now + self.lease_time, "now": now}
+            )
+            if rows:
+                return WorkItem.from_json(rows[0]["payload"])
+            await asyncio.sleep(self.poll_interval)
+
+    async def renew(self, message_ids):
+        """Extend this worker's leases on the items of ``message_ids``."""
+        if not message_ids:
+            return
+        placeholders = ", ".join("?" for _ in message_ids)
+        await self._run(
+            f"UPDATE work_items SET lease_until = ? WHERE claimed_by = ? AND message_id IN ({placeholders})",
+            (time.time() + self.lease_time, self.worker, *message_ids)
+        )
+
+    async def release(self, message_id):
+        """Remove a claimed item once its job is journaled or it has finished."""
+        await self._run("DELETE FROM work_items WHERE message_id = ?", (message_id,))
+
+    async def cancel(self, message_id, deleted=False):
+        """
+        Cancel the request behind a status message.
+
+        Returns True if it was still queued and has been removed, False if a
+        worker was asked to cancel it, and None if it has already finished.
+        """
+        rows = await self._run(f"DELETE FROM work_items WHERE message_id = :message_id AND {self.WAITING} RETURNING id",
+                               {"message_id": message_id, "now": time.time()})
+        if rows:
+            return True
+        now = time.time()
+        await self._run("DELETE FROM cancelled_requests WHERE created_at < ?", (now - CANCEL_RECORD_TTL,))
+        await self._run("DELETE FROM finished_requests WHERE created_at < ?", (now - CANCEL_RECORD_TTL,))
+        if await self._run("SELECT 1 FROM finished_requests WHERE message_id = ?", (message_id,)):
+            return None
+        await self._run("INSERT OR REPLACE INTO cancelled_requests (message_id, deleted, created_at) VALUES (?, ?, ?)",
+                        (message_id, int(deleted), now))
+        return False
+
+    async def cancelled(self, message_ids):
+        """Take the cancellations recorded for any of ``message_ids``; return ``(message_id, deleted)`` pairs."""
+        if not message_ids:
+            return []
+        placeholders = ", ".join("?" for _ in message_ids)
+        rows = await self._run(
+            f"DELETE FROM cancelled_requests WHERE message_id IN ({placeholders}) RETURNING message_id, deleted", tuple(message_ids)
+        )
+        return [(row["message_id"], bool(row["deleted"])) for row in rows]
+
+    async def finish(self, message_id):
+        """Mark a claimed request as finished, so cancelling it later does nothing."""
+        await self.release(message_id)
+        await self._run("INSERT OR REPLACE INTO finished_requests (message_id, created_at) VALUES (?, ?)", (message_id, time.time()))
+
+class SharedTokenBucket:
+    """``TokenBucket`` whose tokens are kept in a ``SharedRateLimits`` store, so all processes spend one budget."""
+
+    def __init__(self, store, endpoint, rate, per, capacity=None):
+        self.store = store
+        self.endpoint = endpoint
+        self.capacity = capacity or rate
+        self.fill_rate = rate / per
+        # Tokens left after this process's last request; only used for wait estimates
+        self.tokens = float(self.capacity)
+
+    def available(self):
+        return self.tokens
+
+    async def reserve(self):
+        """Take a token if one is available; otherwise return the seconds until the next one."""
+        granted, self.tokens = await self.store.take(self.endpoint, self.capacity, self.fill_rate)
+        return 0 if granted else (1 - self.tokens) / self.fill_rate
+
+class SharedRateLimits(SQLiteStore):
+    """SQLite-backed token buckets, refilled and spent in a single atomic statement per request."""
+
+    SCHEMA = [
+        """
+        CREATE TABLE IF NOT EXISTS token_buckets (
+            endpoint TEXT PRIMARY KEY,
+            tokens REAL NOT NULL,
+            granted INTEGER NOT NULL,
+            updated_at REAL NOT NULL
+        )
+        """
+    ]
+
+    def __init__(self, path=SHARED_STATE_PATH):
+        super().__init__(path)
+
+    def bucket(self, endpoint, rate, per):
+        return SharedTokenBucket(self, endpoint, rate, per)
+
+    async def take(self, endpoint, capacity, fill_rate):
+        # UPDATE expressions all see the row's old values, so the refill is computed once
+        refilled = "MIN(:capacity, tokens + MAX(:now - updated_at, 0) * :fill_rate)"
+        rows = await self._run(
+            "INSERT INTO token_buckets (endpoint, tokens, granted, updated_at) VALUES (:endpoint, :capacity - 1, 1, :now) "
+            f"ON CONFLICT (endpoint) DO UPDATE SET granted = {refilled} >= 1, "
+            f"tokens = {refilled} - ({refilled} >= 1), updated_at = :now "
+            "RETURNING granted, tokens",
+            {"endpoint": endpoint, "capacity": capacity, "fill_rate": fill_rate, "now": time.time()}
+        )
+        if not rows:
+            # The store is unavailable; let the request through rather than stall every process
+            return True, 0.0
+        return bool(rows[0]["granted"]), rows[0]["tokens"]
+
+# UPDATE ... RETURNING, used to claim and cancel items atomically, arrived in SQLite 3.35
+SQLITE_MIN_VERSION = (3, 35, 0)
+
+# The state backend is chosen once per process; every gateway and worker must use the same one
+if STATE_BACKEND == "sqlite":
+    if sqlite3.sqlite_version_info < SQLITE_MIN_VERSION:
+        raise RuntimeError(f"STATE_BACKEND=sqlite needs SQLite 3.35 or newer, but Python is linked against {sqlite3.sqlite_version}")
+    work_queue = SQLiteWorkQueue()
+    shared_rate_limits = SharedRateLimits()
+else:
+    work_queue = MemoryWorkQueue()
+    shared_rate_limits = None
@@ -0,0 +1,91 @@
+import asyncio
+import time
+from collections import OrderedDict
+from constants import STATUS_EDIT_INTERVAL
+from utils.logger import error, debug
+
+class StatusUpdater:
+    """
+    Coalesces status-message edits and flushes them at a bounded rate per channel.
+
+    Only the latest requested state of each message is kept; an update that
+    is replaced before it was sent is dropped. Terminal updates (done or
+    error) jump ahead of regular progress updates so the final state is
+    never stuck behind progress noise.
+    """
+
+    def __init__(self, min_interval=STATUS_EDIT_INTERVAL):
+        self.min_interval = min_interval
+        self.channels = {}
+
+    def update(self, message, terminal=False, **kwargs):
+        """
+        Schedule ``message.edit(**kwargs)`` and return a future that resolves to
+        True once sent, or False if it was superseded or discarded.
+        """
+        channel = self.channels.setdefault(message.channel.id, {
+            "pending": OrderedDict(),
+            "last_edit": 0.0,
+            "task": None
+        })
+
+        # Replacing an entry keeps its place in line so busy messages are not starved
+        previous = channel["pending"].get(message.id)
+        if previous:
+            self._resolve(previous, False)
+            # Never downgrade a terminal update to a progress update
+            terminal = terminal or previous["terminal"]
+
+        future = asyncio.get_running_loop().create_future()
+        channel["pending"][message.id] = {
+            "message": message,
+            "kwargs": kwargs,
+            "terminal": terminal,
+            "future": future
+        }
+
+        if channel["task"] is None or channel["task"].done():
+            channel["task"] = asyncio.create_task(self._flush(message.channel.id), name=f"status_updates_{message.channel.id}")
+        return future
+
+    def discard(self, message):
+        """Drop any pending edit for a message, e.g. before deleting it."""
+        channel = self.channels.get(message.channel.id)
+        if channel:
+            entry = channel["pending"].pop(message.id, None)
+            if entry:
+                self._resolve(entry, False)
+
+    def _resolve(self, entry, sent):
+        # The caller may have stopped waiting and cancelled the future
+        if not entry["future"].done():
+            entry["future"].set_result(sent)
+
+    def _next_entry(self, pending):
+        for message_id, entry in pending.items():
+            if entry["terminal"]:
+                return message_id
+        return next(iter(pending))
+
+    async def _flush(self, channel_id):
+        channel = self.channels[channel_id]
+        pending = channel["pending"]
+        while pending:
+            delay = channel["last_edit"] + self.min_interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+
+            entry = pending.pop(self._next_entry(pending))
+            channel["last_edit"] = time.monotonic()
+            try:
+                await entry["message"].edit(**entry["kwargs"])
+                self._resolve(entry, True)
+            except Exception as e:
+                error(f"Failed to update status message {entry['message'].id}: {str(e)}")
+                self._resolve(entry, False)
+
+        debug("Status updates flushed for channel %s", channel_id)
+
+# Create a global instance of StatusUpdater
+status_updater = StatusUpdater()
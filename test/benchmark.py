@@ -0,0 +1,135 @@
+import argparse
+import asyncio
+import copy
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mock_grid import add_grid_arguments, grid_from_arguments
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of ``values``; None when there are none."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+def summarize(values):
+    if not values:
+        return {"mean": None, "p50": None, "p95": None, "p99": None, "max": None}
+    return {
+        "mean": round(sum(values) / len(values), 3),
+        "p50": round(percentile(values, 0.50), 3),
+        "p95": round(percentile(values, 0.95), 3),
+        "p99": round(percentile(values, 0.99), 3),
+        "max": round(max(values), 3)
+    }
+
+async def run_job(backend, poller, params, user_id, timeout):
+    """Submit, poll, fetch and release one job the way the bot does; return (ok, latency, queue_wait)."""
+    start = time.monotonic()
+    response = await backend.submit(params["prompt"], params, user_id=user_id)
+    if not response["success"]:
+        return False, time.monotonic() - start, response["queue_wait"]
+
+    job_id = response["id"]
+    try:
+        status = await asyncio.wait_for(poller.watch(job_id, check_func=backend.status), timeout)
+        images = await backend.fetch_result(job_id) if status["done"] else []
+    except asyncio.TimeoutError:
+        poller.unwatch(job_id)
+        images = []
+    finally:
+        backend.finish(job_id)
+    return bool(images), time.monotonic() - start, response["queue_wait"]
+
+async def benchmark(args):
+    grid = grid_from_arguments(args)
+    url = await grid.start()
+
+    # The bot's modules read their settings at import time, so point them at the mock first
+    os.environ["API_ENDPOINT"] = url
+    os.environ.setdefault("CHANNEL_ID", "0")
+    os.environ.setdefault("AI_POWER_GRID_API_KEY", "0000000000")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    from constants import DEFAULT_IMAGE_PARAMS, RATE_LIMITS, BACKEND_CONCURRENCY
+    from queue_manager import QueueManager
+    from job_poller import JobPoller
+    from api_client import api_client
+    from backends import AIPGBackend
+
+    rate_limits = {"default": (10000, 1)} if args.no_rate_limits else RATE_LIMITS
+    scheduler = QueueManager(rate_limits=rate_limits, concurrency=BACKEND_CONCURRENCY)
+    backend = AIPGBackend(scheduler=scheduler)
+    poller = JobPoller()
+
+    params = copy.deepcopy(DEFAULT_IMAGE_PARAMS)
+    params["prompt"] = "benchmark"
+    params["params"]["n"] = args.n
+
+    results = []
+    remaining = iter(range(args.jobs))
+
+    async def user(user_id):
+        for _ in remaining:
+            results.append(await run_job(backend, poller, copy.deepcopy(params), user_id, args.timeout))
+
+    print(f"Running {args.jobs} jobs with {args.concurrency} concurrent users against {url}")
+    started_at = datetime.now(timezone.utc)
+    start = time.monotonic()
+    try:
+        await asyncio.gather(*(user(user_id) for user_id in range(args.concurrency)))
+    finally:
+        elapsed = time.monotonic() - start
+        await api_client.close()
+        await grid.stop()
+
+    latencies = [latency for ok, latency, _ in results if ok]
+    completed = len(latencies)
+    api_calls = {route: count for route, count in grid.calls.items() if route not in ("image", "rate_limited")}
+    return {
+        "started_at": started_at.isoformat(),
+        "config": vars(args),
+        "jobs": len(results),
+        "completed": completed,
+        "failed": len(results) - completed,
+        "elapsed_seconds": round(elapsed, 3),
+        "jobs_per_minute": round(completed / elapsed * 60, 2) if elapsed else None,
+        "latency_seconds": summarize(latencies),
+        "queue_wait_seconds": summarize([queue_wait for _, _, queue_wait in results]),
+        "api_calls": api_calls,
+        "api_calls_per_job": round(sum(api_calls.values()) / len(results), 2) if results else None,
+        "image_downloads": grid.calls["image"],
+        "rate_limited_responses": grid.calls["rate_limited"]
+    }
+
+def print_report(report):
+    latency = report["latency_seconds"]
+    print(f"\nCompleted {report['completed']}/{report['jobs']} jobs in {report['elapsed_seconds']}s "
+          f"({report['jobs_per_minute']} jobs/min)")
+    print(f"Latency: p50 {latency['p50']}s, p95 {latency['p95']}s, p99 {latency['p99']}s, max {latency['max']}s")
+    print(f"Queue wait: p50 {report['queue_wait_seconds']['p50']}s, p95 {report['queue_wait_seconds']['p95']}s")
+    print(f"API calls per job: {report['api_calls_per_job']} {report['api_calls']}")
+    print(f"429 responses: {report['rate_limited_responses']}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the generation pipeline against a local mock AI Power Grid")
+    parser.add_argument("--jobs", type=int, default=50, help="Total number of jobs to run")
+    parser.add_argument("--concurrency", type=int, default=10, help="Simulated users submitting at once")
+    parser.add_argument("--n", type=int, default=1, help="Images per job")
+    parser.add_argument("--timeout", type=float, default=300, help="Seconds before a job counts as failed")
+    parser.add_argument("--no-rate-limits", action="store_true", help="Ignore RATE_LIMITS to measure raw pipeline throughput")
+    parser.add_argument("--output", default=None, help="JSON file for the results (default: benchmark-<timestamp>.json)")
+    add_grid_arguments(parser)
+    args = parser.parse_args()
+
+    report = asyncio.run(benchmark(args))
+    print_report(report)
+
+    output = args.output or f"benchmark-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {output}")
@@ -0,0 +1,233 @@
+import itertools
+from collections import Counter
+import nextcord
+
+# Snowflake-like IDs shared by every fake object
+_ids = itertools.count(1000)
+
+class FakeRole:
+    def __init__(self, role_id):
+        self.id = role_id
+
+class FakeUser:
+    """Stand-in for ``nextcord.Member``."""
+
+    def __init__(self, name, user_id=None, roles=()):
+        self.id = user_id or next(_ids)
+        self.name = name
+        self.display_name = name
+        self.bot = False
+        self.roles = [FakeRole(role_id) for role_id in roles]
+
+    @property
+    def mention(self):
+        return f"<@{self.id}>"
+
+class FakeGuild:
+    def __init__(self, guild_id=None):
+        self.id = guild_id or next(_ids)
+        self.members = {}
+
+    def add_member(self, user):
+        self.members[user.id] = user
+        return user
+
+    def get_member(self, user_id):
+        return self.members.get(user_id)
+
+class FakeMessage:
+    """Message that records its edits and deletion on its channel's ``calls`` counter."""
+
+    def __init__(self, channel, content=None, embed=None, file=None, view=None, author=None):
+        self.id = next(_ids)
+        self.channel = channel
+        self.guild = channel.guild
+        self.author = author
+        self.content = content
+        self.embeds = [embed] if embed else []
+        self.file = file
+        self.view = view
+        self.deleted = False
+
+    async def edit(self, content=None, embed=None, view=None, file=None, **kwargs):
+        self.channel.calls["edit"] += 1
+        if content is not None:
+            self.content = content
+        if embed is not None:
+            self.embeds = [embed]
+        if view is not None:
+            self.view = view
+        if file is not None:
+            self.file = file
+        return self
+
+    async def delete(self):
+        self.channel.calls["delete"] += 1
+        self.deleted = True
+
+class FakeChannel:
+    """
+    Text channel that keeps every message sent to it.
+
+    Several fakes may share one ``channel_id`` (e.g. one per simulated user)
+    so each user's messages stay apart while the bot sees a single channel.
+    """
+
+    def __init__(self, channel_id, guild=None):
+        self.id = channel_id
+        self.guild = guild
+        self.messages = []
+        self.calls = Counter()
+        self.last_message = None
+
+    async def send(self, content=None, embed=None, file=None, view=None, **kwargs):
+        self.calls["send"] += 1
+        message = FakeMessage(self, content, embed, file, view)
+        self.messages.append(message)
+        return message
+
+    async def fetch_message(self, message_id):
+        for message in self.messages:
+            if message.id == message_id:
+                return message
+        raise nextcord.NotFound(_FakeHTTPResponse(404), "Unknown Message")
+
+    def get_partial_message(self, message_id):
+        for message in self.messages:
+            if message.id == message_id:
+                return message
+        message = FakeMessage(self)
+        message.id = message_id
+        return message
+
+    def post(self, author, content):
+        """Simulate a user posting ``content`` and return the message."""
+        message = FakeMessage(self, content, author=author)
+        self.last_message = message
+        return message
+
+    def delivered(self):
+        """Return the messages that carry a generated image."""
+        return [message for message in self.messages if message.file is not None and not message.deleted]
+
+class _FakeHTTPResponse:
+    def __init__(self, status):
+        self.status = status
+        self.reason = "Not Found"
+
+class FakeContext:
+    """Command context for calling a command's callback directly."""
+
+    def __init__(self, channel, author, content=""):
+        self.channel = channel
+        self.author = author
+        self.guild = channel.guild
+        self.message = channel.post(author, content)
+
+    async def send(self, content=None, **kwargs):
+        return await self.channel.send(content=content, **kwargs)
+
+class FakeResponse:
+    """``InteractionResponse`` that records what the bot answered with."""
+
+    def __init__(self, interaction):
+        self.interaction = interaction
+        self.modal = None
+        self.sent = []
+        self._done = False
+
+    def is_done(self):
+        return self._done
+
+    async def defer(self, ephemeral=False, **kwargs):
+        self._done = True
+
+    async def send_message(self, content=None, view=None, ephemeral=False, **kwargs):
+        self._done = True
+        self.interaction.channel.calls["ephemeral" if ephemeral else "send"] += 1
+        self.sent.append({"content": content, "view": view, "ephemeral": ephemeral})
+
+    async def edit_message(self, **kwargs):
+        self._done = True
+        await self.interaction.message.edit(**kwargs)
+
+    async def send_modal(self, modal):
+        self._done = True
+        self.modal = modal
+
+class FakeFollowup:
+    def __init__(self, interaction):
+        self.interaction = interaction
+        self.sent = []
+
+    async def send(self, content=None, ephemeral=False, wait=False, embed=None, view=None, **kwargs):
+        self.interaction.channel.calls["ephemeral" if ephemeral else "send"] += 1
+        self.sent.append({"content": content, "ephemeral": ephemeral, "embed": embed, "view": view})
+        if wait:
+            message = FakeMessage(self.interaction.channel, content, embed, view=view)
+            self.interaction.channel.messages.append(message)
+            return message
+
+class FakeInteraction:
+    """Component or modal interaction from ``user`` on ``message``."""
+
+    def __init__(self, user, channel, message=None, custom_id=None, values=None,
+                 type=nextcord.InteractionType.component):
+        self.id = next(_ids)
+        self.type = type
+        self.user = user
+        self.channel = channel
+        self.channel_id = channel.id
+        self.guild = channel.guild
+        self.guild_id = channel.guild.id if channel.guild else None
+        self.message = message
+        self.data = {"custom_id": custom_id}
+        if values is not None:
+            self.data["values"] = list(values)
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+
+    async def edit_original_message(self, **kwargs):
+        if self.message is not None:
+            await self.message.edit(**kwargs)
+
+def component_ids(message):
+    """Return the ``custom_id`` of every component on ``message``'s view, by action."""
+    ids = {}
+    for item in getattr(message.view, "children", []):
+        custom_id = getattr(item, "custom_id", None) or ""
+        parts = custom_id.split(":")
+        if len(parts) == 3:
+            ids.setdefault(parts[1], custom_id)
+    return ids
+
+async def submit_modal(modal, interaction, **values):
+    """Fill in a modal's text inputs by attribute name and submit it."""
+    for name, value in values.items():
+        getattr(modal, name).refresh_state({"value": str(value)}, None, None)
+    interaction.type = nextcord.InteractionType.modal_submit
+    await modal.callback(interaction)
+
+class FakeBot:
+    """Just enough of ``commands.Bot`` to construct and run the cogs."""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.user = FakeUser("bot")
+        self.channels = {}
+
+    async def wait_until_ready(self):
+        return None
+
+    def get_channel(self, channel_id):
+        return self.channels.get(channel_id)
+
+    async def fetch_channel(self, channel_id):
+        return self.channels.get(channel_id)
+
+    def get_partial_messageable(self, channel_id):
+        """Channel a worker process posts to; created on first use like ``nextcord.PartialMessageable``."""
+        return self.channels.setdefault(channel_id, FakeChannel(channel_id))
+
+    def get_user(self, user_id):
+        return None
@@ -0,0 +1,181 @@
+import argparse
+import asyncio
+import gc
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from constants import DEFAULT_IMAGE_PARAMS
+from mock_grid import MockGrid
+from benchmark import summarize
+from fakes import FakeBot, FakeGuild, FakeUser, FakeChannel, FakeContext, FakeInteraction, component_ids, submit_modal
+
+ACTIONS = ("dream", "refresh", "seed", "model")
+
+async def monitor_event_loop(samples, interval=0.05):
+    """Record how late the event loop wakes up from a short sleep."""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(loop.time() - start - interval)
+
+async def perform(cog, user, channel, action, models):
+    """Run one simulated user action and wait until the bot has handled it."""
+    if action == "dream":
+        ctx = FakeContext(channel, user, f"!dream load test {user.name}")
+        await cog.dream_command.callback(cog, ctx, prompt=f"load test {user.name}")
+        return
+
+    delivered = channel.delivered()
+    if not delivered:
+        raise RuntimeError("no image to interact with")
+    message = delivered[-1]
+    ids = component_ids(message)
+
+    if action == "refresh":
+        await cog.on_interaction(FakeInteraction(user, channel, message, ids["refresh"]))
+    elif action == "seed":
+        interaction = FakeInteraction(user, channel, message, ids["seed"])
+        await cog.on_interaction(interaction)
+        await submit_modal(interaction.response.modal, FakeInteraction(user, channel, message), seed_input=random.randint(0, 4294967295))
+    elif action == "model":
+        interaction = FakeInteraction(user, channel, message, ids["model_menu"])
+        await cog.on_interaction(interaction)
+        menu = interaction.response.sent[-1]["view"]
+        select_id = menu.children[0].custom_id
+        # Switch to another model so the request is not served from the result cache
+        current = next((field.value for field in message.embeds[0].fields if field.name == "🤖 Model"), None)
+        model = random.choice([model for model in models if model != current] or models)
+        await cog.on_interaction(FakeInteraction(user, channel, message, select_id, values=[model]))
+
+async def simulate_user(cog, user, channel, actions, models, results):
+    for action in actions:
+        start = time.monotonic()
+        try:
+            await perform(cog, user, channel, action, models)
+            results[action].append(time.monotonic() - start)
+        except Exception as e:
+            results["errors"].append(f"{action}: {e!r}")
+
+async def load_test(args):
+    # A second model gives "Change Model" something to switch to
+    grid = MockGrid(latency=args.delay, models=DEFAULT_IMAGE_PARAMS["models"] + ["mock_model"])
+    url = await grid.start()
+
+    # The bot's modules read their settings at import time, so configure them first
+    workdir = tempfile.mkdtemp(prefix="aipg-load-")
+    os.environ["API_ENDPOINT"] = url
+    os.environ.setdefault("CHANNEL_ID", "1")
+    os.environ.setdefault("AI_POWER_GRID_API_KEY", "0000000000")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ["METRICS_PORT"] = "0"
+    os.environ["FLUX_CONCURRENCY"] = "0"
+    os.environ["JOB_JOURNAL_PATH"] = os.path.join(workdir, "jobs.db")
+    os.environ["VIEW_STATE_PATH"] = os.path.join(workdir, "views.db")
+    os.environ["IMAGE_STORE_DIR"] = os.path.join(workdir, "images")
+    os.environ["GUILD_CONFIG_PATH"] = os.path.join(workdir, "guilds.db")
+    os.environ["SHARED_STATE_PATH"] = os.path.join(workdir, "shared.db")
+    from config import CHANNEL_ID
+    from constants import RATE_LIMITS, BACKEND_CONCURRENCY, DEFAULT_BACKEND
+    from queue_manager import QueueManager
+    from backends import register_backend, FakeBackend
+    from model_catalog import model_catalog
+    from api_client import api_client
+    from cogs.image_generation import ImageGeneration
+
+    # Jobs run on a fake backend standing in for the default one, so only the bot's own code is measured
+    rate_limits = RATE_LIMITS if args.real_rate_limits else {"default": (10000, 1)}
+    scheduler = QueueManager(rate_limits=rate_limits, concurrency=BACKEND_CONCURRENCY)
+    register_backend(FakeBackend(delay=args.delay, name=DEFAULT_BACKEND, scheduler=scheduler))
+
+    tracemalloc.start()
+    loop = asyncio.get_running_loop()
+    bot = FakeBot(loop)
+    cog = ImageGeneration(bot)
+    await model_catalog.refresh()
+    models = model_catalog.models or DEFAULT_IMAGE_PARAMS["models"]
+
+    guild = FakeGuild()
+    users = [guild.add_member(FakeUser(f"user{index}")) for index in range(args.users)]
+    # One fake per user with the same channel ID keeps each user's messages apart
+    channels = [FakeChannel(CHANNEL_ID, guild) for _ in users]
+
+    gc.collect()
+    baseline = tracemalloc.get_traced_memory()[0]
+    lag = []
+    monitor = asyncio.create_task(monitor_event_loop(lag))
+    results = defaultdict(list)
+
+    async def start_user(index):
+        await asyncio.sleep(random.uniform(0, args.ramp))
+        await simulate_user(cog, users[index], channels[index], args.actions, models, results)
+
+    print(f"Simulating {args.users} users ({', '.join(args.actions)}) with {args.delay}s jobs")
+    start = time.monotonic()
+    await asyncio.gather(*(start_user(index) for index in range(args.users)))
+    elapsed = time.monotonic() - start
+
+    monitor.cancel()
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    await api_client.close()
+    await grid.stop()
+
+    calls = Counter()
+    for channel in channels:
+        calls.update(channel.calls)
+    jobs = sum(len(results[action]) for action in ACTIONS)
+    return {
+        "config": vars(args),
+        "users": args.users,
+        "elapsed_seconds": round(elapsed, 3),
+        "actions": {action: {"completed": len(results[action]), **summarize(results[action])} for action in args.actions},
+        "errors": len(results["errors"]),
+        "error_samples": results["errors"][:10],
+        "event_loop_lag_seconds": summarize(lag),
+        "shed_requests": {reason: count for (reason,), count in scheduler.shed.values.items()},
+        "discord_calls": dict(calls),
+        "edits_per_job": round(calls["edit"] / jobs, 2) if jobs else None,
+        "memory_growth_bytes": current - baseline,
+        "memory_growth_per_user_bytes": round((current - baseline) / args.users) if args.users else None,
+        "memory_peak_bytes": peak
+    }
+
+def print_report(report):
+    print(f"\n{report['users']} users finished in {report['elapsed_seconds']}s, {report['errors']} errors")
+    for action, summary in report["actions"].items():
+        print(f"  {action:<8} {summary['completed']:>5} done, p50 {summary['p50']}s, p95 {summary['p95']}s")
+    lag = report["event_loop_lag_seconds"]
+    print(f"Event loop lag: mean {lag['mean']}s, p95 {lag['p95']}s, max {lag['max']}s")
+    print(f"Discord calls: {report['discord_calls']} ({report['edits_per_job']} edits per job)")
+    print(f"Shed requests: {report['shed_requests'] or 'none'}")
+    print(f"Memory growth: {report['memory_growth_bytes'] / 1024:.0f} KiB "
+          f"({report['memory_growth_per_user_bytes'] / 1024:.1f} KiB per user), peak {report['memory_peak_bytes'] / 1024 ** 2:.1f} MiB")
+    for sample in report["error_samples"]:
+        print(f"  error: {sample}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the ImageGeneration cog with simulated Discord users")
+    parser.add_argument("--users", type=int, default=200, help="Number of simulated users")
+    parser.add_argument("--actions", nargs="+", choices=ACTIONS, default=list(ACTIONS),
+                        help="Actions each user performs in order (the first should be dream)")
+    parser.add_argument("--delay", type=float, default=2.0, help="Seconds each fake job takes")
+    parser.add_argument("--ramp", type=float, default=5.0, help="Users start at random times within this many seconds")
+    parser.add_argument("--real-rate-limits", action="store_true", help="Apply RATE_LIMITS instead of an unlimited budget")
+    parser.add_argument("--output", default=None, help="Optional JSON file for the results")
+    args = parser.parse_args()
+
+    report = asyncio.run(load_test(args))
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results saved to {args.output}")
@@ -0,0 +1,214 @@
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+import uuid
+from collections import Counter, deque
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from constants import DEFAULT_IMAGE_PARAMS
+
+class MockGrid:
+    """
+    Local stand-in for the AI Power Grid API.
+
+    Implements the endpoints the bot uses (async submit, check, status,
+    cancel, workers) and serves the generated "images" itself. Every job
+    waits ``queue_delay`` seconds for a worker, then takes ``latency``
+    seconds (+/- ``jitter``) to generate. ``error_rate`` of submissions are
+    rejected with a 500, ``fault_rate`` of jobs fault, and with
+    ``rate_limit`` set, API requests beyond that many per second get a 429.
+    ``workers`` workers serve ``models`` (by default the bot's default model).
+    Requests per endpoint are counted in ``calls``.
+    """
+
+    def __init__(self, latency=5.0, queue_delay=0.0, jitter=0.2, error_rate=0.0, fault_rate=0.0,
+                 rate_limit=None, image_bytes=512 * 1024, workers=4, models=None):
+        self.latency = latency
+        self.queue_delay = queue_delay
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.fault_rate = fault_rate
+        self.rate_limit = rate_limit
+        self.image = os.urandom(image_bytes)
+        self.workers = [
+            {
+                "id": str(uuid.uuid4()),
+                "name": f"mock-worker-{index}",
+                "type": "image",
+                "performance": "2.0 megapixelsteps per second",
+                "max_pixels": 4194304,
+                "models": list(models or DEFAULT_IMAGE_PARAMS["models"]),
+                "maintenance_mode": False,
+                "paused": False
+            }
+            for index in range(workers)
+        ]
+        self.jobs = {}
+        self.calls = Counter()
+        self._recent = deque()
+        self._runner = None
+        self.base_url = None
+
+    @property
+    def app(self):
+        app = web.Application(middlewares=[self._rate_limit_middleware])
+        app.router.add_post("/api/v2/generate/async", self.submit)
+        app.router.add_get("/api/v2/generate/check/{job_id}", self.check)
+        app.router.add_get("/api/v2/generate/status/{job_id}", self.status)
+        app.router.add_delete("/api/v2/generate/status/{job_id}", self.cancel)
+        app.router.add_get("/api/v2/workers", self.list_workers)
+        app.router.add_get("/images/{name}", self.image_file)
+        return app
+
+    @web.middleware
+    async def _rate_limit_middleware(self, request, handler):
+        if self.rate_limit and request.path.startswith("/api/"):
+            now = time.monotonic()
+            while self._recent and now - self._recent[0] > 1:
+                self._recent.popleft()
+            if len(self._recent) >= self.rate_limit:
+                self.calls["rate_limited"] += 1
+                return web.json_response({"message": "Rate limit exceeded"}, status=429)
+            self._recent.append(now)
+        return await handler(request)
+
+    def _job(self, request):
+        job = self.jobs.get(request.match_info["job_id"])
+        if job is None:
+            raise web.HTTPNotFound(text='{"message": "Job not found"}', content_type="application/json")
+        return job
+
+    def _state(self, job):
+        now = time.monotonic()
+        done = now >= job["done_at"] and not job["faulted"]
+        faulted = now >= job["done_at"] and job["faulted"]
+        processing = job["started_at"] <= now < job["done_at"]
+        waiting = now < job["started_at"]
+        queue_position = sum(1 for other in self.jobs.values()
+                             if other["created_at"] < job["created_at"] and now < other["started_at"]) if waiting else 0
+        return {
+            "finished": job["n"] if done else 0,
+            "processing": job["n"] if processing else 0,
+            "restarted": 0,
+            "waiting": job["n"] if waiting else 0,
+            "done": done,
+            "faulted": faulted,
+            "wait_time": max(round(job["done_at"] - now), 0),
+            "queue_position": queue_position,
+            "kudos": 10.0,
+            "is_possible": True
+        }
+
+    async def submit(self, request):
+        self.calls["submit"] += 1
+        body = await request.json()
+        if random.random() < self.error_rate:
+            return web.json_response({"message": "Internal Server Error"}, status=500)
+
+        now = time.monotonic()
+        job_id = str(uuid.uuid4())
+        options = body.get("params", {})
+        latency = self.latency * random.uniform(1 - self.jitter, 1 + self.jitter)
+        self.jobs[job_id] = {
+            "created_at": now,
+            "started_at": now + self.queue_delay,
+            "done_at": now + self.queue_delay + latency,
+            "faulted": random.random() < self.fault_rate,
+            "n": int(options.get("n", 1)),
+            "seed": int(options.get("seed") or random.randint(0, 4294967295)),
+            "model": (body.get("models") or ["mock"])[0]
+        }
+        return web.json_response({"id": job_id, "kudos": 10.0}, status=202)
+
+    async def check(self, request):
+        self.calls["check"] += 1
+        return web.json_response(self._state(self._job(request)))
+
+    async def status(self, request):
+        self.calls["status"] += 1
+        job = self._job(request)
+        state = self._state(job)
+        generations = []
+        if state["done"]:
+            job_id = request.match_info["job_id"]
+            generations = [
+                {
+                    "img": f"{self.base_url}/images/{job_id}_{index}.png",
+                    "seed": str(job["seed"] + index),
+                    "id": f"{job_id}_{index}",
+                    "censored": False,
+                    "worker_id": self.workers[0]["id"] if self.workers else None,
+                    "worker_name": self.workers[0]["name"] if self.workers else None,
+                    "model": job["model"]
+                }
+                for index in range(job["n"])
+            ]
+        return web.json_response({**state, "generations": generations})
+
+    async def cancel(self, request):
+        self.calls["cancel"] += 1
+        job = self._job(request)
+        state = self._state(job)
+        del self.jobs[request.match_info["job_id"]]
+        return web.json_response({**state, "generations": []})
+
+    async def list_workers(self, request):
+        self.calls["workers"] += 1
+        return web.json_response(self.workers)
+
+    async def image_file(self, request):
+        self.calls["image"] += 1
+        return web.Response(body=self.image, content_type="image/png")
+
+    async def start(self, host="127.0.0.1", port=0):
+        """Start serving and return the base URL to use as ``API_ENDPOINT``."""
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        port = self._runner.addresses[0][1]
+        self.base_url = f"http://{host}:{port}"
+        return self.base_url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+def add_grid_arguments(parser):
+    parser.add_argument("--latency", type=float, default=5.0, help="Seconds each job takes to generate")
+    parser.add_argument("--queue-delay", type=float, default=0.0, help="Seconds each job waits for a worker")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Random +/- fraction applied to the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of submissions rejected with a 500")
+    parser.add_argument("--fault-rate", type=float, default=0.0, help="Fraction of jobs that fault")
+    parser.add_argument("--rate-limit", type=int, default=None, help="API requests per second before answering 429")
+    parser.add_argument("--image-bytes", type=int, default=512 * 1024, help="Size of each served image")
+
+def grid_from_arguments(args):
+    return MockGrid(latency=args.latency, queue_delay=args.queue_delay, jitter=args.jitter,
+                    error_rate=args.error_rate, fault_rate=args.fault_rate,
+                    rate_limit=args.rate_limit, image_bytes=args.image_bytes)
+
+async def serve(args):
+    grid = grid_from_arguments(args)
+    url = await grid.start(args.host, args.port)
+    print(f"Mock AI Power Grid listening on {url}")
+    print(f"Run the bot against it with API_ENDPOINT={url}")
+    try:
+        while True:
+            await asyncio.sleep(3600)
+    finally:
+        await grid.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local mock of the AI Power Grid API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    add_grid_arguments(parser)
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,39 @@
+import asyncio
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from image_store import ImageStore
+
+async def least_recently_used_images_are_evicted(root):
+    store = ImageStore(root, max_bytes=25)
+    digest_a = await store.put("job-a", b"a" * 10)
+    digest_b = await store.put("job-b", b"b" * 10)
+
+    # Identical bytes are stored once, however many jobs produced them
+    assert await store.put("job-a2", b"a" * 10) == digest_a
+    assert store.total_bytes == 20
+
+    # Reading A makes B the least recently used image, so B goes once the budget is exceeded
+    assert await store.get("job-a") == b"a" * 10
+    await store.put("job-c", b"c" * 10)
+    assert store.total_bytes == 20
+    assert await store.get("job-b") is None
+    assert not os.path.exists(store._object_path(digest_b))
+    assert await store.get("job-a2") == b"a" * 10
+    assert await store.get("job-c") == b"c" * 10
+
+    # The index survives a restart
+    await store.flush()
+    reloaded = ImageStore(root, max_bytes=25)
+    assert await reloaded.get("job-c") == b"c" * 10
+    assert await reloaded.get("job-b") is None
+
+def test_least_recently_used_images_are_evicted():
+    with tempfile.TemporaryDirectory() as root:
+        asyncio.run(least_recently_used_images_are_evicted(root))
+
+if __name__ == "__main__":
+    test_least_recently_used_images_are_evicted()
+    print("ok")
@@ -0,0 +1,42 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from constants import CHECK_INTERVAL, MIN_CHECK_INTERVAL, MAX_CHECK_INTERVAL, POLL_WAIT_FRACTION
+from job_poller import JobPoller, next_check_delay
+from backends.fake import FakeBackend
+from queue_manager import QueueManager
+
+def test_next_check_delay_follows_wait_time():
+    # No estimate from the grid: fall back to the fixed interval
+    assert next_check_delay({}) == CHECK_INTERVAL
+    assert next_check_delay({"wait_time": 20, "processing": 1}) == 20 * POLL_WAIT_FRACTION
+
+    # Clamped on both sides
+    assert next_check_delay({"wait_time": 0, "processing": 1}) == MIN_CHECK_INTERVAL
+    assert next_check_delay({"wait_time": 3600, "processing": 1}) == MAX_CHECK_INTERVAL
+
+def test_next_check_delay_waits_for_queue_position():
+    # Queued jobs are not checked more often than once per position ahead of them...
+    assert next_check_delay({"wait_time": 2, "queue_position": 8}) == 8 * MIN_CHECK_INTERVAL
+    # ...but that floor no longer applies once a worker picked the job up
+    assert next_check_delay({"wait_time": 2, "queue_position": 8, "processing": 1}) == max(2 * POLL_WAIT_FRACTION, MIN_CHECK_INTERVAL)
+
+def test_lane_batch_size_follows_status_budget():
+    backend = FakeBackend(name="aipg", scheduler=QueueManager(rate_limits={"aipg.status": (10, 10), "default": (10, 1)}))
+    poller = JobPoller()
+    # A full bucket allows its whole burst in one round
+    assert poller.lane_batch_size(backend.status) == 10
+
+    # An empty bucket still allows one round's refill, which the scheduler then spaces out
+    backend.scheduler.buckets["aipg.status"].tokens = 0
+    assert poller.lane_batch_size(backend.status) == 1
+
+    # A fixed batch size overrides the budget
+    assert JobPoller(batch_size=3).lane_batch_size(backend.status) == 3
+
+if __name__ == "__main__":
+    test_next_check_delay_follows_wait_time()
+    test_next_check_delay_waits_for_queue_position()
+    test_lane_batch_size_follows_status_budget()
+    print("ok")
@@ -0,0 +1,55 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import model_catalog as model_catalog_module
+from constants import MAX_WAIT_TIME
+from model_catalog import ModelCatalog
+
+WORKERS = [
+    {"models": ["m"], "max_pixels": 512 * 512, "performance": "2.0 megapixelsteps per second"},
+    # Paused workers neither raise the size limit nor the speed estimate
+    {"models": ["m"], "max_pixels": 2048 * 2048, "performance": "50.0 megapixelsteps per second", "paused": True}
+]
+
+def request(width, height, steps=30):
+    return {"models": ["m"], "params": {"width": width, "height": height, "steps": steps, "n": 1}}
+
+def catalog():
+    models = ModelCatalog()
+    models.index = models.build_index(WORKERS)
+    return models
+
+def test_oversized_request_is_downscaled():
+    params = request(1024, 1024)
+    result = catalog().assess(params)
+    assert result["ok"]
+    assert (result["params"]["params"]["width"], result["params"]["params"]["height"]) == (512, 512)
+    assert result["warnings"]
+    assert result["cost"] == 512 * 512 * 30 / 1_000_000
+    assert result["estimated_time"] == result["cost"] / 2.0
+    # The caller's params are left alone
+    assert params["params"]["width"] == 1024
+
+def test_oversized_request_is_rejected_without_downscaling():
+    saved = model_catalog_module.CAPACITY_AUTO_DOWNSCALE
+    model_catalog_module.CAPACITY_AUTO_DOWNSCALE = False
+    try:
+        result = catalog().assess(request(1024, 1024))
+    finally:
+        model_catalog_module.CAPACITY_AUTO_DOWNSCALE = saved
+    assert not result["ok"]
+    assert "reduce the dimensions" in result["message"]
+
+def test_request_too_slow_for_fastest_worker_is_rejected():
+    steps = int(MAX_WAIT_TIME * 2.0 / (512 * 512 / 1_000_000)) + 10
+    result = catalog().assess(request(512, 512, steps))
+    assert not result["ok"]
+    assert result["estimated_time"] > MAX_WAIT_TIME
+    assert catalog().assess(request(512, 512))["ok"]
+
+if __name__ == "__main__":
+    test_oversized_request_is_downscaled()
+    test_oversized_request_is_rejected_without_downscaling()
+    test_request_too_slow_for_fastest_worker_is_rejected()
+    print("ok")
@@ -0,0 +1,123 @@
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from constants import PRIORITY_STAFF, PRIORITY_NORMAL
+from queue_manager import FairQueue, QueueManager, QueueTicket, TokenBucket, QueueFullError, QueueExpiredError
+
+async def capped_guild_does_not_block_others():
+    scheduler = QueueManager(rate_limits={"fake.submit": (1000, 1)}, concurrency={"fake": 4})
+
+    async def submit(guild, group_limit=None):
+        await scheduler.run_coroutine_timed(asyncio.sleep(0), "fake.submit", slot="fake", group=guild, group_limit=group_limit)
+
+    # Guild A is capped at one job: its first request takes a slot, its second waits for it
+    await submit("A", group_limit=1)
+    capped = asyncio.create_task(submit("A", group_limit=1))
+    await asyncio.sleep(0.1)
+    assert not capped.done()
+
+    # Guild B must get one of the three idle slots without waiting for guild A
+    await asyncio.wait_for(submit("B"), timeout=1)
+    assert scheduler.active["fake"] == 2
+    assert not capped.done()
+
+    scheduler.release_slot("fake", "A")
+    await asyncio.wait_for(capped, timeout=1)
+
+def test_capped_guild_does_not_block_others():
+    asyncio.run(capped_guild_does_not_block_others())
+
+def test_token_bucket_refills_continuously():
+    bucket = TokenBucket(2, 1)
+    assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() == 0
+    # Empty: the next token is half a second away at two tokens per second
+    assert abs(bucket.try_acquire() - 0.5) < 0.01
+
+    # A quarter second later half a token has come back, not a whole window's worth
+    bucket.updated -= 0.25
+    assert abs(bucket.available() - 0.5) < 0.01
+    bucket.updated -= 0.25
+    assert bucket.try_acquire() == 0
+
+    # Idle time never fills the bucket past its capacity
+    bucket.updated -= 60
+    assert bucket.available() == 2
+
+def test_fair_queue_round_robins_between_users():
+    queue = FairQueue(fair=True)
+    tickets = [QueueTicket(None, user, PRIORITY_NORMAL) for user in ("A", "A", "A", "B", "C")]
+    for ticket in tickets:
+        queue.push(ticket)
+    staff = QueueTicket(None, "D", PRIORITY_STAFF)
+    queue.push(staff)
+    assert len(queue) == 6
+    assert queue.user_depth("A") == 3
+
+    # Staff go first, then user A's flood is interleaved with everyone else's requests
+    order = [queue.pop() for _ in range(6)]
+    assert order == [staff, tickets[0], tickets[3], tickets[4], tickets[1], tickets[2]]
+    assert len(queue) == 0 and queue.pop() is None
+
+def test_unfair_queue_is_fifo():
+    queue = FairQueue(fair=False)
+    tickets = [QueueTicket(None, user, PRIORITY_NORMAL) for user in ("A", "A", "B")]
+    for ticket in tickets:
+        queue.push(ticket)
+    assert [queue.pop() for _ in range(3)] == tickets
+
+async def full_queues_shed_requests():
+    scheduler = QueueManager(rate_limits={"fake.submit": (1000, 1)}, concurrency={"fake": 1}, max_depth=3, max_user_depth=2)
+
+    async def submit(user, deadline=None):
+        await scheduler.run_coroutine_timed(asyncio.sleep(0), "fake.submit", user_id=user, slot="fake", deadline=deadline)
+
+    # The only slot is taken, so every further job waits
+    await submit("A")
+    waiting = [asyncio.create_task(submit("A")) for _ in range(2)]
+    await asyncio.sleep(0.05)
+
+    # User A is at their own limit, user B is not
+    try:
+        await submit("A")
+        assert False, "expected QueueFullError"
+    except QueueFullError as e:
+        assert e.per_user
+    waiting.append(asyncio.create_task(submit("B")))
+    await asyncio.sleep(0.05)
+    assert len(scheduler.queues["fake.submit"]) == 3
+
+    # Now the queue as a whole is full
+    try:
+        await submit("C")
+        assert False, "expected QueueFullError"
+    except QueueFullError as e:
+        assert not e.per_user and e.position == 4
+
+    for task in waiting:
+        task.cancel()
+    await asyncio.gather(*waiting, return_exceptions=True)
+
+    # A request still waiting at its deadline is dropped and leaves the queue
+    started = time.monotonic()
+    try:
+        await submit("C", deadline=time.time() + 0.1)
+        assert False, "expected QueueExpiredError"
+    except QueueExpiredError:
+        pass
+    assert time.monotonic() - started < 1
+    assert len(scheduler.queues["fake.submit"]) == 0
+
+def test_full_queues_shed_requests():
+    asyncio.run(full_queues_shed_requests())
+
+if __name__ == "__main__":
+    test_capped_guild_does_not_block_others()
+    test_token_bucket_refills_continuously()
+    test_fair_queue_round_robins_between_users()
+    test_unfair_queue_is_fifo()
+    test_full_queues_shed_requests()
+    print("ok")
@@ -0,0 +1,63 @@
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import result_cache as result_cache_module
+from image_store import ImageStore
+from result_cache import ResultCache, fingerprint
+
+async def identical_requests_share_one_job():
+    cache = ResultCache(ttl=60)
+    key = fingerprint({"prompt": "a cat", "params": {"seed": "1"}})
+    assert key == fingerprint({"params": {"seed": "1"}, "prompt": "a cat"})
+    assert cache.join(key) is None
+
+    # The first request leads, identical requests wait on its future instead of submitting
+    leader = cache.begin(key)
+    follower = cache.join(key)
+    assert follower is leader
+
+    await result_cache_module.image_store.put("job-1", b"png")
+    cache.complete(key, "job-1", b"png", seeds=["1"])
+    assert (await follower)["job_id"] == "job-1"
+    assert cache.join(key) is None
+
+    # Repeats are served from the image store until the entry expires
+    assert await cache.lookup(key) == ("job-1", b"png")
+    cache.completed[key]["expires"] = time.monotonic() - 1
+    assert await cache.lookup(key) is None
+    assert key not in cache.completed
+    assert cache.stats == {"hits": 1, "misses": 1, "joins": 1}
+
+async def failed_leader_releases_followers():
+    cache = ResultCache()
+    leader = cache.begin("key")
+    follower = cache.join("key")
+    cache.fail("key", leader)
+    assert await follower is None
+    assert cache.join("key") is None
+    assert await cache.lookup("key") is None
+
+def run_with_store(coroutine_function):
+    # Cache hits are read back from the image store, so give each run an empty one
+    saved = result_cache_module.image_store
+    with tempfile.TemporaryDirectory() as root:
+        result_cache_module.image_store = ImageStore(root)
+        try:
+            asyncio.run(coroutine_function())
+        finally:
+            result_cache_module.image_store = saved
+
+def test_identical_requests_share_one_job():
+    run_with_store(identical_requests_share_one_job)
+
+def test_failed_leader_releases_followers():
+    run_with_store(failed_leader_releases_followers)
+
+if __name__ == "__main__":
+    test_identical_requests_share_one_job()
+    test_failed_leader_releases_followers()
+    print("ok")
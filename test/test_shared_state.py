@@ -0,0 +1,80 @@
+import asyncio
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shared_state import SQLiteWorkQueue, WorkItem
+
+def item(message_id, priority=1, user_id=1):
+    return WorkItem("a cat", None, "aipg", 10, 20, message_id, user_id, priority)
+
+async def expired_leases_are_claimed_again(path):
+    first = SQLiteWorkQueue(path, poll_interval=0.01, lease_time=0.4, worker="worker-1")
+    second = SQLiteWorkQueue(path, poll_interval=0.01, lease_time=0.4, worker="worker-2")
+    await first.put(item(1, priority=2))
+    await first.put(item(2, priority=1, user_id=2))
+    assert await first.depth(1) == (2, 1)
+
+    # Served by priority; a leased item is no longer waiting
+    assert (await first.claim()).message_id == 2
+    assert await first.depth() == (1, 0)
+    assert (await second.claim()).message_id == 1
+    assert await first.depth() == (0, 0)
+
+    # A renewed lease holds, one that runs out is handed to another worker
+    await asyncio.sleep(0.3)
+    await first.renew([2])
+    await asyncio.sleep(0.2)
+    assert (await asyncio.wait_for(first.claim(), timeout=1)).message_id == 1
+    try:
+        await asyncio.wait_for(second.claim(), timeout=0.05)
+        assert False, "item 2 is still leased"
+    except asyncio.TimeoutError:
+        pass
+
+    # Released items are gone for good
+    await first.release(1)
+    await first.release(2)
+    await asyncio.sleep(0.45)
+    try:
+        await asyncio.wait_for(second.claim(), timeout=0.05)
+        assert False, "the queue should be empty"
+    except asyncio.TimeoutError:
+        pass
+
+def test_expired_leases_are_claimed_again():
+    with tempfile.TemporaryDirectory() as root:
+        asyncio.run(expired_leases_are_claimed_again(os.path.join(root, "state.db")))
+
+async def cancel_depends_on_request_state(path):
+    queue = SQLiteWorkQueue(path, poll_interval=0.01)
+    await queue.put(item(1))
+    await queue.put(item(2))
+    await queue.put(item(3))
+
+    # A queued request is simply removed
+    assert await queue.cancel(1) is True
+    assert await queue.depth() == (2, 0)
+
+    # A running request gets a record its worker picks up once
+    assert (await queue.claim()).message_id == 2
+    assert await queue.cancel(2, deleted=True) is False
+    assert await queue.cancelled([2, 3]) == [(2, True)]
+    assert await queue.cancelled([2]) == []
+
+    # A finished request is left alone, however often it is cancelled
+    assert (await queue.claim()).message_id == 3
+    await queue.finish(3)
+    assert await queue.cancel(3) is None
+    assert await queue.cancel(3) is None
+    assert await queue.cancelled([3]) == []
+
+def test_cancel_depends_on_request_state():
+    with tempfile.TemporaryDirectory() as root:
+        asyncio.run(cancel_depends_on_request_state(os.path.join(root, "state.db")))
+
+if __name__ == "__main__":
+    test_expired_leases_are_claimed_again()
+    test_cancel_depends_on_request_state()
+    print("ok")
@@ -0,0 +1,36 @@
+import io
+import math
+from PIL import Image, ImageDraw
+from constants import GRID_TILE_SIZE
+
+def composite_grid(images, tile_size=GRID_TILE_SIZE):
+    """
+    Paste encoded images into a numbered, near-square grid and return it as PNG bytes.
+
+    Tiles are shrunk to fit ``tile_size`` and numbered in reading order so
+    they match the per-image buttons. This is CPU-bound; call it through
+    ``asyncio.to_thread``.
+    """
+    tiles = []
+    for content in images:
+        tile = Image.open(io.BytesIO(content)).convert("RGB")
+        tile.thumbnail((tile_size, tile_size))
+        tiles.append(tile)
+
+    columns = math.ceil(math.sqrt(len(tiles)))
+    rows = math.ceil(len(tiles) / columns)
+    cell_width = max(tile.width for tile in tiles)
+    cell_height = max(tile.height for tile in tiles)
+
+    grid = Image.new("RGB", (columns * cell_width, rows * cell_height))
+    draw = ImageDraw.Draw(grid)
+    for index, tile in enumerate(tiles):
+        x = (index % columns) * cell_width
+        y = (index // columns) * cell_height
+        grid.paste(tile, (x, y))
+        draw.rectangle((x, y, x + 20, y + 16), fill=(0, 0, 0))
+        draw.text((x + 6, y + 2), str(index + 1), fill=(255, 255, 255))
+
+    buffer = io.BytesIO()
+    grid.save(buffer, format="PNG")
+    return buffer.getvalue()
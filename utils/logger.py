@@ -1,17 +1,94 @@
+import atexit
+import contextvars
+import json
 import logging
+import logging.handlers
+import queue
+from config import LOG_LEVEL, LOG_FORMAT, API_KEY, DISCORD_BOT_TOKEN
+
+# ID of the request or job being handled, attached to every record logged in its context
+correlation_id = contextvars.ContextVar("correlation_id", default=None)
+
+def set_correlation_id(value):
+    """Tag records logged from the current task (and tasks it starts) with ``value``."""
+    return correlation_id.set(value)
+
+class lazy_json:
+    """
+    Defer ``json.dumps`` until a record is actually emitted.
+
+    Pass it as a %-style argument, e.g. ``debug("Response: %s", lazy_json(data))``;
+    records below the configured level are dropped before it is ever serialized.
+    """
+
+    __slots__ = ("obj",)
+
+    def __init__(self, obj):
+        self.obj = obj
+
+    def __str__(self):
+        return json.dumps(self.obj, indent=2, default=str)
+
+class ContextFilter(logging.Filter):
+    """Attach the correlation ID and redact secrets before a record is queued."""
+
+    def __init__(self, secrets=()):
+        super().__init__()
+        self.secrets = [secret for secret in secrets if secret]
+
+    def filter(self, record):
+        record.correlation_id = correlation_id.get() or "-"
+        message = record.getMessage()
+        for secret in self.secrets:
+            message = message.replace(secret, "***")
+        record.msg = message
+        record.args = None
+        return True
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "correlation_id": getattr(record, "correlation_id", "-"),
+            "message": record.getMessage()
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry)
 
 def setup_logging():
     """
-    Set up basic logging configuration.
-    
+    Route all logging through a queue so emitting never blocks the event loop.
+
+    Records are filtered (level, correlation ID, secret redaction) in the
+    calling thread and written to stderr by a background listener thread,
+    as text or JSON depending on ``LOG_FORMAT``.
+
     Returns:
         logging.Logger: Configured logger instance.
     """
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
+    stream_handler = logging.StreamHandler()
+    if LOG_FORMAT == "json":
+        stream_handler.setFormatter(JSONFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter(
+            '%(asctime)s - %(levelname)s - [%(correlation_id)s] %(message)s',
+            datefmt='%Y-%m-%d %H:%M:%S'
+        ))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter(secrets=(API_KEY, DISCORD_BOT_TOKEN)))
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(LOG_LEVEL)
+
+    listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    listener.start()
+    atexit.register(listener.stop)
     return logging.getLogger(__name__)
 
 # Create a logger instance
@@ -24,4 +101,4 @@ logger.info("Logger initialized successfully")
 info = logger.info
 error = logger.error
 warning = logger.warning
-debug = logger.debug
\ No newline at end of file
+debug = logger.debug
@@ -0,0 +1,52 @@
+import asyncio
+import os
+import sqlite3
+import threading
+from utils.logger import error
+
+class SQLiteStore:
+    """
+    Base class for small SQLite-backed stores.
+
+    Opens one WAL-mode connection per store, creates ``SCHEMA`` on first use
+    and runs every query in a worker thread so the event loop never blocks
+    on disk I/O. Subclasses set ``SCHEMA`` to a list of DDL statements and
+    ``COLUMNS`` to ``(table, column, definition)`` entries that are added to
+    tables created by an older version.
+    """
+
+    SCHEMA = []
+    COLUMNS = []
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            for statement in self.SCHEMA:
+                self._conn.execute(statement)
+            for table, column, definition in self.COLUMNS:
+                existing = {row["name"] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+                if column not in existing:
+                    self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        return self._conn
+
+    def _execute(self, sql, args=()):
+        with self._lock:
+            return self._connect().execute(sql, args).fetchall()
+
+    async def _run(self, sql, args=()):
+        try:
+            return await asyncio.to_thread(self._execute, sql, args)
+        except sqlite3.Error as e:
+            error(f"{type(self).__name__} query failed: {str(e)}")
+            return []
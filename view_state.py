@@ -0,0 +1,116 @@
+import hashlib
+import json
+import time
+import zlib
+from collections import OrderedDict
+from config import VIEW_STATE_PATH
+from constants import VIEW_STATE_MAX_ENTRIES, VIEW_STATE_CACHE_SIZE, DEFAULT_BACKEND
+from utils.logger import debug
+from utils.sqlite_store import SQLiteStore
+
+class ViewState:
+    """Compact record of what a posted image's buttons need: prompt, model, backend and packed params."""
+
+    __slots__ = ("prompt", "model", "backend", "packed_params")
+
+    def __init__(self, prompt, model, backend, packed_params):
+        self.prompt = prompt
+        self.model = model
+        self.backend = backend
+        self.packed_params = packed_params
+
+    @classmethod
+    def from_params(cls, prompt, params, backend=DEFAULT_BACKEND):
+        packed = zlib.compress(json.dumps(params, separators=(",", ":"), sort_keys=True).encode("utf-8"))
+        return cls(prompt, params["models"][0], backend, packed)
+
+    @property
+    def params(self):
+        """Unpack a fresh copy of the params; callers may modify it freely."""
+        return json.loads(zlib.decompress(self.packed_params))
+
+    @property
+    def key(self):
+        digest = hashlib.sha1(f"{self.backend}\0{self.prompt}\0".encode("utf-8") + self.packed_params)
+        return digest.hexdigest()[:16]
+
+class ViewStateStore(SQLiteStore):
+    """
+    Size-capped store of ``ViewState`` records addressed by the short key
+    embedded in component ``custom_id``s.
+
+    Recently used states are cached in memory; everything else is loaded
+    from SQLite on demand, so buttons on old messages keep working after a
+    restart. Once more than ``max_entries`` states are stored the least
+    recently used ones are deleted.
+    """
+
+    SCHEMA = [
+        """
+        CREATE TABLE IF NOT EXISTS view_state (
+            key TEXT PRIMARY KEY,
+            prompt TEXT NOT NULL,
+            model TEXT NOT NULL,
+            params BLOB NOT NULL,
+            last_used REAL NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS view_state_last_used ON view_state (last_used)"
+    ]
+    COLUMNS = [
+        ("view_state", "backend", f"TEXT NOT NULL DEFAULT '{DEFAULT_BACKEND}'")
+    ]
+
+    def __init__(self, path=VIEW_STATE_PATH, max_entries=VIEW_STATE_MAX_ENTRIES, cache_size=VIEW_STATE_CACHE_SIZE):
+        super().__init__(path)
+        self.max_entries = max_entries
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self._writes = 0
+
+    def _remember(self, key, state):
+        self.cache[key] = state
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    async def put(self, prompt, params, backend=DEFAULT_BACKEND):
+        """Store the state for a posted image and return its key."""
+        state = ViewState.from_params(prompt, params, backend)
+        key = state.key
+        self._remember(key, state)
+        await self._run(
+            "INSERT OR REPLACE INTO view_state (key, prompt, model, params, last_used, backend) VALUES (?, ?, ?, ?, ?, ?)",
+            (key, state.prompt, state.model, state.packed_params, time.time(), state.backend)
+        )
+
+        # Enforce the size cap every so often rather than on every write
+        self._writes += 1
+        if self._writes % 100 == 0:
+            await self.prune()
+        return key
+
+    async def get(self, key):
+        """Return the ``ViewState`` for a key, loading it from disk if needed, or None."""
+        state = self.cache.get(key)
+        if state is not None:
+            self.cache.move_to_end(key)
+            return state
+
+        rows = await self._run("SELECT prompt, model, backend, params FROM view_state WHERE key = ?", (key,))
+        if not rows:
+            return None
+        state = ViewState(rows[0]["prompt"], rows[0]["model"], rows[0]["backend"], rows[0]["params"])
+        self._remember(key, state)
+        await self._run("UPDATE view_state SET last_used = ? WHERE key = ?", (time.time(), key))
+        debug(f"Rebuilt view state {key} from disk")
+        return state
+
+    async def prune(self):
+        await self._run(
+            "DELETE FROM view_state WHERE key NOT IN (SELECT key FROM view_state ORDER BY last_used DESC LIMIT ?)",
+            (self.max_entries,)
+        )
+
+# Create a global instance of ViewStateStore
+view_state_store = ViewStateStore()